@@ -11,8 +11,8 @@ from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ValidationError
 
 from .models import ChatSession, ChatMessage
-from .services.smart_router import SmartChatbotRouter
-from .utils.session_manager import ChatSessionManager
+from .services.registry import get_chatbot_router
+from .utils import ChatSessionManager
 from .serializers import ChatMessageRequestSerializer
 
 logger = logging.getLogger(__name__)
@@ -28,7 +28,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         super().__init__(*args, **kwargs)
         self.chat_session = None
         self.session_manager = ChatSessionManager()
-        self.router = SmartChatbotRouter()
+        self.router = get_chatbot_router()
         self.user = None
         self.session_id = None
         self.room_group_name = None
@@ -144,48 +144,49 @@ class ChatConsumer(AsyncWebsocketConsumer):
             user_message = await self._save_user_message(message_text, message_type)
             
             # Send typing indicator
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'typing_status',
-                    'typing': True,
-                    'sender': 'bot'
-                }
-            )
+            await self._group_send({
+                'type': 'typing_status',
+                'typing': True,
+                'sender': 'bot'
+            })
             
             # Build context
             context = await self._build_context()
             
-            # Process message with router
-            processing_result = await self.router.process_message(
-                message_text, message_type, None, context
-            )
+            # Stream the reply: intro first, then local and external results, then the full text
+            processing_result = {}
+            async for event in self.router.stream_message(message_text, context):
+                if event['type'] == 'final':
+                    processing_result = event['result']
+                    break
+                await self.send(text_data=json.dumps({
+                    **event,
+                    'timestamp': datetime.now().isoformat()
+                }, default=str))
             
             # Save bot response
             bot_message = await self._save_bot_response(processing_result, user_message)
             
             # Stop typing indicator
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'typing_status',
-                    'typing': False,
-                    'sender': 'bot'
-                }
-            )
+            await self._group_send({
+                'type': 'typing_status',
+                'typing': False,
+                'sender': 'bot'
+            })
             
-            # Send response
+            # Send the complete response (clients that ignore partial frames only need this one)
+            search_results = processing_result.get('search_results') or {}
             await self.send(text_data=json.dumps({
                 'type': 'chat_response',
                 'message_id': str(bot_message.id),
-                'response': processing_result.get('final_response', ''),
+                'response': self._response_text(processing_result),
                 'search_results': {
-                    'local': processing_result.get('local_results', {}),
-                    'external': processing_result.get('external_results', {})
+                    'local': search_results.get('local', {}),
+                    'external': search_results.get('external', {})
                 },
                 'metadata': processing_result.get('metadata', {}),
                 'timestamp': datetime.now().isoformat()
-            }))
+            }, default=str))
             
         except Exception as e:
             logger.error(f"Error handling chat message: {str(e)}")
@@ -195,19 +196,26 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'timestamp': datetime.now().isoformat()
             }))
     
+    async def _group_send(self, event):
+        """Broadcast to the session group; a no-op when no channel layer is configured"""
+        if self.channel_layer is not None:
+            await self.channel_layer.group_send(self.room_group_name, event)
+    
+    @staticmethod
+    def _response_text(processing_result):
+        """Reply text; non-search replies use 'final_response', search replies use 'response'"""
+        return processing_result.get('response') or processing_result.get('final_response', '')
+    
     async def _handle_typing_indicator(self, data):
         """Handle typing indicator"""
         typing = data.get('typing', False)
         
         # Broadcast typing status to other clients in the group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'typing_status',
-                'typing': typing,
-                'sender': 'user'
-            }
-        )
+        await self._group_send({
+            'type': 'typing_status',
+            'typing': typing,
+            'sender': 'user'
+        })
     
     async def _handle_ping(self):
         """Handle ping/keepalive"""
@@ -275,22 +283,31 @@ class ChatConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def _save_bot_response(self, processing_result, user_message):
         """Save bot response to database"""
+        metadata = processing_result.get('metadata', {})
+        search_results = processing_result.get('search_results') or {}
+        
+        # Recorded intents are the training data for the intent classifier
+        intent_type = (processing_result.get('intent') or {}).get('type')
+        if intent_type:
+            user_message.intent_detected = intent_type
+            user_message.save(update_fields=['intent_detected'])
+        
         return ChatMessage.objects.create(
             chat_session=self.chat_session,
             sender_type='bot',
             message_type='text',
-            content=processing_result.get('final_response', ''),
+            content=self._response_text(processing_result),
             search_mode=processing_result.get('search_strategy', 'unknown'),
-            response_time=processing_result.get('metadata', {}).get('processing_time', 0),
-            confidence_score=processing_result.get('metadata', {}).get('confidence_score', 0),
+            response_time=metadata.get('processing_time', processing_result.get('processing_time', 0)),
+            confidence_score=metadata.get('confidence_score', 0),
             search_results_count=(
-                processing_result.get('local_results', {}).get('total_results', 0) +
-                processing_result.get('external_results', {}).get('total_found', 0)
+                search_results.get('local', {}).get('total', 0) +
+                search_results.get('external', {}).get('total', 0)
             ),
             context_data={
                 'intent': processing_result.get('intent', {}),
-                'search_strategy': processing_result.get('search_strategy'),
-                'services_used': processing_result.get('metadata', {}).get('services_used', [])
+                'search_strategy': metadata.get('search_strategy'),
+                'services_used': metadata.get('services_used', [])
             }
         )
     
@@ -0,0 +1,80 @@
+# management/commands/benchmark_gemini_batching.py
+import asyncio
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.services.fake_gemini import FakeGeminiModel
+from chatbot.services.gemini_batcher import GeminiMicroBatcher
+
+SAMPLE_QUERIES = [
+    'iphone 13', 'samsung galaxy a16', 'plumber in lagos', 'hp laptop', 'wedding photographer',
+    'gas cooker', 'toyota corolla 2015', 'hair stylist in abuja', 'air conditioner', 'generator',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure Gemini micro-batching against the offline fake backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Intro prompts to send')
+        parser.add_argument('--rate', type=float, default=100.0, help='Average arrivals per second')
+        parser.add_argument('--latency', type=float, default=0.3, help='Fake Gemini latency per call in seconds')
+        parser.add_argument('--window', type=float, default=15, help='Batching window in milliseconds')
+        parser.add_argument('--batch-size', type=int, default=8, help='Largest batch')
+        parser.add_argument('--sessions', type=int, default=1,
+                            help='Chat sessions the prompts come from; only prompts from one session are batched')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run_benchmark(options))
+
+    async def run_benchmark(self, options):
+        rng = random.Random(42)
+        arrivals = []
+        at = 0.0
+        for _ in range(options['requests']):
+            at += rng.expovariate(options['rate'])
+            session = f"session-{rng.randrange(max(1, options['sessions']))}"
+            arrivals.append((at, session, self._intro_prompt(rng.choice(SAMPLE_QUERIES))))
+
+        for label, batching in (('Unbatched', False), ('Micro-batched', True)):
+            model = FakeGeminiModel(latency=options['latency'])
+
+            async def generate(prompt, generation_config=None):
+                return await asyncio.to_thread(model.generate_content, prompt, generation_config=generation_config)
+
+            batcher = GeminiMicroBatcher(generate, {'max_output_tokens': 2048}, overrides={
+                'ENABLED': batching,
+                'WINDOW_MS': options['window'],
+                'MAX_BATCH_SIZE': options['batch_size'],
+            })
+            latencies, elapsed = await self._replay(batcher, arrivals)
+            latencies.sort()
+            self.stdout.write(
+                f"{label:<14} {len(model.calls):4d} Gemini calls  "
+                f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms  "
+                f"total {elapsed:5.2f} s"
+            )
+
+    async def _replay(self, batcher, arrivals):
+        start = time.perf_counter()
+
+        async def send(at, session, prompt):
+            await asyncio.sleep(max(0.0, at - (time.perf_counter() - start)))
+            sent = time.perf_counter()
+            await batcher.submit(prompt, batch_key=session)
+            return time.perf_counter() - sent
+
+        latencies = await asyncio.gather(*(send(at, session, prompt) for at, session, prompt in arrivals))
+        return list(latencies), time.perf_counter() - start
+
+    @staticmethod
+    def _intro_prompt(query):
+        return (
+            f'Generate a friendly, conversational intro message for a marketplace assistant.\n'
+            f'The user is looking for: "{query}"\n'
+            f'Keep it natural and conversational.'
+        )
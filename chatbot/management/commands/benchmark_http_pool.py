@@ -0,0 +1,75 @@
+# management/commands/benchmark_http_pool.py
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+from django.core.management.base import BaseCommand
+
+from chatbot.services.http_client import SharedHTTPClient
+
+
+class Command(BaseCommand):
+    help = 'Compare a session per request against the shared HTTP pool using a local stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per run')
+        parser.add_argument('--concurrency', type=int, default=10, help='Requests in flight at once')
+        parser.add_argument('--latency', type=float, default=0.005, help='Stub server delay in seconds')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run_benchmark(options['requests'], options['concurrency'], options['latency']))
+
+    async def run_benchmark(self, total, concurrency, latency):
+        connections = set()
+
+        async def handler(request):
+            # Each TCP connection has its own client port; reuse shows up as repeats
+            connections.add(request.transport.get_extra_info('peername'))
+            await asyncio.sleep(latency)
+            return web.json_response({'search_metadata': {'status': 'Success'}, 'shopping_results': []})
+
+        app = web.Application()
+        app.router.add_get('/search', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        url = f'http://127.0.0.1:{port}/search'
+
+        try:
+            async def per_call(_):
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+                    async with session.get(url) as response:
+                        await response.json()
+
+            client = SharedHTTPClient()
+
+            async def pooled(_):
+                session = await client.get_session()
+                async with session.get(url) as response:
+                    await response.json()
+
+            for label, fetch in (('Session per request', per_call), ('Shared pool', pooled)):
+                connections.clear()
+                elapsed = await self._run(fetch, total, concurrency)
+                self.stdout.write(
+                    f'{label:<20} {elapsed * 1000:8.1f} ms total  '
+                    f'{elapsed * 1000 / total:6.2f} ms/request  {len(connections)} TCP connections'
+                )
+
+            await client.close()
+        finally:
+            await runner.cleanup()
+
+    async def _run(self, fetch, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(i):
+            async with semaphore:
+                await fetch(i)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(i) for i in range(total)))
+        return time.perf_counter() - start
@@ -0,0 +1,107 @@
+# management/commands/benchmark_intent_engine.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.models import ChatMessage
+from chatbot.services.intent_engine import INTENT_CLASSES, INTENT_OTHER, IntentEngine, train_seed_model
+
+# The substring keyword lists SmartChatbotRouter._detect_intent used before the classifier
+LEGACY_PRODUCT_KEYWORDS = [
+    'buy', 'sell', 'purchase', 'price', 'cost', 'product', 'item', 'shopping',
+    'phone', 'laptop', 'computer', 'tablet', 'tv', 'camera', 'watch', 'headphones',
+    'speaker', 'gadget', 'device', 'electronics', 'smartphone', 'iphone', 'android',
+    'samsung', 'apple', 'hp', 'dell', 'sony', 'lg', 'nike', 'adidas', 'canon', 'huawei',
+    'clothing', 'shoes', 'furniture', 'car', 'vehicle', 'book', 'jewelry', 'bag', 'accessory',
+    'find', 'looking for', 'need', 'want', 'search for', 'show me', 'i want', 'get me'
+]
+LEGACY_SERVICE_KEYWORDS = [
+    'service', 'hire', 'book', 'appointment', 'professional', 'expert', 'help', 'assist',
+    'repair', 'fix', 'cleaning', 'plumbing', 'electrician', 'mechanic', 'doctor',
+    'lawyer', 'teacher', 'tutor', 'consultant', 'designer', 'developer', 'writer',
+    'photographer', 'catering', 'delivery', 'transport', 'uber', 'taxi', 'driver',
+    'massage', 'barber', 'salon', 'fitness', 'trainer', 'coach', 'therapist'
+]
+
+
+def legacy_intent(message):
+    message_lower = message.lower()
+    product_score = sum(
+        2 if keyword == message_lower.strip() else 1
+        for keyword in LEGACY_PRODUCT_KEYWORDS if keyword in message_lower
+    )
+    service_score = sum(
+        2 if keyword == message_lower.strip() else 1
+        for keyword in LEGACY_SERVICE_KEYWORDS if keyword in message_lower
+    )
+    if product_score > 0 or service_score > 0:
+        return 'product' if product_score >= service_score else 'service'
+    return INTENT_OTHER
+
+
+class Command(BaseCommand):
+    help = 'Compare the intent classifier with the old substring keyword scoring on real chat messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=5000, help='Most recent user messages to classify')
+        parser.add_argument('--file', help='Read messages from a text file (one per line) instead of the database')
+        parser.add_argument('--seed-only', action='store_true', help='Use the seed model, not the published one')
+        parser.add_argument('--repeat', type=int, default=3, help='Passes over the corpus for timing')
+
+    def handle(self, *args, **options):
+        corpus = self._load_corpus(options)
+        if not corpus:
+            self.stdout.write('No messages to classify')
+            return
+
+        if options['seed_only']:
+            engine = IntentEngine(train_seed_model(), version='seed')
+        else:
+            from chatbot.services.registry import get_intent_classifier
+            engine = get_intent_classifier().engine()
+        messages = [message for message, _ in corpus]
+
+        legacy_labels, legacy_time = self._time(legacy_intent, messages, options['repeat'])
+        engine_labels, engine_time = self._time(
+            lambda message: engine.classify(message)['intent'], messages, options['repeat']
+        )
+
+        self.stdout.write(f"Messages: {len(messages)}  model: {engine.version}")
+        for label, elapsed in (('Substring keywords', legacy_time), ('Intent classifier', engine_time)):
+            self.stdout.write(
+                f"{label:<19} {elapsed / len(messages) * 1e6:8.1f} us/message  "
+                f"{len(messages) / elapsed:10.0f} messages/s"
+            )
+
+        agreement = sum(1 for a, b in zip(legacy_labels, engine_labels) if a == b) / len(messages)
+        self.stdout.write(f"Agreement: {agreement:.1%}")
+
+        labelled = [(index, label) for index, (_, label) in enumerate(corpus) if label in INTENT_CLASSES]
+        if labelled:
+            for name, predicted in (('Substring keywords', legacy_labels), ('Intent classifier', engine_labels)):
+                correct = sum(1 for index, label in labelled if predicted[index] == label)
+                self.stdout.write(f"{name:<19} accuracy {correct / len(labelled):.1%} on {len(labelled)} labelled messages")
+
+        changed = [
+            (message, old, new)
+            for message, old, new in zip(messages, legacy_labels, engine_labels) if old != new
+        ]
+        for message, old, new in changed[:20]:
+            self.stdout.write(f"  {old:>7} -> {new:<7} {message[:80]}")
+
+    def _load_corpus(self, options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as handle:
+                return [(line.strip(), None) for line in handle if line.strip()]
+        return list(
+            ChatMessage.objects.filter(sender_type='user')
+            .order_by('-created_at')
+            .values_list('content', 'intent_detected')[:options['limit']]
+        )
+
+    @staticmethod
+    def _time(classify, messages, repeat):
+        start = time.perf_counter()
+        for _ in range(max(1, repeat)):
+            labels = [classify(message) for message in messages]
+        return labels, (time.perf_counter() - start) / max(1, repeat)
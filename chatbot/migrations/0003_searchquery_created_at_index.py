@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_chatmessage_chat_session_chatsession_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchquery',
+            index=models.Index(fields=['created_at'], name='chatbot_sea_created_38f588_idx'),
+        ),
+    ]
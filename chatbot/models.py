@@ -180,6 +180,7 @@ class SearchQuery(models.Model):
         indexes = [
             models.Index(fields=['search_type', 'created_at']),
             models.Index(fields=['source_used']),
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
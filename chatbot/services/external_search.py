@@ -2,7 +2,7 @@
 import logging
 import asyncio
 from typing import Dict, List, Any, Optional, Tuple
-from .serpapi_service import SerpAPIService
+from .registry import get_serpapi_service
 from ..utils import SearchHelper, CacheManager, PerformanceMonitor
 
 logger = logging.getLogger(__name__)
@@ -13,7 +13,7 @@ class EnhancedExternalSearchService:
     """
     
     def __init__(self, config=None):
-        self.serpapi = SerpAPIService()
+        self.serpapi = get_serpapi_service()
         self.cache_manager = CacheManager()
         self.search_helper = SearchHelper()
         self.performance_monitor = PerformanceMonitor()
@@ -0,0 +1,69 @@
+# chatbot/services/fake_gemini.py - Offline stand-in for google.generativeai.GenerativeModel
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+BATCH_REQUEST_PATTERN = re.compile(r'^REQUEST (\d+):\n', re.MULTILINE)
+# Intro and web search prompts quote the query; chat prompts end with the user message
+USER_TEXT_PATTERNS = [
+    re.compile(r'The user is looking for: "([^"\n]+)"'),
+    re.compile(r'USER MESSAGE: *([^\n]*\w[^\n]*)'),
+]
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Answers generate_content() locally after a fixed delay, so batching,
+    rate limiting and latency can be exercised without an API key.
+
+    Select it with CHATBOT_SETTINGS['GEMINI_BACKEND'] = 'fake'. Batched
+    prompts get a JSON array with one answer per REQUEST block; every call
+    is recorded in .calls.
+    """
+
+    def __init__(self, latency: float = 0.3, model_name: str = 'fake-gemini'):
+        self.latency = latency
+        self.model_name = model_name
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config: Optional[Dict] = None,
+                         safety_settings=None, stream: bool = False):
+        prompt = contents if isinstance(contents, str) else ' '.join(c for c in contents if isinstance(c, str))
+        with self._lock:
+            self.calls.append({'prompt': prompt, 'generation_config': generation_config, 'stream': stream})
+
+        # Called from worker threads, like the SDK's blocking network call
+        time.sleep(self.latency)
+        text = self._answer(prompt, generation_config or {})
+        if stream:
+            return [FakeResponse(word + ' ') for word in text.split()]
+        return FakeResponse(text)
+
+    def _answer(self, prompt: str, generation_config: Dict) -> str:
+        parts = BATCH_REQUEST_PATTERN.split(prompt)
+        if generation_config.get('response_mime_type') == 'application/json' and len(parts) > 1:
+            # split() yields [preamble, number, body, number, body, ...]
+            return json.dumps([self._reply_to(body) for body in parts[2::2]])
+        return self._reply_to(prompt)
+
+    @staticmethod
+    def _reply_to(prompt: str) -> str:
+        subject = 'that'
+        for pattern in USER_TEXT_PATTERNS:
+            match = pattern.search(prompt)
+            if match:
+                subject = match.group(1).strip()
+                break
+        return f"Sure! Let me help you with {subject}."
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
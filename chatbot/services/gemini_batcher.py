@@ -0,0 +1,182 @@
+# chatbot/services/gemini_batcher.py - Micro-batching for short Gemini prompts
+import asyncio
+import json
+import logging
+import re
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCHING = {
+    'ENABLED': True,
+    'WINDOW_MS': 15,            # How long the first prompt waits for company
+    'MAX_BATCH_SIZE': 8,
+    'MAX_PROMPT_CHARS': 4000,   # Longer prompts are sent on their own
+    'MAX_OUTPUT_TOKENS': 8192,  # Ceiling for the scaled-up batch response
+}
+
+BATCH_INSTRUCTIONS = """
+You will receive {count} independent requests, numbered REQUEST 1 to REQUEST {count}.
+Answer each one exactly as if it had been sent on its own.
+Respond with a JSON array of exactly {count} strings; string i is the complete answer to REQUEST i.
+"""
+
+JSON_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def build_batch_prompt(preamble: str, bodies: List[str]) -> str:
+    """One prompt carrying every request; the shared preamble is sent once"""
+    parts = [preamble.strip()] if preamble.strip() else []
+    parts.append(BATCH_INSTRUCTIONS.format(count=len(bodies)).strip())
+    for number, body in enumerate(bodies, 1):
+        parts.append(f"REQUEST {number}:\n{body.strip()}")
+    return '\n\n'.join(parts)
+
+
+def split_batch_response(text: str, count: int) -> Optional[List[str]]:
+    """The per-request answers, or None when the model did not follow the format"""
+    try:
+        answers = json.loads(JSON_FENCE_PATTERN.sub('', (text or '').strip()))
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return [answer if isinstance(answer, str) else json.dumps(answer) for answer in answers]
+
+
+class BatchedResponse:
+    """Stands in for the SDK response object; callers only read .text"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _PendingBatch:
+    def __init__(self, preamble: str):
+        self.preamble = preamble
+        self.items = []  # (full prompt, body, future)
+        self.timer = None
+
+
+class GeminiMicroBatcher:
+    """
+    Collects short prompts that arrive within WINDOW_MS of each other and
+    sends them as one structured request, then hands each caller its own
+    answer. Prompts are grouped by their shared preamble (system prompt) so
+    it is only sent once per batch.
+
+    Prompts carry user text, so a batch never mixes callers: only prompts
+    with the same batch_key (one chat session) share a request, and a
+    prompt without a batch_key is sent on its own. Otherwise one user's
+    message could steer or read another user's answer.
+
+    A prompt that ends up alone is sent unchanged. If the batched answer
+    cannot be split, the prompts are retried one by one, so callers never see
+    the batching. If the batched call itself fails (rate limit, quota,
+    timeout), every caller gets that error: retrying each prompt would turn
+    one rejected call into N more.
+    """
+
+    def __init__(self, generate: Callable[..., Awaitable[Any]], generation_config: Dict, overrides: Dict = None):
+        # generate(prompt, generation_config=None) -> response with .text
+        self.generate = generate
+        self.generation_config = generation_config
+        self.overrides = overrides or {}
+        # Event loop -> {(preamble, batch_key): _PendingBatch}
+        self._pending = weakref.WeakKeyDictionary()
+        self._sending = set()  # Strong references so running batches are not garbage collected
+
+    @property
+    def config(self) -> Dict:
+        return {
+            **DEFAULT_BATCHING,
+            **getattr(settings, 'CHATBOT_SETTINGS', {}).get('GEMINI_BATCHING', {}),
+            **self.overrides,
+        }
+
+    async def submit(self, prompt: str, preamble: str = '', body: Optional[str] = None,
+                     batch_key: Optional[str] = None) -> Any:
+        """
+        Generate a response for prompt, possibly batched with others.
+        preamble + body is the same request split at the part batches can share.
+        batch_key scopes who it may be batched with (the chat session id).
+        """
+        config = self.config
+        body = prompt if body is None else body
+        if not config['ENABLED'] or batch_key is None or len(body) > config['MAX_PROMPT_CHARS']:
+            return await self.generate(prompt)
+
+        loop = asyncio.get_running_loop()
+        batches = self._pending.setdefault(loop, {})
+        group = (preamble, batch_key)
+        batch = batches.get(group)
+        if batch is None:
+            batch = batches[group] = _PendingBatch(preamble)
+            batch.timer = loop.call_later(config['WINDOW_MS'] / 1000.0, self._flush, loop, group)
+
+        future = loop.create_future()
+        batch.items.append((prompt, body, future))
+        if len(batch.items) >= config['MAX_BATCH_SIZE']:
+            batch.timer.cancel()
+            self._flush(loop, group)
+        return await future
+
+    def _flush(self, loop, group):
+        batch = self._pending.get(loop, {}).pop(group, None)
+        if batch is not None and batch.items:
+            task = loop.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: _PendingBatch):
+        items = [item for item in batch.items if not item[2].cancelled()]
+        if not items:
+            return
+        if len(items) == 1:
+            await self._send_single(items[0])
+            return
+
+        try:
+            response = await self.generate(
+                build_batch_prompt(batch.preamble, [body for _, body, _ in items]),
+                generation_config=self._batch_generation_config(len(items)),
+            )
+        except Exception as e:
+            logger.error(f"Batched Gemini request failed: {str(e)}")
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        answers = split_batch_response(getattr(response, 'text', ''), len(items))
+        if answers is None:
+            logger.warning(f"Could not split batched Gemini answer, sending {len(items)} prompts individually")
+            await asyncio.gather(*(self._send_single(item) for item in items))
+            return
+
+        logger.info(f"Answered {len(items)} Gemini prompts with one request")
+        for (_, _, future), answer in zip(items, answers):
+            if not future.done():
+                future.set_result(BatchedResponse(answer))
+
+    async def _send_single(self, item):
+        prompt, _, future = item
+        try:
+            response = await self.generate(prompt)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(response)
+
+    def _batch_generation_config(self, count: int) -> Dict:
+        base_tokens = self.generation_config.get('max_output_tokens', 2048)
+        return {
+            **self.generation_config,
+            'response_mime_type': 'application/json',
+            'max_output_tokens': min(base_tokens * count, self.config['MAX_OUTPUT_TOKENS']),
+        }
@@ -3,17 +3,21 @@ import os
 import json
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional, Union
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from google.api_core.exceptions import ResourceExhausted
 from django.conf import settings
-from django.core.cache import cache
 import requests
 from PIL import Image
 import io
 import base64
 
+from .rate_limiter import gemini_rate_limiter
+from .prompt_cache import prompt_cache
+from .gemini_batcher import GeminiMicroBatcher
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,16 +28,22 @@ class GeminiAIClient:
     """
     
     def __init__(self):
-        # Initialize Gemini
-        self.api_key = getattr(settings, 'GOOGLE_API_KEY', os.getenv('GOOGLE_API_KEY'))
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY is required")
-        
-        genai.configure(api_key=self.api_key)
-        
-        # Model configuration
+        chatbot_settings = getattr(settings, 'CHATBOT_SETTINGS', {})
         self.model_name = getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-flash')
-        self.model = genai.GenerativeModel(self.model_name)
+        
+        if chatbot_settings.get('GEMINI_BACKEND', 'sdk') == 'fake':
+            # Offline backend for development and load tests; no API key needed
+            from .fake_gemini import FakeGeminiModel
+            self.api_key = None
+            self.model = FakeGeminiModel(latency=chatbot_settings.get('GEMINI_FAKE_LATENCY', 0.3))
+        else:
+            # Initialize Gemini
+            self.api_key = getattr(settings, 'GOOGLE_API_KEY', os.getenv('GOOGLE_API_KEY'))
+            if not self.api_key:
+                raise ValueError("GOOGLE_API_KEY is required")
+            
+            genai.configure(api_key=self.api_key)
+            self.model = genai.GenerativeModel(self.model_name)
         
         # Safety settings - adjusted for marketplace use
         self.safety_settings = {
@@ -51,6 +61,9 @@ class GeminiAIClient:
             'max_output_tokens': 2048,
         }
         
+        # Short prompts from the same chat session arriving together share one API call
+        self.batcher = GeminiMicroBatcher(self._generate_with_retry, self.generation_config)
+        
         # Marketplace-specific prompts
         self.system_prompts = {
             'marketplace_assistant': self._load_marketplace_prompt(),
@@ -60,12 +73,11 @@ class GeminiAIClient:
             'image_analyzer': self._load_image_analyzer_prompt()
         }
         
-        # Cache settings
-        self.cache_timeout = 1800  # 30 minutes
+        # Cache settings; per-prompt-type TTLs live in CHATBOT_SETTINGS['PROMPT_CACHE']
+        self.prompt_cache = prompt_cache
         
-        # Rate limiting
-        self.last_request_time = None
-        self.min_request_interval = 1.0  # 1 second between requests
+        # Rate limiting, shared with every other client in every process
+        self.rate_limiter = gemini_rate_limiter
     
     def _load_marketplace_prompt(self) -> str:
         """Load the main marketplace assistant prompt"""
@@ -170,7 +182,8 @@ class GeminiAIClient:
         user_message: str, 
         context: Dict[str, Any] = None,
         prompt_type: str = 'marketplace_assistant',
-        include_search_results: bool = True
+        include_search_results: bool = True,
+        batch_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate AI response for user message
@@ -180,33 +193,39 @@ class GeminiAIClient:
             context: Conversation and search context
             prompt_type: Type of prompt to use
             include_search_results: Whether to include search results in context
+            batch_key: Chat session whose other short prompts this one may share
+                a request with (intros); None sends it on its own
             
         Returns:
             Dict containing AI response and metadata
         """
         try:
-            # Rate limiting
-            await self._rate_limit()
-            
             # Build the full prompt
-            full_prompt = self._build_prompt(
+            system_prompt, prompt_body = self._build_prompt_parts(
                 user_message, 
                 context, 
                 prompt_type, 
                 include_search_results
             )
+            full_prompt = self._join_prompt(system_prompt, prompt_body)
             
-            # Check cache
-            cache_key = self._generate_cache_key(full_prompt)
-            cached_response = cache.get(cache_key)
+            # Check cache: exact prompt first, then the same question in the same context
+            exact_key = self.prompt_cache.exact_key(full_prompt)
+            intent_key = self.prompt_cache.intent_key(prompt_type, user_message, context, include_search_results)
+            cached_response, layer = await self.prompt_cache.get(prompt_type, exact_key, intent_key)
             if cached_response:
-                logger.info("Returning cached Gemini response")
+                logger.info(f"Returning cached Gemini response ({layer} match)")
                 return cached_response
             
             # Generate response
             start_time = datetime.now()
             
-            response = await self._generate_with_retry(full_prompt)
+            if batch_key is not None:
+                response = await self.batcher.submit(
+                    full_prompt, preamble=system_prompt, body=prompt_body, batch_key=batch_key
+                )
+            else:
+                response = await self._generate_with_retry(full_prompt)
             
             end_time = datetime.now()
             response_time = (end_time - start_time).total_seconds()
@@ -228,7 +247,7 @@ class GeminiAIClient:
                 result['structured_info'] = structured_info
             
             # Cache the response
-            cache.set(cache_key, result, self.cache_timeout)
+            await self.prompt_cache.set(prompt_type, exact_key, intent_key, result)
             
             logger.info(f"Generated Gemini response in {response_time:.2f}s")
             return result
@@ -243,6 +262,56 @@ class GeminiAIClient:
                 'timestamp': datetime.now().isoformat()
             }
     
+    async def stream_response(
+        self,
+        user_message: str,
+        context: Dict[str, Any] = None,
+        prompt_type: str = 'marketplace_assistant',
+        include_search_results: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Yield the response text chunk by chunk as Gemini generates it.
+
+        The blocking SDK iterator runs in a worker thread and hands chunks
+        back to the event loop through a queue. Raises on API errors so the
+        caller can fall back to a non-streamed reply.
+        """
+        await self._rate_limit()
+        
+        full_prompt = self._build_prompt(user_message, context, prompt_type, include_search_results)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+        
+        def produce():
+            try:
+                response = self.model.generate_content(
+                    full_prompt,
+                    generation_config=self.generation_config,
+                    safety_settings=self.safety_settings,
+                    stream=True
+                )
+                for chunk in response:
+                    text = getattr(chunk, 'text', '')
+                    if text:
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+            except Exception as e:
+                if isinstance(e, ResourceExhausted):
+                    self.rate_limiter.penalize()
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+        
+        # If the caller stops early the thread just drains the rest of the stream
+        loop.run_in_executor(None, produce)
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
     async def analyze_image(self, image_data: Union[str, bytes], user_message: str = "") -> Dict[str, Any]:
         """
         Analyze uploaded image using Gemini Vision
@@ -255,9 +324,6 @@ class GeminiAIClient:
             Dict containing image analysis results
         """
         try:
-            # Rate limiting
-            await self._rate_limit()
-            
             # Process image
             image = self._process_image(image_data)
             if not image:
@@ -314,16 +380,15 @@ class GeminiAIClient:
             Dict containing web search results and product information
         """
         try:
-            # Rate limiting
-            await self._rate_limit()
-            
             # Build web search prompt
             web_search_prompt = self._build_web_search_prompt(query, context)
             
             start_time = datetime.now()
             
             # First, ask Gemini to suggest search strategies and keywords
-            strategy_response = await self._generate_with_retry(web_search_prompt)
+            strategy_response = await self.batcher.submit(
+                web_search_prompt, batch_key=(context or {}).get('session_id')
+            )
             
             # Extract search keywords from Gemini's response
             search_keywords = self._extract_search_keywords(strategy_response.text)
@@ -375,14 +440,11 @@ class GeminiAIClient:
                     'success': False
                 }
             
-            # Rate limiting
-            await self._rate_limit()
-            
             # Build comparison prompt
             comparison_prompt = self._build_comparison_prompt(products)
             
             start_time = datetime.now()
-            response = await self._generate_with_retry(comparison_prompt)
+            response = await self.batcher.submit(comparison_prompt)
             end_time = datetime.now()
             
             result = {
@@ -403,18 +465,22 @@ class GeminiAIClient:
                 'success': False
             }
     
-    async def _generate_with_retry(self, prompt: str, max_retries: int = 3) -> Any:
+    async def _generate_with_retry(self, prompt: str, max_retries: int = 3, generation_config: Dict = None) -> Any:
         """Generate response with retry logic"""
         for attempt in range(max_retries):
+            # Every attempt is a billable call, so each one waits for a token
+            await self._rate_limit()
             try:
                 response = await asyncio.to_thread(
                     self.model.generate_content,
                     prompt,
-                    generation_config=self.generation_config,
+                    generation_config=generation_config or self.generation_config,
                     safety_settings=self.safety_settings
                 )
                 return response
             except Exception as e:
+                if isinstance(e, ResourceExhausted):
+                    self.rate_limiter.penalize()
                 if attempt == max_retries - 1:
                     raise e
                 await asyncio.sleep(2 ** attempt)  # Exponential backoff
@@ -422,6 +488,7 @@ class GeminiAIClient:
     async def _generate_with_image(self, prompt: str, image: Any) -> Any:
         """Generate response with image input"""
         try:
+            await self._rate_limit()
             response = await asyncio.to_thread(
                 self.model.generate_content,
                 [prompt, image],
@@ -441,6 +508,19 @@ class GeminiAIClient:
         include_search_results: bool
     ) -> str:
         """Build the complete prompt for Gemini"""
+        return self._join_prompt(*self._build_prompt_parts(user_message, context, prompt_type, include_search_results))
+    
+    def _join_prompt(self, system_prompt: str, prompt_body: str) -> str:
+        return f"\n{system_prompt}\n{prompt_body}"
+    
+    def _build_prompt_parts(
+        self, 
+        user_message: str, 
+        context: Dict[str, Any], 
+        prompt_type: str,
+        include_search_results: bool
+    ) -> Tuple[str, str]:
+        """(system prompt, request-specific part) of the prompt for Gemini"""
         
         # Start with system prompt
         system_prompt = self.system_prompts.get(prompt_type, self.system_prompts['marketplace_assistant'])
@@ -489,10 +569,8 @@ class GeminiAIClient:
                 
                 context_info += f"Total Results: {search_results.get('total_results', 0)}\n"
         
-        # Build the complete prompt
-        complete_prompt = f"""
-{system_prompt}
-
+        # Build the request-specific part; _join_prompt puts the system prompt in front
+        prompt_body = f"""
 {context_info}
 
 USER MESSAGE: {user_message}
@@ -500,7 +578,7 @@ USER MESSAGE: {user_message}
 Please provide a helpful, accurate, and personalized response based on the context and search results provided. If you're recommending products or services, explain why they match the user's needs and provide relevant details like pricing, location, and features.
 """
         
-        return complete_prompt
+        return system_prompt, prompt_body
     
     def _build_image_analysis_prompt(self, user_message: str = "") -> str:
         """Build prompt for image analysis"""
@@ -725,18 +803,8 @@ Please be specific and help the user make an informed decision.
             return None
     
     async def _rate_limit(self):
-        """Simple rate limiting"""
-        if self.last_request_time:
-            time_since_last = (datetime.now() - self.last_request_time).total_seconds()
-            if time_since_last < self.min_request_interval:
-                await asyncio.sleep(self.min_request_interval - time_since_last)
-        
-        self.last_request_time = datetime.now()
-    
-    def _generate_cache_key(self, prompt: str) -> str:
-        """Generate cache key for the prompt"""
-        import hashlib
-        return f"gemini_response_{hashlib.md5(prompt.encode()).hexdigest()}"
+        """Wait for a slot in the Gemini quota; raises RateLimitExceeded past the deadline"""
+        await self.rate_limiter.acquire()
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the current model"""
@@ -0,0 +1,107 @@
+# chatbot/services/http_client.py - Shared aiohttp session for outbound integrations
+import asyncio
+import atexit
+import logging
+import weakref
+from typing import Dict, Optional
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_POOL = {
+    'LIMIT': 100,              # Open connections across all hosts
+    'LIMIT_PER_HOST': 20,      # Open connections to one host (serpapi.com, googleapis.com, ...)
+    'DNS_CACHE_TTL': 300,      # Seconds resolved addresses are reused
+    'KEEPALIVE_TIMEOUT': 30,   # Seconds an idle connection stays in the pool
+    'CONNECT_TIMEOUT': 5,
+    'TOTAL_TIMEOUT': 15,
+}
+
+
+def get_pool_settings() -> Dict:
+    return {
+        **DEFAULT_HTTP_POOL,
+        **getattr(settings, 'CHATBOT_SETTINGS', {}).get('HTTP_POOL', {}),
+    }
+
+
+def request_timeout(total: Optional[float] = None) -> aiohttp.ClientTimeout:
+    """Per-request timeout; callers pass their own total, connect comes from HTTP_POOL"""
+    pool = get_pool_settings()
+    total = total if total is not None else pool['TOTAL_TIMEOUT']
+    return aiohttp.ClientTimeout(total=total, connect=min(pool['CONNECT_TIMEOUT'], total))
+
+
+class SharedHTTPClient:
+    """
+    Process-wide aiohttp session so SerpAPI, Google, Bing and scraping calls
+    reuse pooled keep-alive connections and cached DNS lookups instead of
+    paying a TCP + TLS handshake per request.
+
+    aiohttp sessions are bound to the event loop they were created on, so one
+    session is kept per loop. Sessions left behind by short-lived loops
+    (async_to_sync in Celery tasks) are dropped the next time a session is
+    requested. The server loop's session is closed on ASGI lifespan shutdown
+    (master.asgi); anything left is closed at interpreter exit.
+    """
+
+    def __init__(self):
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        pool = get_pool_settings()
+        connector = aiohttp.TCPConnector(
+            limit=pool['LIMIT'],
+            limit_per_host=pool['LIMIT_PER_HOST'],
+            use_dns_cache=True,
+            ttl_dns_cache=pool['DNS_CACHE_TTL'],
+            keepalive_timeout=pool['KEEPALIVE_TIMEOUT'],
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=request_timeout())
+
+    def _prune_closed_loops(self):
+        for loop, session in list(self._sessions.items()):
+            if loop.is_closed():
+                # The loop's sockets are gone with it; just stop tracking the session
+                session.detach()
+                self._sessions.pop(loop, None)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            self._prune_closed_loops()
+            session = self._create_session()
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Close the session of the running loop (ASGI shutdown, end of a management command)"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    def close_all(self):
+        """Close sessions whose loops are idle; registered with atexit"""
+        for loop, session in list(self._sessions.items()):
+            if session.closed or loop.is_closed() or loop.is_running():
+                continue
+            try:
+                loop.run_until_complete(session.close())
+            except Exception as e:
+                logger.error(f"Error closing shared HTTP session: {str(e)}")
+        self._sessions.clear()
+
+
+http_client = SharedHTTPClient()
+atexit.register(http_client.close_all)
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    return await http_client.get_session()
+
+
+async def close_http_session():
+    await http_client.close()
@@ -0,0 +1,446 @@
+# chatbot/services/intent_engine.py - Compiled phrase matching and a trainable intent classifier
+import logging
+import math
+import random
+import re
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from main.snapshots import VersionedSnapshotHolder
+
+logger = logging.getLogger(__name__)
+
+INTENT_PRODUCT = 'product'
+INTENT_SERVICE = 'service'
+INTENT_OTHER = 'other'
+INTENT_CLASSES = (INTENT_PRODUCT, INTENT_SERVICE, INTENT_OTHER)
+
+MODEL_CACHE_KEY = 'intent_classifier_model'
+MODEL_VERSION_CACHE_KEY = 'intent_classifier_version'
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[$₦]')
+
+# Phrase -> label. Matched on whole words, so 'tv' no longer fires inside 'activity'
+# and 'hp' no longer fires inside 'shop'.
+INTENT_LEXICON = {
+    **{phrase: INTENT_PRODUCT for phrase in [
+        # General shopping terms
+        'buy', 'sell', 'purchase', 'price', 'cost', 'product', 'item', 'shopping',
+        # Electronics
+        'phone', 'laptop', 'computer', 'tablet', 'tv', 'camera', 'watch', 'headphones',
+        'speaker', 'gadget', 'device', 'electronics', 'smartphone', 'iphone', 'android',
+        # Brands
+        'samsung', 'apple', 'hp', 'dell', 'sony', 'lg', 'nike', 'adidas', 'canon', 'huawei',
+        # Other products
+        'clothing', 'shoes', 'furniture', 'car', 'vehicle', 'jewelry', 'bag', 'accessory',
+    ]},
+    **{phrase: INTENT_SERVICE for phrase in [
+        # General service terms
+        'service', 'hire', 'appointment', 'professional', 'expert', 'help', 'assist',
+        # Specific services
+        'repair', 'fix', 'cleaning', 'plumbing', 'plumber', 'electrician', 'mechanic', 'doctor',
+        'lawyer', 'teacher', 'tutor', 'consultant', 'designer', 'developer', 'writer',
+        'photographer', 'catering', 'delivery', 'transport', 'uber', 'taxi', 'driver',
+        'massage', 'barber', 'salon', 'fitness', 'trainer', 'coach', 'therapist',
+    ]},
+    # Search phrasing says the user wants something, not what kind of thing
+    # ('book' is both the thing and the verb, so the model learns it from context)
+    **{phrase: 'cue' for phrase in [
+        'find', 'looking for', 'need', 'want', 'search for', 'show me', 'i want', 'get me', 'book',
+    ]},
+}
+
+# Always part of training so the classifier is usable before any history exists
+SEED_EXAMPLES = [
+    ('i need a samsung galaxy a16', INTENT_PRODUCT),
+    ('looking for a used toyota corolla', INTENT_PRODUCT),
+    ('cheap laptops under 300k', INTENT_PRODUCT),
+    ('where can i buy an iphone 13 in lagos', INTENT_PRODUCT),
+    ('show me gas cookers', INTENT_PRODUCT),
+    ('how much is a 32 inch tv', INTENT_PRODUCT),
+    ('wedding gown for sale', INTENT_PRODUCT),
+    ('generator 5kva', INTENT_PRODUCT),
+    ('fridge', INTENT_PRODUCT),
+    ('bed frame', INTENT_PRODUCT),
+    ('solar panels and inverter', INTENT_PRODUCT),
+    ('air conditioner in abuja', INTENT_PRODUCT),
+    ('toyota camry 2015', INTENT_PRODUCT),
+    ('bag of rice', INTENT_PRODUCT),
+    ('office chair', INTENT_PRODUCT),
+    ('baby clothes', INTENT_PRODUCT),
+    ('ps5 console', INTENT_PRODUCT),
+    ('looking for a cleaning service in lagos', INTENT_SERVICE),
+    ('i need a plumber in ikeja', INTENT_SERVICE),
+    ('book a barber for saturday', INTENT_SERVICE),
+    ('hire a wedding photographer', INTENT_SERVICE),
+    ('phone repair near me', INTENT_SERVICE),
+    ('find me a maths tutor', INTENT_SERVICE),
+    ('generator repair technician', INTENT_SERVICE),
+    ('makeup artist in lekki', INTENT_SERVICE),
+    ('maths lessons for my son', INTENT_SERVICE),
+    ('event planner', INTENT_SERVICE),
+    ('tailor to sew agbada', INTENT_SERVICE),
+    ('house painting', INTENT_SERVICE),
+    ('ac installation', INTENT_SERVICE),
+    ('hello', INTENT_OTHER),
+    ('hi there', INTENT_OTHER),
+    ('good morning', INTENT_OTHER),
+    ('how are you', INTENT_OTHER),
+    ('thank you', INTENT_OTHER),
+    ('thanks bye', INTENT_OTHER),
+    ('what can you do', INTENT_OTHER),
+    ('who are you', INTENT_OTHER),
+    ('tell me a joke', INTENT_OTHER),
+    ('what is your name', INTENT_OTHER),
+    ('ok', INTENT_OTHER),
+    ('okay thanks', INTENT_OTHER),
+    ('yes', INTENT_OTHER),
+    ('no', INTENT_OTHER),
+    ('alright', INTENT_OTHER),
+    ('lol', INTENT_OTHER),
+    ('how do i reset my password', INTENT_OTHER),
+    ('i forgot my password', INTENT_OTHER),
+    ('how do i delete my account', INTENT_OTHER),
+    ('why was my listing removed', INTENT_OTHER),
+    ('who won the match yesterday', INTENT_OTHER),
+    ('what is the weather today', INTENT_OTHER),
+    ('what time is it', INTENT_OTHER),
+    ('who is the president', INTENT_OTHER),
+    ('did you see the news', INTENT_OTHER),
+    ('good night', INTENT_OTHER),
+]
+
+NOT_PRODUCT_SERVICE_RESPONSE = (
+    "I'm here to help you find products and services! Please ask me about items you'd like to buy "
+    "or services you need. For example: 'I need a Samsung Galaxy A16' or 'Looking for a cleaning service in Lagos'."
+)
+
+
+def get_intent_setting(name, default):
+    return getattr(settings, 'CHATBOT_SETTINGS', {}).get('INTENT_ENGINE', {}).get(name, default)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+# ===========================
+#  PHRASE MATCHING
+# ===========================
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over word tokens. One pass over the message finds
+    every lexicon phrase, including multi-word ones, however many there are.
+    """
+
+    def __init__(self, phrases: Iterable[Tuple[str, str]]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for phrase, label in phrases:
+            node = 0
+            length = 0
+            for token in tokenize(phrase):
+                length += 1
+                child = self._goto[node].get(token)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][token] = child
+                node = child
+            if node:
+                self._out[node].append((phrase, label, length))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, tokens: Iterable[str]) -> List[Tuple[str, str]]:
+        """(phrase, label) for every match, in message order"""
+        return [(phrase, label) for _, _, phrase, label in self.spans(tokens)]
+
+    def spans(self, tokens: Iterable[str]) -> List[Tuple[int, int, str, str]]:
+        """(start, end, phrase, label) token spans for every match, overlaps included"""
+        node = 0
+        hits = []
+        for position, token in enumerate(tokens):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for phrase, label, length in self._out[node]:
+                hits.append((position + 1 - length, position + 1, phrase, label))
+        return hits
+
+
+# ===========================
+#  CLASSIFIER
+# ===========================
+
+def extract_features(tokens: List[str], hits: List[Tuple[str, str]]) -> Dict[str, float]:
+    features = {f'w:{token}': 1.0 for token in tokens}
+    for first, second in zip(tokens, tokens[1:]):
+        features[f'b:{first}_{second}'] = 1.0
+    for _, label in hits:
+        key = f'lex:{label}'
+        features[key] = min(features.get(key, 0.0) + 1.0, 3.0)
+    if len(tokens) <= 3:
+        features['short'] = 1.0
+    return features
+
+
+class LinearIntentModel:
+    """Multinomial logistic regression over sparse features, trained with SGD"""
+
+    def __init__(self, weights: Dict[str, List[float]], bias: List[float], classes=INTENT_CLASSES, meta: Dict = None):
+        self.weights = weights
+        self.bias = bias
+        self.classes = tuple(classes)
+        self.meta = meta or {}
+
+    def predict_proba(self, features: Dict[str, float]) -> Dict[str, float]:
+        scores = list(self.bias)
+        for name, value in features.items():
+            row = self.weights.get(name)
+            if row is not None:
+                for i, weight in enumerate(row):
+                    scores[i] += weight * value
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return {label: exp / total for label, exp in zip(self.classes, exps)}
+
+    @classmethod
+    def train(cls, examples: List[Tuple[Dict[str, float], str, float]], epochs: int = 10,
+              learning_rate: float = 0.3, l2: float = 1e-4, meta: Dict = None) -> 'LinearIntentModel':
+        """examples: (features, label, sample weight)"""
+        classes = INTENT_CLASSES
+        index = {label: i for i, label in enumerate(classes)}
+        weights: Dict[str, List[float]] = {}
+        bias = [0.0] * len(classes)
+        model = cls(weights, bias, classes)
+
+        order = list(range(len(examples)))
+        rng = random.Random(0)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for position in order:
+                features, label, sample_weight = examples[position]
+                probabilities = model.predict_proba(features)
+                for i, class_label in enumerate(classes):
+                    gradient = (probabilities[class_label] - (1.0 if index[label] == i else 0.0)) * sample_weight
+                    if not gradient:
+                        continue
+                    bias[i] -= rate * gradient
+                    for name, value in features.items():
+                        row = weights.setdefault(name, [0.0] * len(classes))
+                        row[i] -= rate * (gradient * value + l2 * row[i])
+
+        # Drop near-zero rows so the published model stays small
+        model.weights = {
+            name: [round(w, 4) for w in row] for name, row in weights.items() if max(abs(w) for w in row) > 1e-3
+        }
+        model.bias = [round(b, 4) for b in bias]
+        model.meta = meta or {}
+        return model
+
+    def to_dict(self) -> Dict:
+        return {'classes': list(self.classes), 'weights': self.weights, 'bias': self.bias, 'meta': self.meta}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LinearIntentModel':
+        return cls(data['weights'], data['bias'], data['classes'], data.get('meta'))
+
+
+class IntentEngine:
+    """Lexicon matcher plus classifier; immutable once built"""
+
+    def __init__(self, model: LinearIntentModel, version=None):
+        self.matcher = PhraseMatcher(INTENT_LEXICON.items())
+        self.model = model
+        self.version = version
+
+    def classify(self, message: str) -> Dict:
+        tokens = tokenize(message)
+        hits = self.matcher.find(tokens)
+        probabilities = self.model.predict_proba(extract_features(tokens, hits))
+        product_score = sum(1 for _, label in hits if label == INTENT_PRODUCT)
+        service_score = sum(1 for _, label in hits if label == INTENT_SERVICE)
+
+        intent = max(probabilities, key=probabilities.get)
+        if product_score or service_score:
+            # A product or service word with an unsure model still searches
+            if intent == INTENT_OTHER and probabilities[INTENT_OTHER] < get_intent_setting('OTHER_THRESHOLD', 0.5):
+                intent = max((INTENT_PRODUCT, INTENT_SERVICE), key=probabilities.get)
+        elif intent != INTENT_OTHER and probabilities[intent] < get_intent_setting('MIN_SEARCH_PROBABILITY', 0.4):
+            # Nothing in the lexicon and no confident guess: don't spend a search on it
+            intent = INTENT_OTHER
+        return {
+            'intent': intent,
+            'confidence': round(probabilities[intent], 3),
+            'probabilities': {label: round(p, 3) for label, p in probabilities.items()},
+            'matches': [phrase for phrase, _ in hits],
+            'product_score': product_score,
+            'service_score': service_score,
+        }
+
+
+def build_training_examples(labelled: Iterable[Tuple[str, str, float]]) -> List[Tuple[Dict[str, float], str, float]]:
+    """Seed examples and lexicon phrases, plus (message, label, weight) rows from history"""
+    matcher = PhraseMatcher(INTENT_LEXICON.items())
+    rows = [(text, label, 1.0) for text, label in SEED_EXAMPLES]
+    rows += [(phrase, label, 0.5) for phrase, label in INTENT_LEXICON.items() if label in INTENT_CLASSES]
+    rows += list(labelled)
+
+    examples = []
+    for text, label, weight in rows:
+        if label not in INTENT_CLASSES:
+            continue
+        tokens = tokenize(text)
+        if tokens:
+            examples.append((extract_features(tokens, matcher.find(tokens)), label, weight))
+    return examples
+
+
+def train_seed_model() -> LinearIntentModel:
+    return LinearIntentModel.train(build_training_examples([]), meta={'source': 'seed'})
+
+
+# ===========================
+#  PROCESS-WIDE ENGINE
+# ===========================
+
+class IntentClassifier(VersionedSnapshotHolder):
+    """
+    Holds the intent engine for this process.
+
+    Starts from the seed model; a model trained on chat history by
+    chatbot.tasks.train_intent_classifier is published through the cache and
+    picked up when its version key moves. Classification itself never does I/O.
+    """
+
+    version_cache_key = MODEL_VERSION_CACHE_KEY
+    name = 'intent model'
+
+    @property
+    def check_interval(self):
+        return get_intent_setting('CHECK_INTERVAL', 60)
+
+    def engine(self) -> IntentEngine:
+        return self.snapshot()
+
+    def _load(self, version) -> IntentEngine:
+        data = None
+        if version is not None:
+            try:
+                data = cache.get(MODEL_CACHE_KEY)
+            except Exception as e:
+                logger.error(f"Error reading intent model: {str(e)}")
+        if data:
+            logger.info(f"Loaded intent model {version} ({data.get('meta', {}).get('examples', 0)} examples)")
+            return IntentEngine(LinearIntentModel.from_dict(data), version=version)
+        if self._snapshot is not None:
+            # The published model was evicted; keep ours until a new one appears
+            return self._snapshot
+        return IntentEngine(train_seed_model(), version=version)
+
+    def classify(self, message: str) -> Dict:
+        return self.engine().classify(message)
+
+
+def publish_intent_model(model: LinearIntentModel):
+    """Share a trained model with every process"""
+    version = time.time_ns()
+    cache.set(MODEL_CACHE_KEY, model.to_dict(), None)
+    cache.set(MODEL_VERSION_CACHE_KEY, version, None)
+    return version
+
+
+# ===========================
+#  TRAINING DATA
+# ===========================
+
+def load_labelled_messages(days: int = 90, limit: int = 50000) -> List[Tuple[str, str, float]]:
+    """
+    (message, label, weight) for user messages with a recorded intent.
+
+    The recorded intent is the classifier's own prediction, so only
+    feedback makes it evidence. Feedback on the bot reply that followed a
+    message grades its label: positive feedback confirms it at twice the
+    weight of a seed example, negative feedback drops it. Ungraded rows keep
+    SELF_LABEL_WEIGHT, far below the seeds, so the model cannot drift
+    towards its own guesses.
+    """
+    from bisect import bisect_left
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from ..models import ChatMessage, UserFeedback
+
+    since = timezone.now() - timedelta(days=days)
+    rows = list(
+        ChatMessage.objects.filter(
+            sender_type='user', created_at__gte=since, intent_detected__in=INTENT_CLASSES
+        ).order_by('-created_at').values_list('id', 'chat_session_id', 'created_at', 'content', 'intent_detected')[:limit]
+    )
+
+    sessions = {}
+    for message_id, session_id, created_at, _, _ in sorted(rows, key=lambda row: row[2]):
+        times, ids = sessions.setdefault(session_id, ([], []))
+        times.append(created_at)
+        ids.append(message_id)
+
+    grades = {}
+    feedback = UserFeedback.objects.filter(
+        chat_message__sender_type='bot', chat_message__chat_session_id__in=list(sessions)
+    ).values_list('chat_message__chat_session_id', 'chat_message__created_at', 'feedback_type', 'rating')
+    for session_id, replied_at, feedback_type, rating in feedback.iterator():
+        times, ids = sessions[session_id]
+        position = bisect_left(times, replied_at) - 1
+        if position < 0:
+            continue
+        positive = feedback_type == 'thumbs_up' or (rating is not None and rating >= 4)
+        negative = feedback_type == 'thumbs_down' or (rating is not None and rating < 3)
+        if positive or negative:
+            grades[ids[position]] = grades.get(ids[position], 0) + (1 if positive else -1)
+
+    self_label_weight = get_intent_setting('SELF_LABEL_WEIGHT', 0.05)
+    labelled = []
+    for message_id, _, _, content, label in rows:
+        grade = grades.get(message_id, 0)
+        if grade < 0 or (grade == 0 and not self_label_weight):
+            continue
+        labelled.append((content, label, 2.0 if grade > 0 else self_label_weight))
+    return labelled
+
+
+def train_intent_model(days: int = 90) -> LinearIntentModel:
+    labelled = load_labelled_messages(days=days)
+    examples = build_training_examples(labelled)
+    return LinearIntentModel.train(
+        examples,
+        meta={
+            'source': 'history',
+            'examples': len(examples),
+            'history_examples': len(labelled),
+            'confirmed_examples': sum(1 for _, _, weight in labelled if weight >= 1.0),
+            'days': days,
+        },
+    )
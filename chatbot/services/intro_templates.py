@@ -0,0 +1,74 @@
+# chatbot/services/intro_templates.py - Local intro messages for product/service searches
+import re
+import zlib
+from typing import Dict, Optional
+
+# Leading phrases that carry intent but are not part of what the user wants
+FILLER_PREFIXES = [
+    'can you help me find', 'can you find me', 'can you find', 'can you show me',
+    'where can i buy', 'where can i get', 'where can i find', 'i am looking for',
+    "i'm looking for", 'im looking for', 'looking for', 'search for', 'show me',
+    'find me', 'get me', 'i need', 'i want', 'need', 'want', 'find', 'buy',
+    'hire', 'book', 'please', 'hi', 'hello', 'hey', 'a', 'an', 'some',
+]
+
+LOCATION_PATTERN = re.compile(r'\s+(?:in|around|near|at)\s+([a-z][a-z .\'-]{1,40})$')
+
+MAX_SUBJECT_WORDS = 8
+
+INTRO_TEMPLATES = {
+    'product': [
+        "Great! Let me help you find the perfect {subject}{location}...",
+        "Perfect! Let me look for {subject}{location} that match your needs...",
+        "Sure! I'll find the best {subject} options{location} for you...",
+    ],
+    'service': [
+        "Sure! I'll search for {subject}{location}...",
+        "Great! Let me find trusted {subject}{location} for you...",
+        "Perfect! Let me look for {subject}{location} that fit what you need...",
+    ],
+}
+
+
+def extract_intro_entities(message: str) -> Dict[str, Optional[str]]:
+    """Pull the thing being searched for and an optional trailing location out of a message"""
+    # Match on the lowercased text but slice the original so brand/model casing survives
+    text = ' '.join(re.sub(r'[^\w\s\'.-]', ' ', message or '').split()).strip(' .')
+    lowered = text.lower()
+
+    location = None
+    match = LOCATION_PATTERN.search(lowered)
+    if match:
+        location = match.group(1).strip(' .')
+        text, lowered = text[:match.start()], lowered[:match.start()]
+
+    stripped = True
+    while stripped and lowered:
+        stripped = False
+        for prefix in FILLER_PREFIXES:
+            if lowered == prefix or lowered.startswith(prefix + ' '):
+                text, lowered = text[len(prefix):].lstrip(), lowered[len(prefix):].lstrip()
+                stripped = True
+                break
+
+    return {'subject': text.strip() or None, 'location': location}
+
+
+def build_template_intro(message: str, intent_type: str) -> Optional[str]:
+    """
+    Templated intro for a search message, or None when no template fits
+    (unknown intent, nothing left to name, or a long free-form request).
+    """
+    templates = INTRO_TEMPLATES.get(intent_type)
+    if not templates:
+        return None
+
+    entities = extract_intro_entities(message)
+    subject = entities['subject']
+    if not subject or len(subject.split()) > MAX_SUBJECT_WORDS:
+        return None
+
+    location = f" in {entities['location'].title()}" if entities['location'] else ''
+    # Same message, same phrasing: keeps replies stable and cacheable
+    template = templates[zlib.crc32(subject.lower().encode()) % len(templates)]
+    return template.format(subject=subject, location=location)
@@ -5,14 +5,36 @@ from typing import Dict, List, Any, Optional, Tuple
 from django.db.models import Q, Count, Avg, Case, When, Value, CharField, F
 from django.db.models.functions import Lower
 from django.core.cache import cache
+from django.conf import settings
 import logging
 from asgiref.sync import sync_to_async
 
 # Import your actual models - UPDATE THESE IMPORTS BASED ON YOUR PROJECT STRUCTURE
 from main.models import Products, Services, Category, Country, State, City
+from main.search import search_listings
+from main.gazetteer import resolve_location
+from main.proximity import distance_tier_case, nearby_city_distances, tier_bounds
+from .query_entities import PRODUCT_ENTITIES, RELAXATION_STEPS, SERVICE_ENTITIES
+from .registry import get_query_entity_extractor
 
 logger = logging.getLogger(__name__)
 
+# Same split as SearchHelper.calculate_relevance_score (title 0.4, description
+# 0.3, category 0.2, rating 0.1) with brand and tags broken out of the description
+DEFAULT_RELEVANCE_WEIGHTS = {
+    'name': 0.4,
+    'brand': 0.15,
+    'tags': 0.15,
+    'category': 0.2,
+    'description': 0.1,
+    'rating': 0.1,
+    'promoted': 0.05,
+    'featured': 0.03,
+    'city': 0.1,
+    'nearby': 0.07,
+    'state': 0.05,
+}
+
 class LocalSearchService:
     """
     Local database search service for products and services
@@ -22,6 +44,15 @@ class LocalSearchService:
     def __init__(self):
         self.max_results = 10
         self.cache_timeout = 300  # 5 minutes
+        
+        search_settings = getattr(settings, 'SEARCH_SETTINGS', {})
+        self.candidate_limit = search_settings.get('RANKING_CANDIDATES', 50)
+        self.nearby_radius_km = search_settings.get('NEARBY_RADIUS_KM', 50)
+        self.relevance_weights = {
+            **DEFAULT_RELEVANCE_WEIGHTS,
+            **search_settings.get('RELEVANCE_WEIGHTS', {})
+        }
+        self.entity_extractor = get_query_entity_extractor()
     
     async def search(self, query: str, search_type: str = 'both', filters: dict = None, location_context: dict = None) -> Dict[str, Any]:
         """
@@ -53,12 +84,15 @@ class LocalSearchService:
         Synchronous search method that handles Django ORM calls
         """
         try:
-            processed_query = self._preprocess_query(query)
+            # Brand, model, price, condition and location become filters, not text terms
+            extracted = self.entity_extractor.extract(query)
+            processed_query = self._preprocess_query(extracted.text(PRODUCT_ENTITIES))
             
             results = {
                 'success': True,
                 'query': query,
                 'processed_query': processed_query,
+                'entities': extracted.entities,
                 'products': [],
                 'services': [],
                 'total_results': 0,
@@ -67,11 +101,15 @@ class LocalSearchService:
             
             # Search products if requested
             if search_type in ['products', 'both']:
-                results['products'] = self._search_products(processed_query, filters, location_context)
+                results['products'] = self._search_with_entities(
+                    self._search_products, extracted, PRODUCT_ENTITIES, filters, location_context
+                )
             
             # Search services if requested  
             if search_type in ['services', 'both']:
-                results['services'] = self._search_services(processed_query, filters, location_context)
+                results['services'] = self._search_with_entities(
+                    self._search_services, extracted, SERVICE_ENTITIES, filters, location_context
+                )
             
             # Calculate total results
             results['total_results'] = len(results['products']) + len(results['services'])
@@ -91,42 +129,58 @@ class LocalSearchService:
                 'search_type': search_type
             }
     
+    def _search_with_entities(self, search, extracted, kinds, filters: Dict, location_context: Dict = None) -> List[Dict]:
+        """
+        Run search with the query's entities of the given kinds as filters.
+        Entities the listing type has no column for stay in the text query.
+        If brand/model filters find nothing, retry with them as text, since
+        many listings only name the brand in the title; then drop the price
+        bounds and search the amount as a word ('4k', '2m').
+        """
+        attempts = [kinds]
+        for relaxed in RELAXATION_STEPS:
+            if attempts[-1] & extracted.kinds & relaxed:
+                attempts.append(attempts[-1] - relaxed)
+        
+        items = []
+        for attempt in attempts:
+            query = self._preprocess_query(extracted.text(attempt))
+            # Filters passed in by the caller win over ones read from the text
+            items = search(query, {**extracted.filters(attempt), **filters}, location_context)
+            if items:
+                break
+        return items
+    
     def _search_products(self, query: str, filters: Dict, location_context: Dict = None) -> List[Dict]:
-        """Search products in local database with IMPROVED LOGIC"""
+        """Search products in local database and rank the candidates by relevance"""
         try:
             # Base queryset - only published/active products
             queryset = Products.objects.filter(
-                product_status='published'  # Adjust field name if different
+                product_status='published'
             ).select_related(
                 'category', 'country', 'state', 'city', 'user'
             )
             
             # Apply text search if query provided
             if query:
-                search_q = self._build_improved_product_search_query(query)
-                if search_q:
-                    queryset = queryset.filter(search_q)
-                else:
+                queryset = self._apply_text_search(queryset, query)
+                if queryset is None:
                     # If no valid search terms, return empty
                     return []
             
             # Apply additional filters
             queryset = self._apply_product_filters(queryset, filters)
             
-            # Apply location context if provided
-            if location_context:
-                queryset = self._apply_location_filter(queryset, location_context)
+            # Pull a bounded candidate set, best index rank first
+            candidates = self._get_candidates(queryset, bool(query), location_context)
             
-            # Order by relevance (you can customize this)
-            queryset = queryset.order_by('-created_at')
+            # Score candidates and keep the top results
+            ranked = self._rank_candidates(candidates, query, location_context)
             
-            # Limit results
-            queryset = queryset[:self.max_results]
-            
-            # Format products for response
             products = []
-            for product in queryset:
+            for score, product in ranked[:self.max_results]:
                 product_data = self._format_product_data(product)
+                product_data['relevance_score'] = round(score, 4)
                 products.append(product_data)
             
             logger.info(f"Found {len(products)} products for query: {query}")
@@ -137,41 +191,35 @@ class LocalSearchService:
             return []
     
     def _search_services(self, query: str, filters: Dict, location_context: Dict = None) -> List[Dict]:
-        """Search services in local database with IMPROVED LOGIC"""
+        """Search services in local database and rank the candidates by relevance"""
         try:
             # Base queryset - only published/active services
             queryset = Services.objects.filter(
-                service_status='published'  # Adjust field name if different
+                service_status='published'
             ).select_related(
                 'category', 'country', 'state', 'city', 'user'
             )
             
             # Apply text search if query provided
             if query:
-                search_q = self._build_improved_service_search_query(query)
-                if search_q:
-                    queryset = queryset.filter(search_q)
-                else:
+                queryset = self._apply_text_search(queryset, query)
+                if queryset is None:
                     # If no valid search terms, return empty
                     return []
             
             # Apply additional filters
             queryset = self._apply_service_filters(queryset, filters)
             
-            # Apply location context if provided
-            if location_context:
-                queryset = self._apply_location_filter(queryset, location_context)
-            
-            # Order by relevance
-            queryset = queryset.order_by('-created_at')
+            # Pull a bounded candidate set, best index rank first
+            candidates = self._get_candidates(queryset, bool(query), location_context)
             
-            # Limit results
-            queryset = queryset[:self.max_results]
+            # Score candidates and keep the top results
+            ranked = self._rank_candidates(candidates, query, location_context)
             
-            # Format services for response
             services = []
-            for service in queryset:
+            for score, service in ranked[:self.max_results]:
                 service_data = self._format_service_data(service)
+                service_data['relevance_score'] = round(score, 4)
                 services.append(service_data)
             
             logger.info(f"Found {len(services)} services for query: {query}")
@@ -181,80 +229,129 @@ class LocalSearchService:
             logger.error(f"Error searching services: {str(e)}")
             return []
     
-    def _build_improved_product_search_query(self, query: str) -> Optional[Q]:
+    def _apply_text_search(self, queryset, query: str):
         """
-        IMPROVED: Build search query for products using AND logic instead of OR
-        This will make searches more specific and relevant
+        Filter a listing queryset through the full-text search index.
+        Every extracted term must match; rows are annotated with search_rank.
         """
         search_terms = self._extract_search_terms(query)
         if not search_terms:
             return None
         
-        # For each term, it must appear in at least one field (AND logic between terms)
-        final_q = Q()
-        
-        for term in search_terms:
-            # This term must appear in at least one of these fields
-            term_q = (
-                Q(product_name__icontains=term) |
-                Q(product_description__icontains=term)
+        logger.info(f"Running indexed search for terms: {search_terms}")
+        return search_listings(queryset, ' '.join(search_terms))
+    
+    def _get_candidates(self, queryset, has_query: bool, location_context: Dict = None) -> List:
+        """
+        Fetch the bounded candidate set that the ranking stage scores.
+        Listings in the user's city come first, then nearby cities by distance
+        tier, then the rest of the state, so the location boost has something
+        to act on.
+        """
+        location_context = location_context or {}
+        city_ids = self._location_ids(location_context.get('city'), 'city')
+        state_ids = self._location_ids(location_context.get('state'), 'state')
+        distances = self._nearby_distances(city_ids)
+        queryset = queryset.annotate(
+            location_tier=distance_tier_case(
+                distances, self.nearby_radius_km,
+                fallback=[('state_id__in', state_ids)] if state_ids else []
             )
-            
-            # Add more fields if they exist in your model
-            if hasattr(Products, 'product_brand'):
-                term_q |= Q(product_brand__icontains=term)
-            if hasattr(Products, 'tags'):
-                term_q |= Q(tags__icontains=term)
-            
-            # Search in category name
-            term_q |= Q(category__name__icontains=term)
-            
-            # AND this term requirement with previous terms
-            if not final_q:
-                final_q = term_q
-            else:
-                final_q = final_q & term_q
-        
-        logger.info(f"Built product search query for terms: {search_terms}")
-        return final_q
+        )
+        if has_query:
+            queryset = queryset.order_by('location_tier', '-search_rank', '-created_at')
+        else:
+            queryset = queryset.order_by('location_tier', '-is_promoted', '-created_at')
+        return list(queryset[:self.candidate_limit])
+    
+    def _nearby_distances(self, city_ids: List[int]) -> Dict[int, float]:
+        """Nearest distance from any of the user's cities, which are always tier 0"""
+        distances = {}
+        for city_id in city_ids:
+            for nearby_id, km in nearby_city_distances(city_id, self.nearby_radius_km).items():
+                if km < distances.get(nearby_id, km + 1):
+                    distances[nearby_id] = km
+            distances[city_id] = 0.0
+        return distances
     
-    def _build_improved_service_search_query(self, query: str) -> Optional[Q]:
+    def _location_ids(self, name, kind: str) -> List[int]:
+        if not name:
+            return []
+        return [place.id for place in resolve_location(name, kind=kind)]
+    
+    def _rank_candidates(self, candidates: List, query: str, location_context: Dict = None) -> List[Tuple[float, Any]]:
         """
-        IMPROVED: Build search query for services using AND logic instead of OR
+        Score candidates by weighted per-field term frequency plus promotion,
+        rating and location boosts. Weights follow SearchHelper.calculate_relevance_score.
         """
-        search_terms = self._extract_search_terms(query)
-        if not search_terms:
-            return None
+        terms = self._extract_search_terms(query) if query else []
+        location_context = location_context or {}
+        city = (location_context.get('city') or '').lower()
+        state = (location_context.get('state') or '').lower()
+        weights = self.relevance_weights
+        # Tiers 1..nearby_tiers are neighbouring cities inside the radius
+        nearby_tiers = len(tier_bounds(self.nearby_radius_km)) - 1
         
-        # For each term, it must appear in at least one field (AND logic between terms)
-        final_q = Q()
+        scored = []
+        for item in candidates:
+            score = 0.0
+            
+            if terms:
+                for field, text in self._get_ranking_fields(item).items():
+                    score += weights.get(field, 0) * self._term_frequency_score(text, terms)
+            
+            if item.is_promoted:
+                score += weights['promoted']
+            if item.is_featured:
+                score += weights['featured']
+            
+            rating = float(item.rating_avg or 0)
+            score += weights['rating'] * (rating / 5.0)
+            
+            location_tier = getattr(item, 'location_tier', None)
+            if city and item.city and item.city.name.lower() == city:
+                score += weights['city']
+            elif location_tier and location_tier <= nearby_tiers:
+                score += weights['nearby'] * (nearby_tiers - location_tier + 1) / nearby_tiers
+            elif state and item.state and item.state.name.lower() == state:
+                score += weights['state']
+            
+            scored.append((score, item))
         
-        for term in search_terms:
-            # This term must appear in at least one of these fields
-            term_q = (
-                Q(service_name__icontains=term) |
-                Q(service_description__icontains=term)
-            )
-            
-            # Add more fields if they exist in your model
-            if hasattr(Services, 'provider_name'):
-                term_q |= Q(provider_name__icontains=term)
-            if hasattr(Services, 'provider_expertise'):
-                term_q |= Q(provider_expertise__icontains=term)
-            if hasattr(Services, 'tags'):
-                term_q |= Q(tags__icontains=term)
-            
-            # Search in category name
-            term_q |= Q(category__name__icontains=term)
-            
-            # AND this term requirement with previous terms
-            if not final_q:
-                final_q = term_q
-            else:
-                final_q = final_q & term_q
-        
-        logger.info(f"Built service search query for terms: {search_terms}")
-        return final_q
+        # Stable sort keeps the candidate (index rank, recency) order on ties
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored
+    
+    def _get_ranking_fields(self, item) -> Dict[str, str]:
+        """Map a listing onto the text fields used for relevance scoring"""
+        category = item.category.name if item.category else ''
+        if isinstance(item, Products):
+            return {
+                'name': item.product_name or '',
+                'brand': f"{item.product_brand or ''} {item.product_model or ''}",
+                'tags': item.tags or '',
+                'category': category,
+                'description': item.product_description or '',
+            }
+        return {
+            'name': item.service_name or '',
+            'brand': f"{item.provider_name or ''} {item.provider_title or ''}",
+            'tags': item.tags or '',
+            'category': category,
+            'description': f"{item.service_description or ''} {item.provider_expertise or ''}",
+        }
+    
+    def _term_frequency_score(self, text: str, terms: List[str]) -> float:
+        """Fraction of terms found in text, with saturating credit for repeats"""
+        if not text or not terms:
+            return 0.0
+        text = text.lower()
+        total = 0.0
+        for term in terms:
+            occurrences = text.count(term)
+            if occurrences:
+                total += min(occurrences, 3) / 3.0 * 0.5 + 0.5
+        return total / len(terms)
     
     # Keep all your existing formatting methods unchanged...
     def _format_product_data(self, product) -> Dict:
@@ -392,12 +489,7 @@ class LocalSearchService:
             queryset = queryset.filter(category__name__icontains=filters['category'])
         
         if filters.get('location'):
-            location = filters['location']
-            if isinstance(location, dict):
-                if location.get('city'):
-                    queryset = queryset.filter(city__name__icontains=location['city'])
-                elif location.get('state'):
-                    queryset = queryset.filter(state__name__icontains=location['state'])
+            queryset = self._apply_location_names(queryset, filters['location'])
         
         if filters.get('min_price'):
             queryset = queryset.filter(product_price__gte=filters['min_price'])
@@ -405,7 +497,17 @@ class LocalSearchService:
         if filters.get('max_price'):
             queryset = queryset.filter(product_price__lte=filters['max_price'])
         
-        return queryset
+        # Structured filters from QueryEntityExtractor; all on indexed columns
+        if filters.get('brands'):
+            queryset = queryset.filter(product_brand__in=filters['brands'])
+        
+        if filters.get('models'):
+            queryset = queryset.filter(product_model__in=filters['models'])
+        
+        if filters.get('condition'):
+            queryset = queryset.filter(product_condition=filters['condition'])
+        
+        return self._apply_location_ids(queryset, filters)
     
     def _apply_service_filters(self, queryset, filters: Dict):
         """Apply additional filters to service queryset"""
@@ -413,29 +515,40 @@ class LocalSearchService:
             queryset = queryset.filter(category__name__icontains=filters['category'])
         
         if filters.get('location'):
-            location = filters['location']
-            if isinstance(location, dict):
-                if location.get('city'):
-                    queryset = queryset.filter(city__name__icontains=location['city'])
-                elif location.get('state'):
-                    queryset = queryset.filter(state__name__icontains=location['state'])
+            queryset = self._apply_location_names(queryset, filters['location'])
+        
+        # Services quote a price range; ones without a price stay in the results
+        if filters.get('min_price'):
+            queryset = queryset.filter(Q(max_price__gte=filters['min_price']) | Q(max_price__isnull=True))
         
+        if filters.get('max_price'):
+            queryset = queryset.filter(Q(starting_price__lte=filters['max_price']) | Q(starting_price__isnull=True))
+        
+        return self._apply_location_ids(queryset, filters)
+    
+    def _apply_location_ids(self, queryset, filters: Dict):
+        """City/state resolved from the query, filtered on the foreign key indexes"""
+        if filters.get('city_ids'):
+            queryset = queryset.filter(city_id__in=filters['city_ids'])
+        elif filters.get('state_ids'):
+            queryset = queryset.filter(state_id__in=filters['state_ids'])
+        elif filters.get('country_ids'):
+            queryset = queryset.filter(country_id__in=filters['country_ids'])
         return queryset
     
-    def _apply_location_filter(self, queryset, location_context: Dict):
-        """Apply location filter based on context"""
-        try:
-            if location_context.get('city'):
-                queryset = queryset.filter(city__name__icontains=location_context['city'])
-            elif location_context.get('state'):
-                queryset = queryset.filter(state__name__icontains=location_context['state'])
-            elif location_context.get('country'):
-                queryset = queryset.filter(country__name__icontains=location_context['country'])
-            
-            return queryset
-        except Exception as e:
-            logger.error(f"Error applying location filter: {str(e)}")
+    def _apply_location_names(self, queryset, location):
+        """A {'city': ..., 'state': ...} location from the chat context, resolved by the gazetteer"""
+        if not isinstance(location, dict):
             return queryset
+        for field in ('city', 'state'):
+            name = location.get(field)
+            if not name:
+                continue
+            places = resolve_location(name, kind=field)
+            if places:
+                return queryset.filter(**{f'{field}_id__in': [place.id for place in places]})
+            return queryset.filter(**{f'{field}__name__icontains': name})
+        return queryset
     
     def _preprocess_query(self, query: str) -> str:
         """Clean and preprocess the search query"""
@@ -0,0 +1,153 @@
+# chatbot/services/prompt_cache.py - Layered cache for Gemini text responses
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .result_cache import location_key, normalize_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT_CACHE = {
+    # Seconds a response stays cached per prompt type; 0 turns caching off for that type
+    'TTLS': {
+        'marketplace_assistant': 1800,
+        'product_recommender': 3600,
+        'service_matcher': 3600,
+        'price_analyst': 900,
+    },
+    'DEFAULT_TTL': 1800,
+    # Prompt types answered from the question and search results alone
+    'HISTORY_FREE_PROMPT_TYPES': ['product_recommender', 'service_matcher', 'price_analyst'],
+}
+
+# Words that change how a question is phrased but not what is being asked for
+QUERY_STOPWORDS = {
+    'a', 'an', 'the', 'some', 'any', 'i', 'im', 'me', 'my', 'you', 'your', 'we', 'us',
+    'please', 'pls', 'hi', 'hello', 'hey', 'can', 'could', 'would', 'will', 'do', 'does',
+    'is', 'are', 'am', 'be', 'to', 'for', 'of', 'in', 'on', 'at', 'with', 'and',
+    'want', 'need', 'looking', 'look', 'find', 'get', 'buy', 'show', 'search', 'where',
+    'what', 'which', 'there', 'have', 'has', 'help', 'tell', 'about', 'like', 'm',
+}
+
+
+def canonicalize_query(message: str) -> str:
+    """'Where can I buy an iPhone 13?' and 'i want to buy iphone 13' both become 'iphone 13'"""
+    words = normalize_query(message).split()
+    content = [word for word in words if word not in QUERY_STOPWORDS]
+    return ' '.join(content or words)
+
+
+def _results_fingerprint(search_results: Optional[Dict]) -> Dict:
+    """The parts of the search results _build_prompt shows Gemini"""
+    if not search_results:
+        return {}
+    return {
+        'products': [item.get('id') or item.get('name') for item in (search_results.get('products') or [])[:5]],
+        'services': [item.get('id') or item.get('name') for item in (search_results.get('services') or [])[:5]],
+        'total': search_results.get('total_results', 0),
+    }
+
+
+class PromptResponseCache:
+    """
+    Two cache layers in front of generate_response.
+
+    The exact layer keys on the full prompt, as before. The intent layer
+    keys on the prompt type, the canonicalized user query and only the
+    context that changes the answer, so rephrasings and whitespace still
+    hit. Conversation history is part of the intent key except for prompt
+    types listed in HISTORY_FREE_PROMPT_TYPES.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def config(self) -> Dict:
+        configured = getattr(settings, 'CHATBOT_SETTINGS', {}).get('PROMPT_CACHE', {})
+        return {
+            **DEFAULT_PROMPT_CACHE,
+            **configured,
+            'TTLS': {**DEFAULT_PROMPT_CACHE['TTLS'], **configured.get('TTLS', {})},
+        }
+
+    def ttl(self, prompt_type: str) -> int:
+        config = self.config
+        return config['TTLS'].get(prompt_type, config['DEFAULT_TTL'])
+
+    def exact_key(self, prompt: str) -> str:
+        return f"gemini_response_{hashlib.md5(prompt.encode()).hexdigest()}"
+
+    def intent_key(
+        self,
+        prompt_type: str,
+        user_message: str,
+        context: Optional[Dict],
+        include_search_results: bool,
+    ) -> str:
+        context = context or {}
+        parts = {
+            'query': canonicalize_query(user_message),
+            'location': location_key(context),
+            'preferences': context.get('user_preferences') or {},
+        }
+        if include_search_results:
+            parts['results'] = _results_fingerprint(context.get('search_results'))
+        if prompt_type not in self.config['HISTORY_FREE_PROMPT_TYPES']:
+            parts['history'] = [
+                (msg.get('sender_type') == 'user', normalize_query(msg.get('content', '')))
+                for msg in (context.get('conversation_history') or [])[-5:]
+            ]
+        digest = hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+        return f"gemini_intent_{prompt_type}_{digest}"
+
+    async def get(self, prompt_type: str, exact_key: str, intent_key: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """(cached result, layer) or (None, None)"""
+        if self.ttl(prompt_type) <= 0:
+            return None, None
+
+        for layer, key in (('exact', exact_key), ('intent', intent_key)):
+            try:
+                cached = await cache.aget(key)
+            except Exception as e:
+                logger.error(f"Error reading prompt cache: {str(e)}")
+                break
+            if cached:
+                self._record(prompt_type, f'{layer}_hits')
+                return {**cached, 'cached': True, 'cache_layer': layer}, layer
+
+        self._record(prompt_type, 'misses')
+        return None, None
+
+    async def set(self, prompt_type: str, exact_key: str, intent_key: str, result: Dict):
+        ttl = self.ttl(prompt_type)
+        if ttl <= 0:
+            return
+        try:
+            await cache.aset_many({exact_key: result, intent_key: result}, ttl)
+        except Exception as e:
+            logger.error(f"Error writing prompt cache: {str(e)}")
+
+    def _record(self, prompt_type: str, outcome: str):
+        with self._lock:
+            counts = self._stats.setdefault(prompt_type, {'exact_hits': 0, 'intent_hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per prompt type for this process since start-up"""
+        with self._lock:
+            report = {}
+            for prompt_type, counts in self._stats.items():
+                total = sum(counts.values())
+                hits = counts['exact_hits'] + counts['intent_hits']
+                report[prompt_type] = {**counts, 'hit_rate': round(hits / total, 3) if total else 0.0}
+            return report
+
+
+prompt_cache = PromptResponseCache()
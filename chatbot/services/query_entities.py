@@ -0,0 +1,456 @@
+# chatbot/services/query_entities.py - Structured search filters pulled out of free-text queries
+import logging
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from main.gazetteer import KIND_CITY, NAME_SUFFIXES, gazetteer, is_within, normalize_location
+from main.snapshots import VersionedSnapshotHolder
+from .intent_engine import PhraseMatcher, tokenize
+
+logger = logging.getLogger(__name__)
+
+LEXICON_CACHE_KEY = 'query_entity_lexicon'
+LEXICON_VERSION_CACHE_KEY = 'query_entity_lexicon_version'
+
+ENTITY_BRAND = 'brand'
+ENTITY_MODEL = 'model'
+ENTITY_PRICE = 'price'
+ENTITY_CONDITION = 'condition'
+ENTITY_LOCATION = 'location'
+# Cue and currency words around a price; never searched as text
+PRICE_CUE = 'price_cue'
+
+PRODUCT_ENTITIES = frozenset({ENTITY_BRAND, ENTITY_MODEL, ENTITY_PRICE, ENTITY_CONDITION, ENTITY_LOCATION})
+SERVICE_ENTITIES = frozenset({ENTITY_PRICE, ENTITY_LOCATION})
+# Filters dropped in turn when a search finds nothing. Listings often leave
+# brand/model blank and only name them in the title; a misread price ('4k tv')
+# goes back into the text as the word it was.
+RELAXATION_STEPS = (frozenset({ENTITY_BRAND, ENTITY_MODEL}), frozenset({ENTITY_PRICE}))
+
+# Filter key -> entity kind it comes from
+FILTER_ENTITIES = {
+    'brands': ENTITY_BRAND,
+    'models': ENTITY_MODEL,
+    'min_price': ENTITY_PRICE,
+    'max_price': ENTITY_PRICE,
+    'condition': ENTITY_CONDITION,
+    'city_ids': ENTITY_LOCATION,
+    'state_ids': ENTITY_LOCATION,
+    'country_ids': ENTITY_LOCATION,
+}
+
+QUERY_TOKEN_PATTERN = re.compile(r'₦|-|\d+(?:\.\d+)?[a-z]*|[a-z0-9]+')
+THOUSANDS_SEPARATOR_PATTERN = re.compile(r'(?<=\d),(?=\d{3}\b)')
+WORD_HYPHEN_PATTERN = re.compile(r'(?<=[a-z])-(?=[a-z])')
+AMOUNT_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)(k|m|mil|million|thousand|naira|ngn)?$')
+
+AMOUNT_MULTIPLIERS = {'k': 1000, 'thousand': 1000, 'm': 1000000, 'mil': 1000000, 'million': 1000000}
+CURRENCY_WORDS = {'₦', 'naira', 'ngn'}
+# Without a currency or multiplier, smaller numbers are model numbers and sizes, not prices
+MIN_BARE_PRICE = 1000
+# Bare four-digit numbers in this range after 'from'/'above' are model years ('laptop from 2021')
+MODEL_YEAR_RANGE = (1950, 2100)
+
+# Longest cue first so 'not more than' wins over 'more than'
+MAX_PRICE_CUES = sorted([
+    ('under',), ('below',), ('less', 'than'), ('not', 'more', 'than'), ('not', 'above'), ('at', 'most'),
+    ('max',), ('maximum',), ('up', 'to'), ('within',), ('budget',), ('budget', 'of'), ('cheaper', 'than'),
+    ('for',), ('price',), ('costing',),
+], key=len, reverse=True)
+MIN_PRICE_CUES = sorted([
+    ('above',), ('over',), ('more', 'than'), ('at', 'least'), ('min',), ('minimum',), ('from',),
+    ('starting', 'from'),
+], key=len, reverse=True)
+
+CONDITION_PHRASES = {
+    'brand new': 'new', 'new': 'new',
+    'used': 'used', 'fairly used': 'used', 'second hand': 'used', 'tokunbo': 'used', 'pre owned': 'used',
+    'uk used': 'used', 'foreign used': 'used', 'london used': 'used', 'nigerian used': 'used',
+    'refurbished': 'refurbished', 'refurb': 'refurbished',
+}
+
+LOCATION_CONNECTORS = {'in', 'at', 'around', 'near', 'within'}
+# Tie-break for phrases covering the same words
+PHRASE_PRIORITY = {ENTITY_CONDITION: 0, ENTITY_MODEL: 1, ENTITY_BRAND: 2, ENTITY_LOCATION: 3}
+# Seller-entered brand values that say nothing about the brand
+BRAND_STOPWORDS = {'new', 'used', 'other', 'others', 'generic', 'none', 'no brand', 'unknown', 'na', 'n a', 'original'}
+
+
+def get_entity_setting(name, default):
+    return getattr(settings, 'CHATBOT_SETTINGS', {}).get('QUERY_ENTITIES', {}).get(name, default)
+
+
+def normalize_phrase(text: str) -> str:
+    return ' '.join(tokenize(text))
+
+
+def tokenize_query(query: str) -> List[str]:
+    text = THOUSANDS_SEPARATOR_PATTERN.sub('', (query or '').lower())
+    return QUERY_TOKEN_PATTERN.findall(WORD_HYPHEN_PATTERN.sub(' ', text))
+
+
+# ===========================
+#  LEXICON
+# ===========================
+
+def _add_spelling(table: Dict[str, List], value: str):
+    key = normalize_phrase(value)
+    if key:
+        spellings = table.setdefault(key, [])
+        if value not in spellings:
+            spellings.append(value)
+
+
+def build_entity_lexicon() -> Dict:
+    """Brands and models the extractor can recognise, as plain data for the cache"""
+    from main.models import Products
+
+    brands, models = {}, {}
+    max_models = get_entity_setting('MAX_MODELS', 20000)
+    listings = Products.objects.filter(product_status='published').order_by()
+    for value in listings.exclude(product_brand__isnull=True).exclude(product_brand='').values_list(
+            'product_brand', flat=True).distinct():
+        if normalize_phrase(value) not in BRAND_STOPWORDS:
+            _add_spelling(brands, value)
+
+    model_rows = (
+        listings.exclude(product_model__isnull=True).exclude(product_model='')
+        .values('product_model').annotate(total=Count('id')).order_by('-total')[:max_models]
+    )
+    for row in model_rows:
+        tokens = tokenize(row['product_model'])
+        # 'iPhone 13' and 'A16' are models; a lone '13' or 'Pro' would match everywhere
+        distinctive = len(tokens) > 1 or (
+            tokens and len(tokens[0]) >= 3 and any(c.isdigit() for c in tokens[0]) and any(c.isalpha() for c in tokens[0])
+        )
+        if distinctive and ' '.join(tokens) not in brands:
+            _add_spelling(models, row['product_model'])
+
+    return {'built_at': time.time_ns(), 'brands': brands, 'models': models}
+
+
+class EntityLexicon:
+    """Compiled matcher over one brand/model snapshot plus the gazetteer's place names"""
+
+    def __init__(self, data: Dict, places=None):
+        self.data = data
+        self.version = data.get('built_at')
+        self.brands = data.get('brands', {})
+        self.models = data.get('models', {})
+        # main.gazetteer snapshot; its names are already normalised
+        self.places = places
+        self.locations = places.names if places is not None else {}
+
+        pairs = [(phrase, ENTITY_CONDITION) for phrase in CONDITION_PHRASES]
+        pairs += [(phrase, ENTITY_BRAND) for phrase in self.brands]
+        pairs += [(phrase, ENTITY_MODEL) for phrase in self.models]
+        pairs += [(phrase, ENTITY_LOCATION) for phrase in self.locations]
+        self.matcher = PhraseMatcher(pairs)
+
+
+def _places():
+    try:
+        return gazetteer.snapshot()
+    except Exception as e:
+        logger.error(f"Error loading gazetteer: {str(e)}")
+        return None
+
+
+class EntityLexiconHolder(VersionedSnapshotHolder):
+    """
+    Process-wide compiled lexicon.
+
+    Brand/model data is built from the database and published through the
+    cache for REFRESH_INTERVAL seconds; when it expires the next process to
+    look rebuilds and republishes it. The matcher is also recompiled when
+    main.gazetteer loads new places.
+    """
+
+    version_cache_key = LEXICON_VERSION_CACHE_KEY
+    name = 'query entity lexicon'
+
+    @property
+    def check_interval(self):
+        return get_entity_setting('CHECK_INTERVAL', 60)
+
+    def snapshot(self) -> EntityLexicon:
+        lexicon = super().snapshot()
+        places = _places()
+        if lexicon.places is places:
+            return lexicon
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.places is not places:
+                self._snapshot = self._compile(self._snapshot.data, places)
+            return self._snapshot or lexicon
+
+    def _load(self, version) -> EntityLexicon:
+        data = None
+        if version is not None:
+            try:
+                data = cache.get(LEXICON_CACHE_KEY)
+            except Exception as e:
+                logger.error(f"Error reading query entity lexicon: {str(e)}")
+        if data is None or data.get('built_at') != version:
+            data = self._rebuild()
+        return self._compile(data, _places())
+
+    def _rebuild(self) -> Dict:
+        """Build brand/model data from the database and publish it to every process"""
+        try:
+            data = build_entity_lexicon()
+        except Exception as e:
+            logger.error(f"Error building query entity lexicon: {str(e)}")
+            # Keep matching with what we had; the version mismatch retries next check
+            return self._snapshot.data if self._snapshot is not None else {}
+
+        timeout = get_entity_setting('REFRESH_INTERVAL', 600)
+        try:
+            cache.set(LEXICON_CACHE_KEY, data, timeout)
+            cache.set(LEXICON_VERSION_CACHE_KEY, data['built_at'], timeout)
+        except Exception as e:
+            logger.error(f"Error publishing query entity lexicon: {str(e)}")
+        return data
+
+    @staticmethod
+    def _compile(data: Dict, places) -> EntityLexicon:
+        lexicon = EntityLexicon(data, places)
+        logger.info(
+            f"Compiled query entity lexicon: {len(lexicon.brands)} brands, "
+            f"{len(lexicon.models)} models, {len(lexicon.locations)} place names"
+        )
+        return lexicon
+
+
+entity_lexicon = EntityLexiconHolder()
+
+
+# ===========================
+#  EXTRACTION
+# ===========================
+
+class ExtractedQuery:
+    """
+    A query split into structured filters and the words left for text search.
+    Each token is tagged with the entity kind that consumed it, so a search
+    that cannot use an entity (services have no brand) keeps its words as text.
+    """
+
+    def __init__(self, query: str, tokens: List[str], tags: List[Optional[str]], filters: Dict, entities: Dict):
+        self.query = query
+        self.tokens = tokens
+        self.tags = tags
+        self._filters = filters
+        self.entities = entities
+
+    @property
+    def kinds(self) -> FrozenSet[str]:
+        return frozenset(FILTER_ENTITIES[key] for key in self._filters)
+
+    def text(self, kinds: Iterable[str] = PRODUCT_ENTITIES) -> str:
+        """Query words not covered by a filter of the given kinds"""
+        kinds = set(kinds)
+        return ' '.join(
+            token for token, tag in zip(self.tokens, self.tags)
+            if (tag is None or tag not in kinds) and tag != PRICE_CUE and token not in ('-', '₦')
+        )
+
+    def filters(self, kinds: Iterable[str] = PRODUCT_ENTITIES) -> Dict:
+        kinds = set(kinds)
+        return {key: value for key, value in self._filters.items() if FILTER_ENTITIES[key] in kinds}
+
+
+class QueryEntityExtractor:
+    """
+    Pulls brand, model, price bounds, condition and city/state out of a
+    query so local search can filter on indexed columns instead of
+    requiring every word to appear in the listing text.
+
+    Brands, models and place names come from the process-wide
+    entity_lexicon holder.
+    """
+
+    def lexicon(self) -> EntityLexicon:
+        return entity_lexicon.snapshot()
+
+    def extract(self, query: str) -> ExtractedQuery:
+        tokens = tokenize_query(query)
+        tags: List[Optional[str]] = [None] * len(tokens)
+        filters: Dict = {}
+        entities: Dict = {}
+
+        self._extract_prices(tokens, tags, filters)
+        self._extract_phrases(tokens, tags, filters, entities)
+        if 'min_price' in filters or 'max_price' in filters:
+            entities['price'] = {key: filters[key] for key in ('min_price', 'max_price') if key in filters}
+
+        return ExtractedQuery(query, tokens, tags, filters, entities)
+
+    # ---- prices ----
+
+    @staticmethod
+    def _read_amount(tokens: List[str], i: int) -> Optional[Tuple[float, bool, bool, int, int]]:
+        """
+        (value, currency, multiplier, amount position, end) for an amount
+        starting at i. currency is set by '₦', 'naira' or 'ngn' next to it,
+        multiplier by 'k', 'm', 'thousand' or 'million'.
+        """
+        currency = multiplier = False
+        if i < len(tokens) and tokens[i] == '₦':
+            currency = True
+            i += 1
+        match = AMOUNT_PATTERN.match(tokens[i]) if i < len(tokens) else None
+        if not match:
+            return None
+        value, unit = float(match.group(1)), match.group(2)
+        position = i
+        i += 1
+        if unit is None and i < len(tokens) and tokens[i] in AMOUNT_MULTIPLIERS:
+            unit = tokens[i]
+            i += 1
+        if unit in AMOUNT_MULTIPLIERS:
+            value *= AMOUNT_MULTIPLIERS[unit]
+            multiplier = True
+        elif unit in CURRENCY_WORDS:
+            currency = True
+        if i < len(tokens) and tokens[i] in CURRENCY_WORDS:
+            currency = True
+            i += 1
+        return value, currency, multiplier, position, i
+
+    @staticmethod
+    def _is_model_year(tokens: List[str], amount) -> bool:
+        value, currency, multiplier, position, _ = amount
+        return (
+            not currency and not multiplier and len(tokens[position]) == 4
+            and MODEL_YEAR_RANGE[0] <= value <= MODEL_YEAR_RANGE[1]
+        )
+
+    @staticmethod
+    def _cue_before(tokens: List[str], i: int, cues: List[Tuple[str, ...]]) -> int:
+        """Length of the cue phrase ending just before i, 0 when there is none"""
+        for cue in cues:
+            if i >= len(cue) and tuple(tokens[i - len(cue):i]) == cue:
+                return len(cue)
+        return 0
+
+    def _extract_prices(self, tokens: List[str], tags: List[Optional[str]], filters: Dict):
+        """
+        Price bounds need a currency ('₦200k', '50,000 naira') or a cue
+        ('under 200k', 'between 100k and 150k'). A bare '4k' or '2m' is a
+        resolution, length or size as often as a budget, so it stays text.
+        """
+        i = 0
+        while i < len(tokens):
+            amount = self._read_amount(tokens, i)
+            if amount is None:
+                i += 1
+                continue
+            value, currency, multiplier, position, end = amount
+
+            max_cue = self._cue_before(tokens, i, MAX_PRICE_CUES)
+            min_cue = 0 if max_cue else self._cue_before(tokens, i, MIN_PRICE_CUES)
+            between = not (max_cue or min_cue) and self._cue_before(tokens, i, [('between',)])
+            cue = max_cue or min_cue or between
+
+            # '₦100k - 200k', 'from 100k to 200k', 'between 100 and 200k'
+            joiners = ('and',) if between else ('-', 'to')
+            upper = self._read_amount(tokens, end + 1) if end < len(tokens) and tokens[end] in joiners else None
+            if upper is not None:
+                high, high_currency, high_multiplier = upper[:3]
+                if not multiplier and high_multiplier and high >= 1000 > value:
+                    # 'between 100 and 200k' shares the multiplier
+                    value *= 1000 if high < 1000000 else 1000000
+                    multiplier = True
+                years = self._is_model_year(tokens, amount) and self._is_model_year(tokens, upper)
+                priced = currency or high_currency or (
+                    cue and not years and (multiplier or high_multiplier or value >= MIN_BARE_PRICE)
+                )
+                if priced:
+                    amounts = [position, upper[3]]
+                    filters['min_price'], filters['max_price'] = min(value, high), max(value, high)
+                    self._tag_price(tags, i - cue, upper[4], amounts)
+                    i = upper[4]
+                    continue
+
+            year = min_cue and self._is_model_year(tokens, amount)
+            if currency or (cue and not between and not year and (multiplier or value >= MIN_BARE_PRICE)):
+                filters['min_price' if min_cue else 'max_price'] = value
+                self._tag_price(tags, i - cue, end, [position])
+            i = end
+
+    @staticmethod
+    def _tag_price(tags: List[Optional[str]], start: int, end: int, amounts: List[int]):
+        """Amounts are the price entity; cue, joiner and currency words around them are dropped"""
+        for position in range(start, end):
+            tags[position] = ENTITY_PRICE if position in amounts else PRICE_CUE
+
+    # ---- brands, models, conditions, locations ----
+
+    def _extract_phrases(self, tokens: List[str], tags: List[Optional[str]], filters: Dict, entities: Dict):
+        lexicon = self.lexicon()
+        spans = sorted(
+            lexicon.matcher.spans(tokens),
+            key=lambda span: (span[0], span[0] - span[1], PHRASE_PRIORITY[span[3]])
+        )
+
+        taken_until = 0
+        located, unconfirmed = [], []
+        for start, end, phrase, label in spans:
+            if start < taken_until or any(tags[position] for position in range(start, end)):
+                continue
+
+            if label == ENTITY_CONDITION:
+                filters['condition'] = CONDITION_PHRASES[phrase]
+                entities['condition'] = CONDITION_PHRASES[phrase]
+            elif label == ENTITY_BRAND:
+                filters.setdefault('brands', []).extend(lexicon.brands[phrase])
+                entities.setdefault('brands', []).append(phrase)
+            elif label == ENTITY_MODEL:
+                filters.setdefault('models', []).extend(lexicon.models[phrase])
+                entities.setdefault('models', []).append(phrase)
+            else:
+                # Broadest kind first: 'lagos' is the state, not the city
+                places = lexicon.locations[phrase]
+                places = [place for place in places if place.kind == places[0].kind]
+                connected = start > 0 and tokens[start - 1] in LOCATION_CONNECTORS and not tags[start - 1]
+                # Short aliases ('ph', 'us') and small towns need 'in' before them,
+                # unless the query also names the town's state ('ikeja lagos')
+                alias = normalize_location(places[0].name) != phrase
+                notable = (len(phrase) > 3 or not alias) and (
+                    places[0].kind != KIND_CITY or any(place.rank >= 1 for place in places)
+                )
+                if not connected and not notable:
+                    unconfirmed.append((start, end, places))
+                    continue
+                located.extend(places)
+                if end < len(tokens) and tokens[end] in NAME_SUFFIXES:
+                    end += 1
+                if connected:
+                    start -= 1
+
+            for position in range(start, end):
+                tags[position] = label
+            taken_until = end
+
+        areas = [place for place in located if place.kind != KIND_CITY]
+        for start, end, places in unconfirmed:
+            inside = [place for place in places if any(is_within(place, area) for area in areas)]
+            if inside and not any(tags[position] for position in range(start, end)):
+                located.extend(inside)
+                for position in range(start, end):
+                    tags[position] = ENTITY_LOCATION
+
+        # The narrowest places named win; broader ones only pick between namesakes ('ikeja, lagos')
+        for kind, key in (('city', 'city_ids'), ('state', 'state_ids'), ('country', 'country_ids')):
+            places = [place for place in located if place.kind == kind]
+            if places:
+                inside = [place for place in places if any(is_within(place, area) for area in areas)]
+                places = inside or places
+                filters[key] = [place.id for place in places]
+                entities['locations'] = [place.as_dict() for place in places]
+                break
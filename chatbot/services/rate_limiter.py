@@ -0,0 +1,244 @@
+# chatbot/services/rate_limiter.py - Shared token-bucket limiter for provider quotas
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from main.redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT = {
+    'ENABLED': True,
+    'REQUESTS_PER_MINUTE': 60,  # Provider quota shared by every process
+    'BURST': 10,                # Requests that may go out back to back after an idle spell
+    'MAX_WAIT': 10,             # Seconds a call may queue before giving up
+    'MAX_QUEUE': 100,           # Waiting calls per process before new ones are rejected
+    'LEASE_SIZE': 2,            # Tokens taken from Redis per round trip
+    'LEASE_TTL': 1.0,           # Seconds leased tokens stay usable in this process
+    'BACKOFF_SECONDS': 5,       # Pause for every process after the provider answers 429
+}
+
+# Refill the shared bucket and take up to ARGV[3] tokens.
+# Returns {granted, milliseconds until the next token}; Redis TIME keeps
+# every process on the same clock.
+TOKEN_BUCKET_SCRIPT = """
+local pause = redis.call('PTTL', KEYS[2])
+if pause > 0 then
+    return {0, pause}
+end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate / 1000)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+return {granted, wait}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """The call could not be admitted before its deadline or the queue was full"""
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket admitting calls up to a provider quota across all processes.
+
+    The bucket lives in Redis. Each round trip leases a few tokens into the
+    process, so most calls are admitted without touching Redis. Calls over
+    the limit queue in arrival order, one of them polling the bucket at a
+    time, and fail with RateLimitExceeded once they cannot be admitted before
+    their deadline. Without Redis the bucket is kept in-process instead.
+    """
+
+    def __init__(self, name: str, settings_key: str):
+        self.name = name
+        self.settings_key = settings_key
+        self._lock = threading.Lock()
+        # Event loop -> asyncio.Lock keeping waiters first come, first served
+        self._queues = weakref.WeakKeyDictionary()
+        self._script = None
+
+        self._leased = 0
+        self._lease_expires = 0.0
+        self._paused_until = 0.0
+        self._local_tokens = None
+        self._local_updated = 0.0
+
+        self._waiting = 0
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0, 'max_queue_depth': 0}
+        self._wait_total = 0.0
+
+    @property
+    def config(self) -> Dict:
+        return {
+            **DEFAULT_RATE_LIMIT,
+            **getattr(settings, 'CHATBOT_SETTINGS', {}).get(self.settings_key, {}),
+        }
+
+    # ===========================
+    #  ADMISSION
+    # ===========================
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """Wait for a token; returns the seconds spent queued"""
+        config = self.config
+        if not config['ENABLED'] or self._take_leased():
+            self._record('admitted')
+            return 0.0
+
+        with self._lock:
+            if self._waiting >= config['MAX_QUEUE']:
+                self._stats['rejected'] += 1
+                raise RateLimitExceeded(f"{self.name} rate limit queue is full")
+            self._waiting += 1
+            self._stats['queued'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._waiting)
+
+        start = time.monotonic()
+        deadline = start + (config['MAX_WAIT'] if timeout is None else timeout)
+        try:
+            await self._wait_for_token(config, deadline)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        waited = time.monotonic() - start
+        self._record('admitted', waited)
+        return waited
+
+    async def _wait_for_token(self, config: Dict, deadline: float):
+        queue = self._queues.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+        try:
+            await asyncio.wait_for(queue.acquire(), timeout=max(deadline - time.monotonic(), 0.001))
+        except asyncio.TimeoutError:
+            self._record('timed_out')
+            raise RateLimitExceeded(f"Timed out waiting in the {self.name} rate limit queue")
+
+        try:
+            while not self._take_leased():
+                wait = await self._refill(config)
+                if wait <= 0:
+                    continue
+                # The bucket refills at a known rate, so a wait past the deadline fails now
+                if time.monotonic() + wait > deadline:
+                    self._record('timed_out')
+                    raise RateLimitExceeded(f"{self.name} rate limit would delay the call past its deadline")
+                await asyncio.sleep(wait)
+        finally:
+            queue.release()
+
+    def _take_leased(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until or now >= self._lease_expires:
+                self._leased = 0
+                return False
+            if self._leased > 0:
+                self._leased -= 1
+                return True
+            return False
+
+    async def _refill(self, config: Dict) -> float:
+        """Lease tokens into the process; returns seconds to wait when none were available"""
+        paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            return paused
+
+        rate = config['REQUESTS_PER_MINUTE'] / 60.0
+        client = get_redis_client()
+        if client is None:
+            granted, wait = self._refill_local(config, rate)
+        else:
+            try:
+                granted, wait_ms = await asyncio.to_thread(
+                    self._get_script(client),
+                    keys=[redis_key('rate_limit', self.name), redis_key('rate_limit', self.name, 'pause')],
+                    args=[rate, config['BURST'], config['LEASE_SIZE']],
+                )
+                granted, wait = int(granted), int(wait_ms) / 1000.0
+            except Exception as e:
+                logger.error(f"Error reading {self.name} rate limit bucket: {str(e)}")
+                granted, wait = self._refill_local(config, rate)
+
+        if granted:
+            with self._lock:
+                self._leased += granted
+                self._lease_expires = time.monotonic() + config['LEASE_TTL']
+        return wait
+
+    def _refill_local(self, config: Dict, rate: float):
+        """Same bucket kept in this process, used when Redis is unavailable"""
+        with self._lock:
+            now = time.monotonic()
+            capacity = config['BURST']
+            if self._local_tokens is None:
+                self._local_tokens = capacity
+            else:
+                self._local_tokens = min(capacity, self._local_tokens + (now - self._local_updated) * rate)
+            self._local_updated = now
+
+            granted = min(config['LEASE_SIZE'], int(self._local_tokens))
+            self._local_tokens -= granted
+            wait = 0.0 if granted else (1 - self._local_tokens) / rate
+            return granted, wait
+
+    def _get_script(self, client):
+        if self._script is None:
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    # ===========================
+    #  BACKOFF AND METRICS
+    # ===========================
+
+    def penalize(self, seconds: Optional[float] = None):
+        """Hold every process back after the provider rejected a call as over quota"""
+        seconds = seconds if seconds is not None else self.config['BACKOFF_SECONDS']
+        with self._lock:
+            self._leased = 0
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+        client = get_redis_client()
+        if client is not None:
+            try:
+                client.set(redis_key('rate_limit', self.name, 'pause'), 1, px=int(seconds * 1000))
+            except Exception as e:
+                logger.error(f"Error pausing {self.name} rate limit: {str(e)}")
+        logger.warning(f"{self.name} quota exceeded, pausing calls for {seconds}s")
+
+    def _record(self, outcome: str, waited: float = 0.0):
+        with self._lock:
+            self._stats[outcome] += 1
+            self._wait_total += waited
+
+    def stats(self) -> Dict:
+        """Counters for this process since start-up"""
+        with self._lock:
+            admitted = self._stats['admitted']
+            return {
+                'name': self.name,
+                'queue_depth': self._waiting,
+                **self._stats,
+                'avg_wait_ms': round(self._wait_total * 1000 / admitted, 2) if admitted else 0.0,
+                'paused': time.monotonic() < self._paused_until,
+            }
+
+
+gemini_rate_limiter = TokenBucketRateLimiter('gemini', 'GEMINI_RATE_LIMIT')
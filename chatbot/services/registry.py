@@ -0,0 +1,134 @@
+# chatbot/services/registry.py - Process-wide chatbot service instances
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Lazily built, shared service instances.
+
+    GeminiAIClient configures the SDK and builds its model and prompts on
+    construction, so routers and clients are created once per process and
+    handed to every view, consumer and task. Construction never awaits, so a
+    threading lock also covers concurrent callers on the event loop.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        # Re-entrant: the router factory asks for the clients it wraps
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._factories[name]()
+                self._instances[name] = instance
+                logger.info(f"Initialized shared chatbot service: {name}")
+            return instance
+
+    def override(self, name: str, instance: Any):
+        """Install a ready-made instance, e.g. a fake client in tests"""
+        with self._lock:
+            self._instances[name] = instance
+
+    def reset(self, *names: str):
+        """Drop built instances (all of them when no names are given) so the next get() rebuilds"""
+        with self._lock:
+            if names:
+                for name in names:
+                    self._instances.pop(name, None)
+            else:
+                self._instances.clear()
+
+
+# ===========================
+#  FACTORIES
+# ===========================
+
+def _build_gemini_client():
+    from .gemini_client import GeminiAIClient
+    return GeminiAIClient()
+
+
+def _build_local_search():
+    from .local_search import LocalSearchService
+    return LocalSearchService()
+
+
+def _build_serpapi_service():
+    from .serpapi_service import SerpAPIService
+    return SerpAPIService()
+
+
+def _build_web_search():
+    from .web_search import WebSearchService
+    return WebSearchService()
+
+
+def _build_intent_classifier():
+    from .intent_engine import IntentClassifier
+    return IntentClassifier()
+
+
+def _build_query_entity_extractor():
+    from .query_entities import QueryEntityExtractor
+    return QueryEntityExtractor()
+
+
+def _build_router():
+    from .smart_router import SmartChatbotRouter
+    return SmartChatbotRouter()
+
+
+services = ServiceRegistry()
+services.register('gemini_client', _build_gemini_client)
+services.register('local_search', _build_local_search)
+services.register('serpapi_service', _build_serpapi_service)
+services.register('web_search', _build_web_search)
+services.register('intent_classifier', _build_intent_classifier)
+services.register('query_entities', _build_query_entity_extractor)
+services.register('router', _build_router)
+
+
+def get_gemini_client():
+    return services.get('gemini_client')
+
+
+def get_local_search():
+    return services.get('local_search')
+
+
+def get_serpapi_service():
+    return services.get('serpapi_service')
+
+
+def get_web_search():
+    return services.get('web_search')
+
+
+def get_intent_classifier():
+    return services.get('intent_classifier')
+
+
+def get_query_entity_extractor():
+    return services.get('query_entities')
+
+
+def get_chatbot_router():
+    return services.get('router')
+
+
+def reset_services(*names: str):
+    services.reset(*names)
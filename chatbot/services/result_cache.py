@@ -0,0 +1,144 @@
+# chatbot/services/result_cache.py - Shared result cache with request coalescing
+import asyncio
+import json
+import logging
+import re
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..utils import CacheManager
+
+logger = logging.getLogger(__name__)
+
+# Seconds each kind of result stays fresh; external calls cost money, local data changes often
+DEFAULT_RESULT_TTLS = {
+    'intro': 3600,
+    'local': 300,
+    'external': 1800,
+    'local_total': 86400,
+    'config': 60,
+}
+
+
+def normalize_query(message: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', (message or '').lower()).split())
+
+
+def location_key(context: Dict) -> str:
+    """Stable key for the parts of the chat context that change search results"""
+    context = context or {}
+    location_context = context.get('location_context') or {}
+    parts = {
+        'location': context.get('location'),
+        'city': location_context.get('city'),
+        'state': location_context.get('state'),
+        'country': location_context.get('country'),
+    }
+    return json.dumps({k: v for k, v in parts.items() if v}, sort_keys=True, default=str)
+
+
+class _InFlight:
+    """A running computation and how many callers are waiting on it"""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlightResultCache:
+    """
+    Cache for router results keyed by (kind, normalized query, intent, location).
+
+    A hit is served from the shared Django cache. On a miss, concurrent
+    callers asking for the same key in this process await one in-flight
+    computation instead of each calling the database, Gemini or SerpAPI.
+    When the last waiting caller is cancelled (a speculative search nobody
+    needs, or a deadline), the computation is cancelled with it.
+    """
+
+    def __init__(self):
+        self.cache_manager = CacheManager()
+        chatbot_settings = getattr(settings, 'CHATBOT_SETTINGS', {})
+        self.ttls = {
+            **DEFAULT_RESULT_TTLS,
+            'external': chatbot_settings.get('SEARCH_CACHE_TIMEOUT', DEFAULT_RESULT_TTLS['external']),
+            **chatbot_settings.get('RESULT_CACHE_TTLS', {}),
+        }
+        # Event loop -> {cache key: _InFlight}; tasks can only be awaited on their own loop
+        self._inflight = weakref.WeakKeyDictionary()
+
+    def make_key(self, kind: str, message: str, intent_type: str = '', context: Dict = None) -> str:
+        return self.cache_manager.get_cache_key(
+            kind, normalize_query(message), intent=intent_type or '', location=location_key(context)
+        )
+
+    async def get(self, key: str) -> Any:
+        try:
+            return await cache.aget(key)
+        except Exception as e:
+            logger.error(f"Error reading result cache: {str(e)}")
+            return None
+
+    async def set(self, kind: str, key: str, value: Any):
+        try:
+            await cache.aset(key, value, self.ttls.get(kind, DEFAULT_RESULT_TTLS['local']))
+        except Exception as e:
+            logger.error(f"Error writing result cache: {str(e)}")
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Return the cached value for key, computing it at most once per process"""
+        cached = await self.get(key)
+        if cached is not None:
+            logger.info(f"Result cache hit: {kind}")
+            return cached
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        flight = inflight.get(key)
+        if flight is None:
+            flight = inflight[key] = _InFlight(
+                loop.create_task(self._compute_and_store(kind, key, compute, cacheable))
+            )
+            flight.task.add_done_callback(lambda _: self._forget(inflight, key, flight))
+        else:
+            logger.info(f"Joining in-flight {kind} computation")
+
+        flight.waiters += 1
+        try:
+            # shield() so one cancelled caller does not cancel the work others are waiting on
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                logger.info(f"Cancelling {kind} computation with no callers left")
+                self._forget(inflight, key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    @staticmethod
+    def _forget(inflight: Dict, key: str, flight: _InFlight):
+        # A caller arriving after a cancellation starts a fresh computation
+        if inflight.get(key) is flight:
+            del inflight[key]
+
+    async def _compute_and_store(self, kind, key, compute, cacheable):
+        result = await compute()
+        if result is not None and (cacheable is None or cacheable(result)):
+            await self.set(kind, key, result)
+        return result
+
+
+result_cache = SingleFlightResultCache()
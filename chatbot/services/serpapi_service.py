@@ -5,9 +5,10 @@ from typing import Dict, List, Any, Optional
 from urllib.parse import urlencode
 from django.conf import settings
 import asyncio
-import aiohttp
 import re
 
+from .http_client import get_http_session, request_timeout
+
 logger = logging.getLogger(__name__)
 
 class SerpAPIService:
@@ -115,56 +116,56 @@ class SerpAPIService:
         start_time = time.time()
         
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                url = f"{self.base_url}?{urlencode(params)}"
-                logger.info(f"Making SerpAPI request to: {url[:100]}...")
-                
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        search_time = time.time() - start_time
-                        
-                        logger.info(f"SerpAPI request successful in {search_time:.2f}s")
-                        
-                        # Check for API errors in response
-                        if 'error' in data:
-                            logger.error(f"SerpAPI returned error: {data['error']}")
-                            return {
-                                'success': False,
-                                'error': data['error'],
-                                result_type: [],
-                                'total_found': 0
-                            }
-                        
-                        if result_type == 'products':
-                            return self._parse_shopping_results(data, search_time)
-                        elif result_type == 'services':
-                            return self._parse_maps_results(data, search_time)
-                        else:
-                            return {
-                                'success': False, 
-                                'error': 'Unknown result type',
-                                result_type: [],
-                                'total_found': 0
-                            }
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"SerpAPI error {response.status}: {error_text}")
-                        
-                        # Handle specific error cases
-                        if response.status == 400 and 'Unsupported' in error_text:
-                            logger.warning("Retrying with fallback parameters...")
-                            # Remove problematic parameters and retry
-                            fallback_params = {k: v for k, v in params.items() if k not in ['gl']}
-                            return await self._make_fallback_request(fallback_params, result_type)
-                        
+            session = await get_http_session()
+            url = f"{self.base_url}?{urlencode(params)}"
+            logger.info(f"Making SerpAPI request to: {url[:100]}...")
+            
+            async with session.get(url, timeout=request_timeout(self.timeout)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    search_time = time.time() - start_time
+                    
+                    logger.info(f"SerpAPI request successful in {search_time:.2f}s")
+                    
+                    # Check for API errors in response
+                    if 'error' in data:
+                        logger.error(f"SerpAPI returned error: {data['error']}")
                         return {
                             'success': False,
-                            'error': f'API request failed with status {response.status}: {error_text}',
+                            'error': data['error'],
                             result_type: [],
                             'total_found': 0
                         }
-                        
+                    
+                    if result_type == 'products':
+                        return self._parse_shopping_results(data, search_time)
+                    elif result_type == 'services':
+                        return self._parse_maps_results(data, search_time)
+                    else:
+                        return {
+                            'success': False, 
+                            'error': 'Unknown result type',
+                            result_type: [],
+                            'total_found': 0
+                        }
+                else:
+                    error_text = await response.text()
+                    logger.error(f"SerpAPI error {response.status}: {error_text}")
+                    
+                    # Handle specific error cases
+                    if response.status == 400 and 'Unsupported' in error_text:
+                        logger.warning("Retrying with fallback parameters...")
+                        # Remove problematic parameters and retry
+                        fallback_params = {k: v for k, v in params.items() if k not in ['gl']}
+                        return await self._make_fallback_request(fallback_params, result_type)
+                    
+                    return {
+                        'success': False,
+                        'error': f'API request failed with status {response.status}: {error_text}',
+                        result_type: [],
+                        'total_found': 0
+                    }
+                    
         except asyncio.TimeoutError:
             logger.error("SerpAPI request timeout")
             return {
@@ -187,33 +188,33 @@ class SerpAPIService:
         Make a fallback request with simplified parameters
         """
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                url = f"{self.base_url}?{urlencode(params)}"
-                logger.info(f"Making fallback SerpAPI request to: {url[:100]}...")
-                
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        if 'error' in data:
-                            return {
-                                'success': False,
-                                'error': data['error'],
-                                result_type: [],
-                                'total_found': 0
-                            }
-                        
-                        if result_type == 'products':
-                            return self._parse_shopping_results(data, 0)
-                        elif result_type == 'services':
-                            return self._parse_maps_results(data, 0)
+            session = await get_http_session()
+            url = f"{self.base_url}?{urlencode(params)}"
+            logger.info(f"Making fallback SerpAPI request to: {url[:100]}...")
+            
+            async with session.get(url, timeout=request_timeout(self.timeout)) as response:
+                if response.status == 200:
+                    data = await response.json()
                     
-                    return {
-                        'success': False,
-                        'error': f'Fallback request also failed with status {response.status}',
-                        result_type: [],
-                        'total_found': 0
-                    }
+                    if 'error' in data:
+                        return {
+                            'success': False,
+                            'error': data['error'],
+                            result_type: [],
+                            'total_found': 0
+                        }
+                    
+                    if result_type == 'products':
+                        return self._parse_shopping_results(data, 0)
+                    elif result_type == 'services':
+                        return self._parse_maps_results(data, 0)
+                
+                return {
+                    'success': False,
+                    'error': f'Fallback request also failed with status {response.status}',
+                    result_type: [],
+                    'total_found': 0
+                }
         except Exception as e:
             logger.error(f"Fallback request error: {str(e)}")
             return {
@@ -1,33 +1,52 @@
 # chatbot/services/smart_router.py - FIXED VERSION WITH PROPER SERPAPI FALLBACK
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional, Tuple
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
-from .gemini_client import GeminiAIClient
-from .local_search import LocalSearchService
-from .serpapi_service import SerpAPIService
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from ..models import BotConfiguration
+from .registry import get_gemini_client, get_intent_classifier, get_local_search, get_serpapi_service
+from .intent_engine import INTENT_OTHER, NOT_PRODUCT_SERVICE_RESPONSE
+from .result_cache import result_cache
+from .intro_templates import build_template_intro
 
 logger = logging.getLogger(__name__)
 
+# BotConfiguration key that lets Gemini write intros instead of the local templates
+LLM_INTRO_CONFIG_KEY = 'llm_intro_enabled'
+
+# Awaited with (event_type, payload) while a reply is being built
+EventCallback = Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]]
+
 class SmartChatbotRouter:
     """
     Smart router that handles intent detection, local search first, then external search via SerpAPI
     """
     
     def __init__(self):
-        self.gemini_client = GeminiAIClient()
-        self.local_search = LocalSearchService()
-        self.serpapi_service = SerpAPIService()
+        # Shared per process; build routers through registry.get_chatbot_router()
+        self.gemini_client = get_gemini_client()
+        self.local_search = get_local_search()
+        self.serpapi_service = get_serpapi_service()
+        self.intent_classifier = get_intent_classifier()
+        self.result_cache = result_cache
         
         # Configuration
         self.external_search_enabled = True
         self.max_results_per_source = 5
         self.min_results_threshold = 1  # If local results < this, trigger external search
+        self.external_search_deadline = getattr(settings, 'CHATBOT_SETTINGS', {}).get('EXTERNAL_SEARCH_DEADLINE', 8)
         
-    async def process_message(self, message: str, context: Dict = None) -> Dict[str, Any]:
+    async def process_message(self, message: str, context: Dict = None, on_event: EventCallback = None) -> Dict[str, Any]:
         """
         Main entry point for processing user messages
+        
+        on_event, if given, is awaited with (event_type, payload) as each part
+        of the reply becomes available: 'intro_chunk', 'intro',
+        'local_results' and 'external_results'.
         """
         try:
             start_time = datetime.now()
@@ -50,28 +69,59 @@ class SmartChatbotRouter:
                     'processing_time': (datetime.now() - start_time).total_seconds()
                 }
             
-            # Step 2: Generate intro message using Gemini
-            intro_message = await self._generate_intro_message(message, intent_result)
-            
-            # Step 3: Search internal database first
-            local_results = await self._search_local_database(message, intent_result, context)
-            local_total = local_results.get('total_results', 0)
-            
-            logger.info(f"Local search found {local_total} results")
-            
-            # Step 4: FIXED - If no local results OR insufficient results, search externally
-            external_results = {}
-            should_search_external = (
-                self.external_search_enabled and 
-                local_total < self.min_results_threshold
+            # Steps 2-4 overlap: the intro and local search run concurrently, and
+            # external search starts early when this query has come back thin before
+            intro_task = asyncio.create_task(
+                self._generate_and_emit_intro(message, intent_result, on_event, context.get('session_id'))
             )
-            
-            if should_search_external:
-                logger.info(f"Local results ({local_total}) below threshold ({self.min_results_threshold}), searching externally...")
-                external_results = await self._search_external(message, intent_result, context)
-                logger.info(f"External search found {external_results.get('total_found', 0)} results")
-            else:
-                logger.info(f"Sufficient local results ({local_total}), skipping external search")
+            external_task = None
+            try:
+                if self.external_search_enabled and await self._predict_thin_local(message, intent_result, context):
+                    logger.info("Local results predicted thin, starting external search speculatively")
+                    external_task = asyncio.create_task(
+                        self._search_external_with_deadline(message, intent_result, context)
+                    )
+                
+                local_results = await self._search_local_database(message, intent_result, context)
+                local_total = local_results.get('total_results', 0)
+                logger.info(f"Local search found {local_total} results")
+                if local_results.get('success', False):
+                    await self._remember_local_total(message, intent_result, context, local_total)
+                await self._emit(on_event, 'local_results', {
+                    'products': local_results.get('products', []),
+                    'services': local_results.get('services', []),
+                    'total': local_total
+                })
+                
+                # If no local results OR insufficient results, search externally
+                external_results = {}
+                should_search_external = (
+                    self.external_search_enabled and 
+                    local_total < self.min_results_threshold
+                )
+                
+                if should_search_external:
+                    logger.info(f"Local results ({local_total}) below threshold ({self.min_results_threshold}), searching externally...")
+                    if external_task is None:
+                        external_task = asyncio.create_task(
+                            self._search_external_with_deadline(message, intent_result, context)
+                        )
+                    external_results = await external_task
+                    logger.info(f"External search found {external_results.get('total_found', 0)} results")
+                    await self._emit(on_event, 'external_results', {
+                        'products': external_results.get('products', []),
+                        'services': external_results.get('services', []),
+                        'total': external_results.get('total_found', 0)
+                    })
+                else:
+                    logger.info(f"Sufficient local results ({local_total}), skipping external search")
+                
+                intro_message = await intro_task
+            finally:
+                # Drop work nobody will read (speculative search that was not needed, or an error above)
+                for task in (intro_task, external_task):
+                    if task is not None and not task.done():
+                        task.cancel()
             
             # Step 5: Format final response in YOUR EXACT FORMAT
             formatted_response = self._format_response_exact_format(
@@ -89,6 +139,7 @@ class SmartChatbotRouter:
                 'session_id': context.get('session_id', 'default_session'),
                 'response': formatted_response,
                 'message_type': 'text',
+                'intent': intent_result,
                 'metadata': {
                     'processing_time': processing_time,
                     'search_strategy': 'local_first_then_external',
@@ -147,78 +198,134 @@ class SmartChatbotRouter:
                 'processing_time': (datetime.now() - start_time).total_seconds() if 'start_time' in locals() else 0
             }
     
-    def _detect_intent(self, message: str) -> Dict[str, Any]:
+    async def stream_message(self, message: str, context: Dict = None) -> AsyncIterator[Dict[str, Any]]:
         """
-        IMPROVED: Better intent detection for products vs services
+        Run process_message and yield its events as they happen, ending with
+        {'type': 'final', 'result': <process_message result>}.
         """
-        message_lower = message.lower()
-        
-        # More comprehensive product keywords
-        product_keywords = [
-            # General shopping terms
-            'buy', 'sell', 'purchase', 'price', 'cost', 'product', 'item', 'shopping',
-            # Electronics
-            'phone', 'laptop', 'computer', 'tablet', 'tv', 'camera', 'watch', 'headphones', 
-            'speaker', 'gadget', 'device', 'electronics', 'smartphone', 'iphone', 'android',
-            # Brands
-            'samsung', 'apple', 'hp', 'dell', 'sony', 'lg', 'nike', 'adidas', 'canon', 'huawei',
-            # Other products
-            'clothing', 'shoes', 'furniture', 'car', 'vehicle', 'book', 'jewelry', 'bag', 'accessory',
-            # Search terms
-            'find', 'looking for', 'need', 'want', 'search for', 'show me', 'i want', 'get me'
-        ]
-        
-        # More comprehensive service keywords  
-        service_keywords = [
-            # General service terms
-            'service', 'hire', 'book', 'appointment', 'professional', 'expert', 'help', 'assist',
-            # Specific services
-            'repair', 'fix', 'cleaning', 'plumbing', 'electrician', 'mechanic', 'doctor',
-            'lawyer', 'teacher', 'tutor', 'consultant', 'designer', 'developer', 'writer',
-            'photographer', 'catering', 'delivery', 'transport', 'uber', 'taxi', 'driver',
-            'massage', 'barber', 'salon', 'fitness', 'trainer', 'coach', 'therapist'
-        ]
-        
-        # Count exact matches and partial matches
-        product_score = 0
-        service_score = 0
-        
-        for keyword in product_keywords:
-            if keyword in message_lower:
-                product_score += 2 if keyword == message_lower.strip() else 1
+        queue = asyncio.Queue()
         
-        for keyword in service_keywords:
-            if keyword in message_lower:
-                service_score += 2 if keyword == message_lower.strip() else 1
+        async def on_event(event_type, payload):
+            await queue.put({'type': event_type, **payload})
         
-        logger.info(f"Intent scoring - Product: {product_score}, Service: {service_score}")
+        task = asyncio.create_task(self.process_message(message, context, on_event=on_event))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {'type': 'final', 'result': task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    def _detect_intent(self, message: str) -> Dict[str, Any]:
+        """
+        Classify the message as a product search, a service search or neither
+        """
+        result = self.intent_classifier.classify(message)
+        logger.info(
+            f"Intent {result['intent']} ({result['confidence']}) - "
+            f"Product: {result['product_score']}, Service: {result['service_score']}"
+        )
         
-        # Determine intent with higher threshold
-        if product_score > 0 or service_score > 0:
-            intent_type = 'product' if product_score >= service_score else 'service'
-            confidence = min(0.9, 0.6 + (max(product_score, service_score) * 0.1))
-            
-            return {
-                'is_product_service': True,
-                'type': intent_type,
-                'confidence': confidence,
-                'product_score': product_score,
-                'service_score': service_score
-            }
-        else:
+        if result['intent'] == INTENT_OTHER:
             return {
                 'is_product_service': False,
-                'response': "I'm here to help you find products and services! Please ask me about items you'd like to buy or services you need. For example: 'I need a Samsung Galaxy A16' or 'Looking for a cleaning service in Lagos'."
+                'type': INTENT_OTHER,
+                'confidence': result['confidence'],
+                'response': NOT_PRODUCT_SERVICE_RESPONSE
             }
+        
+        return {
+            'is_product_service': True,
+            'type': result['intent'],
+            'confidence': result['confidence'],
+            'product_score': result['product_score'],
+            'service_score': result['service_score']
+        }
+    
+    async def _emit(self, on_event: EventCallback, event_type: str, payload: Dict):
+        """Report partial progress; a failing listener never breaks the reply"""
+        if on_event is None:
+            return
+        try:
+            await on_event(event_type, payload)
+        except Exception as e:
+            logger.error(f"Error emitting {event_type} event: {str(e)}")
+    
+    async def _generate_and_emit_intro(self, message: str, intent_result: Dict, on_event: EventCallback = None,
+                                       session_id: Optional[str] = None) -> str:
+        intro_message = await self._generate_intro_message(message, intent_result, on_event, session_id)
+        await self._emit(on_event, 'intro', {'text': intro_message})
+        return intro_message
     
-    async def _generate_intro_message(self, message: str, intent_result: Dict) -> str:
+    async def _generate_intro_message(self, message: str, intent_result: Dict, on_event: EventCallback = None,
+                                      session_id: Optional[str] = None) -> str:
         """
-        Generate human-like intro message using Gemini
+        Generate human-like intro message, from a template or Gemini
         """
         try:
             intent_type = intent_result.get('type', 'product')
             
-            prompt = f"""
+            # Templates are the default; Gemini only when enabled or no template fits
+            if not await self._llm_intro_enabled():
+                intro = build_template_intro(message, intent_type)
+                if intro:
+                    return intro
+            
+            key = self.result_cache.make_key('intro', message, intent_type)
+            
+            if on_event is not None:
+                intro = await self._stream_intro_message(key, message, intent_type, on_event)
+            else:
+                intro = await self.result_cache.get_or_compute(
+                    'intro', key, lambda: self._request_intro_message(message, intent_type, session_id)
+                )
+            return intro or f"Let me help you find what you're looking for!"
+                
+        except Exception as e:
+            logger.error(f"Error generating intro: {str(e)}")
+            return f"Let me search for that for you!"
+    
+    async def _stream_intro_message(self, key: str, message: str, intent_type: str, on_event: EventCallback) -> Optional[str]:
+        """Stream the Gemini intro to the listener as it is generated, then cache it"""
+        cached = await self.result_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        chunks = []
+        async for chunk in self.gemini_client.stream_response(
+            self._intro_prompt(message, intent_type),
+            context={},
+            prompt_type='marketplace_assistant',
+            include_search_results=False
+        ):
+            chunks.append(chunk)
+            await self._emit(on_event, 'intro_chunk', {'text': chunk})
+        
+        intro = ''.join(chunks).strip() or None
+        if intro:
+            await self.result_cache.set('intro', key, intro)
+        return intro
+    
+    async def _llm_intro_enabled(self) -> bool:
+        """BotConfiguration 'llm_intro_enabled' flag, cached briefly so each message skips the DB"""
+        key = self.result_cache.cache_manager.get_cache_key('config', LLM_INTRO_CONFIG_KEY)
+        enabled = await self.result_cache.get(key)
+        if enabled is None:
+            try:
+                enabled = bool(await sync_to_async(BotConfiguration.get_config)(LLM_INTRO_CONFIG_KEY, False))
+            except Exception as e:
+                logger.error(f"Error reading {LLM_INTRO_CONFIG_KEY}: {str(e)}")
+                return False
+            await self.result_cache.set('config', key, enabled)
+        return enabled
+    
+    def _intro_prompt(self, message: str, intent_type: str) -> str:
+        return f"""
 Generate a friendly, conversational intro message for a marketplace assistant. 
 The user is looking for: "{message}"
 This appears to be a {intent_type} search.
@@ -230,22 +337,41 @@ Generate a brief, enthusiastic intro (1-2 sentences) like:
 
 Keep it natural and conversational. Don't mention search process details.
 """
-            
-            response = await self.gemini_client.generate_response(
-                prompt, 
-                context={}, 
-                prompt_type='marketplace_assistant',
-                include_search_results=False
-            )
-            
-            if response.get('success', False):
-                return response.get('response', '').strip()
-            else:
-                return f"Let me help you find what you're looking for!"
-                
-        except Exception as e:
-            logger.error(f"Error generating intro: {str(e)}")
-            return f"Let me search for that for you!"
+    
+    async def _request_intro_message(self, message: str, intent_type: str, session_id: Optional[str] = None) -> Optional[str]:
+        """
+        Ask Gemini for the intro; None when it fails so the fallback is not cached.
+        It may share a request only with other prompts from the same session.
+        """
+        response = await self.gemini_client.generate_response(
+            self._intro_prompt(message, intent_type), 
+            context={}, 
+            prompt_type='marketplace_assistant',
+            include_search_results=False,
+            batch_key=session_id
+        )
+        
+        if response.get('success', False):
+            return response.get('response', '').strip() or None
+        return None
+    
+    def _local_search_type(self, intent_result: Dict) -> str:
+        """Determine local search type based on intent"""
+        if intent_result.get('type') == 'product':
+            return 'products'
+        if intent_result.get('type') == 'service':
+            return 'services'
+        return 'both'
+    
+    async def _predict_thin_local(self, message: str, intent_result: Dict, context: Dict) -> bool:
+        """True when the last local search for this query found fewer results than the threshold"""
+        key = self.result_cache.make_key('local_total', message, self._local_search_type(intent_result), context)
+        last_total = await self.result_cache.get(key)
+        return last_total is not None and last_total < self.min_results_threshold
+    
+    async def _remember_local_total(self, message: str, intent_result: Dict, context: Dict, total: int):
+        key = self.result_cache.make_key('local_total', message, self._local_search_type(intent_result), context)
+        await self.result_cache.set('local_total', key, total)
     
     async def _search_local_database(self, message: str, intent_result: Dict, context: Dict) -> Dict[str, Any]:
         """
@@ -254,24 +380,25 @@ Keep it natural and conversational. Don't mention search process details.
         try:
             logger.info(f"Searching local database for: {message}")
             
-            # Determine search type based on intent
-            search_type = 'both'  # Default to both
-            if intent_result.get('type') == 'product':
-                search_type = 'products'
-            elif intent_result.get('type') == 'service':
-                search_type = 'services'
+            search_type = self._local_search_type(intent_result)
             
             # Build filters from context
             filters = {}
             if context.get('location'):
                 filters['location'] = context['location']
             
-            # Perform search
-            results = await self.local_search.search(
-                query=message,
-                search_type=search_type,
-                filters=filters,
-                location_context=context.get('location_context')
+            # Perform search (shared with identical concurrent/recent queries)
+            key = self.result_cache.make_key('local', message, search_type, context)
+            results = await self.result_cache.get_or_compute(
+                'local',
+                key,
+                lambda: self.local_search.search(
+                    query=message,
+                    search_type=search_type,
+                    filters=filters,
+                    location_context=context.get('location_context')
+                ),
+                cacheable=lambda result: result.get('success', False)
             )
             
             logger.info(f"Local search found {results.get('total_results', 0)} results")
@@ -335,20 +462,55 @@ Keep it natural and conversational. Don't mention search process details.
     #         }
 
 
+    async def _search_external_with_deadline(self, message: str, intent_result: Dict, context: Dict) -> Dict[str, Any]:
+        """
+        External search bounded by EXTERNAL_SEARCH_DEADLINE seconds.
+
+        At the deadline the SerpAPI call is cancelled too, unless another
+        request for the same query is still waiting on it.
+        """
+        try:
+            return await asyncio.wait_for(
+                self._search_external(message, intent_result, context),
+                timeout=self.external_search_deadline
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"External search exceeded {self.external_search_deadline}s deadline")
+            return {
+                'success': False,
+                'total_found': 0,
+                'products': [],
+                'services': [],
+                'error': 'deadline exceeded'
+            }
+
     async def _search_external(self, message: str, intent_result: Dict, context: Dict) -> Dict[str, Any]:
+        """
+        Search external sources, reusing cached or in-flight SerpAPI results for the same query
+        """
+        if not self.external_search_enabled:
+            logger.info("External search is disabled")
+            return {
+                'success': True,
+                'total_found': 0, 
+                'products': [], 
+                'services': []
+            }
+        
+        # Both products and services are always searched, so the intent is not part of the key
+        key = self.result_cache.make_key('external', message, context=context)
+        return await self.result_cache.get_or_compute(
+            'external',
+            key,
+            lambda: self._request_external(message, context),
+            cacheable=lambda result: result.get('products_success') or result.get('services_success')
+        )
+
+    async def _request_external(self, message: str, context: Dict) -> Dict[str, Any]:
         """
         FIXED: Search external sources using SerpAPI - now returns proper format
         """
         try:
-            if not self.external_search_enabled:
-                logger.info("External search is disabled")
-                return {
-                    'success': True,
-                    'total_found': 0, 
-                    'products': [], 
-                    'services': []
-                }
-                
             logger.info(f"Searching external sources for: {message}")
             
             # Get user location for search
@@ -1,6 +1,5 @@
 # ai_chatbot/services/web_search.py
 import asyncio
-import aiohttp
 import logging
 from typing import Dict, List, Any, Optional, Tuple
 from urllib.parse import urlencode, urlparse, quote_plus
@@ -12,6 +11,8 @@ import requests
 from django.core.cache import cache
 from django.conf import settings
 
+from .http_client import get_http_session, request_timeout
+
 logger = logging.getLogger(__name__)
 
 
@@ -300,23 +301,23 @@ class WebSearchService:
             if location_context and location_context.get('country'):
                 params['gl'] = location_context['country'].lower()
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as session:
-                url = f"{config['base_url']}?{urlencode(params)}"
-                
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        products = self._parse_google_results(data)
-                        
-                        return {
-                            'success': True,
-                            'products': products,
-                            'source': 'google',
-                            'results_count': len(products)
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {'success': False, 'error': f'Google API error: {response.status} - {error_text}'}
+            session = await get_http_session()
+            url = f"{config['base_url']}?{urlencode(params)}"
+            
+            async with session.get(url, headers=self.headers, timeout=request_timeout(self.request_timeout)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    products = self._parse_google_results(data)
+                    
+                    return {
+                        'success': True,
+                        'products': products,
+                        'source': 'google',
+                        'results_count': len(products)
+                    }
+                else:
+                    error_text = await response.text()
+                    return {'success': False, 'error': f'Google API error: {response.status} - {error_text}'}
         
         except Exception as e:
             logger.error(f"Google search error: {str(e)}")
@@ -351,23 +352,23 @@ class WebSearchService:
                 'Ocp-Apim-Subscription-Key': config['api_key']
             }
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout)) as session:
-                url = f"{config['base_url']}?{urlencode(params)}"
-                
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        products = self._parse_bing_results(data)
-                        
-                        return {
-                            'success': True,
-                            'products': products,
-                            'source': 'bing',
-                            'results_count': len(products)
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {'success': False, 'error': f'Bing API error: {response.status} - {error_text}'}
+            session = await get_http_session()
+            url = f"{config['base_url']}?{urlencode(params)}"
+            
+            async with session.get(url, headers=headers, timeout=request_timeout(self.request_timeout)) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    products = self._parse_bing_results(data)
+                    
+                    return {
+                        'success': True,
+                        'products': products,
+                        'source': 'bing',
+                        'results_count': len(products)
+                    }
+                else:
+                    error_text = await response.text()
+                    return {'success': False, 'error': f'Bing API error: {response.status} - {error_text}'}
         
         except Exception as e:
             logger.error(f"Bing search error: {str(e)}")
@@ -391,21 +392,21 @@ class WebSearchService:
             search_url = self._build_ecommerce_search_url(domain, site_config, query)
             
             # Scrape the search results
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
-            ) as session:
-                try:
-                    async with session.get(search_url, headers=self.headers) as response:
-                        if response.status == 200:
-                            html = await response.text()
-                            products = self._parse_ecommerce_results(html, site_config, domain)
-                        else:
-                            logger.warning(f"Failed to scrape {site_name}: {response.status}")
-                
-                except asyncio.TimeoutError:
-                    logger.warning(f"Timeout scraping {site_name}")
-                except Exception as scrape_error:
-                    logger.error(f"Error scraping {site_name}: {str(scrape_error)}")
+            session = await get_http_session()
+            try:
+                async with session.get(
+                    search_url, headers=self.headers, timeout=request_timeout(self.request_timeout)
+                ) as response:
+                    if response.status == 200:
+                        html = await response.text()
+                        products = self._parse_ecommerce_results(html, site_config, domain)
+                    else:
+                        logger.warning(f"Failed to scrape {site_name}: {response.status}")
+            
+            except asyncio.TimeoutError:
+                logger.warning(f"Timeout scraping {site_name}")
+            except Exception as scrape_error:
+                logger.error(f"Error scraping {site_name}: {str(scrape_error)}")
             
             return {
                 'success': len(products) > 0,
@@ -665,12 +666,10 @@ class WebSearchService:
             if not url:
                 return
             
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as session:
-                async with session.head(url, headers=self.headers) as response:
-                    product['link_verified'] = response.status == 200
-                    product['link_status'] = response.status
+            session = await get_http_session()
+            async with session.head(url, headers=self.headers, timeout=request_timeout(10)) as response:
+                product['link_verified'] = response.status == 200
+                product['link_status'] = response.status
         
         except Exception as e:
             product['link_verified'] = False
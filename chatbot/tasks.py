@@ -2,6 +2,7 @@
 import logging
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Any
+from asgiref.sync import async_to_sync
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
@@ -12,8 +13,10 @@ from .models import (
     ChatSession, ChatMessage, SearchQuery, UserFeedback, 
     ChatAnalytics, BotConfiguration
 )
-from .services.smart_router import SmartChatbotRouter
-from .utils.analytics import ChatAnalyticsManager
+from .services.registry import get_chatbot_router, get_local_search, get_web_search
+from .services.intent_engine import publish_intent_model, train_intent_model
+from .utils import ChatAnalyticsManager
+from main.search_rollups import trending_terms
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +32,7 @@ def process_async_chat_message(self, message_data: Dict):
     try:
         logger.info(f"Processing async chat message: {message_data.get('message_id')}")
         
-        # Initialize router
-        router = SmartChatbotRouter()
+        router = get_chatbot_router()
         
         # Extract data
         message_text = message_data.get('message')
@@ -468,6 +470,45 @@ def train_chatbot_model():
         }
 
 
+@shared_task
+def train_intent_classifier(days: int = 90):
+    """
+    Retrain the intent classifier and publish it so every process reloads it.
+
+    Recorded message intents are the classifier's own predictions: only
+    those confirmed by positive feedback count as real examples. Ungraded
+    ones are weighted at SELF_LABEL_WEIGHT, well below the seed examples.
+    """
+    try:
+        logger.info("Starting intent classifier training")
+        
+        model = train_intent_model(days=days)
+        version = publish_intent_model(model)
+        
+        BotConfiguration.set_config(
+            'intent_classifier_trained',
+            {'version': version, 'trained_at': timezone.now().isoformat(), **model.meta},
+            'Last intent classifier training run'
+        )
+        
+        logger.info(f"Intent classifier {version} published: {model.meta}")
+        
+        return {
+            'success': True,
+            'version': version,
+            'training_examples': model.meta.get('examples', 0),
+            'history_examples': model.meta.get('history_examples', 0),
+            'confirmed_examples': model.meta.get('confirmed_examples', 0)
+        }
+        
+    except Exception as e:
+        logger.error(f"Error training intent classifier: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
 @shared_task
 def update_search_suggestions():
     """
@@ -476,17 +517,17 @@ def update_search_suggestions():
     try:
         logger.info("Updating search suggestions")
         
-        # Get popular search terms from last 7 days
+        # Popular search terms from last 7 days, read from the term rollups
+        popular_terms = [
+            {
+                'query_text': row['search_term'],
+                'search_count': row['search_count'],
+                'avg_results': row['avg_results']
+            }
+            for row in trending_terms(sources=('chatbot',), days=7, limit=50, min_count=1)
+        ]
         seven_days_ago = timezone.now() - timedelta(days=7)
         
-        popular_terms = SearchQuery.objects.filter(
-            created_at__gte=seven_days_ago,
-            total_results_shown__gt=0  # Only successful searches
-        ).values('query_text').annotate(
-            search_count=Count('id'),
-            avg_results=Avg('total_results_shown')
-        ).order_by('-search_count')[:50]
-        
         # Get trending categories
         trending_categories = SearchQuery.objects.filter(
             created_at__gte=seven_days_ago,
@@ -498,7 +539,7 @@ def update_search_suggestions():
         # Update bot configuration
         BotConfiguration.set_config(
             'popular_search_terms',
-            list(popular_terms),
+            popular_terms,
             'Popular search terms from last 7 days'
         )
         
@@ -647,8 +688,8 @@ def monitor_system_health():
         
         # Check Gemini API
         try:
-            router = SmartChatbotRouter()
-            test_result = await router.gemini_client.test_connection()
+            router = get_chatbot_router()
+            test_result = async_to_sync(router.gemini_client.test_connection)()
             health_status['services']['gemini_api'] = 'ok' if test_result['success'] else 'error'
             if not test_result['success']:
                 health_status['alerts'].append("Gemini API not responding")
@@ -658,9 +699,8 @@ def monitor_system_health():
         
         # Check local search service
         try:
-            from .services.local_search import LocalSearchService
-            local_search = LocalSearchService()
-            test_search = await local_search.search_products("test", limit=1)
+            local_search = get_local_search()
+            test_search = async_to_sync(local_search.search)("test", search_type='product')
             health_status['services']['local_search'] = 'ok' if test_search['success'] else 'error'
         except Exception as e:
             health_status['services']['local_search'] = 'error'
@@ -668,8 +708,7 @@ def monitor_system_health():
         
         # Check web search service
         try:
-            from .services.web_search import WebSearchService
-            web_search = WebSearchService()
+            web_search = get_web_search()
             # Simple test - don't actually search to avoid API costs
             health_status['services']['web_search'] = 'ok'
         except Exception as e:
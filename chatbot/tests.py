@@ -1,3 +1,261 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from .models import ChatMessage, ChatSession
+from .services.gemini_batcher import BatchedResponse, GeminiMicroBatcher
+from .services.intent_engine import (
+    INTENT_OTHER, INTENT_PRODUCT, INTENT_SERVICE, SEED_EXAMPLES, IntentEngine, train_seed_model,
+)
+from .services.query_entities import ENTITY_PRICE, EntityLexicon, QueryEntityExtractor
+from .services.result_cache import SingleFlightResultCache
+from .services.smart_router import SmartChatbotRouter
+from .views import ChatAPIView
+
+
+class IntentEngineTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.engine = IntentEngine(train_seed_model(), version='seed')
+
+    def assertIntent(self, message, intent):
+        self.assertEqual(self.engine.classify(message)['intent'], intent, message)
+
+    def test_seed_examples(self):
+        for message, intent in SEED_EXAMPLES:
+            self.assertIntent(message, intent)
+
+    def test_off_topic_messages_skip_search(self):
+        for message in ('ok', 'hi', 'thanks', 'how do i reset my password', 'who won the match yesterday',
+                        'who is messi', 'hmm'):
+            self.assertIntent(message, INTENT_OTHER)
+
+    def test_lexicon_words_search(self):
+        self.assertIntent('hp laptop', INTENT_PRODUCT)
+        self.assertIntent('hello i need a laptop', INTENT_PRODUCT)
+        self.assertIntent('where can i get a good mechanic', INTENT_SERVICE)
+        self.assertIntent('catering for 100 guests', INTENT_SERVICE)
+
+
+class ChatIntentRecordingTests(TestCase):
+    """Search replies carry their intent so the user message is labelled for retraining"""
+
+    def setUp(self):
+        classifier = mock.Mock()
+        classifier.classify.return_value = {
+            'intent': INTENT_PRODUCT, 'confidence': 0.9, 'product_score': 0.9, 'service_score': 0.05,
+        }
+        services = {
+            name: mock.patch(f'chatbot.services.smart_router.{name}', return_value=mock.Mock())
+            for name in ('get_gemini_client', 'get_local_search', 'get_serpapi_service')
+        }
+        services['get_intent_classifier'] = mock.patch(
+            'chatbot.services.smart_router.get_intent_classifier', return_value=classifier
+        )
+        for patcher in services.values():
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.router = SmartChatbotRouter()
+        self.router.external_search_enabled = False
+        local_results = {'success': True, 'products': [{'product_name': 'Samsung Galaxy phone'}],
+                         'services': [], 'total_results': 1}
+        for name, value in (('_generate_and_emit_intro', 'Here is what I found'),
+                            ('_predict_thin_local', False),
+                            ('_search_local_database', local_results),
+                            ('_remember_local_total', None)):
+            patcher = mock.patch.object(self.router, name, mock.AsyncMock(return_value=value))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_product_query_labels_the_user_message(self):
+        result = asyncio.run(self.router.process_message('samsung phone'))
+        self.assertEqual(result['intent']['type'], INTENT_PRODUCT)
+
+        session = ChatSession.objects.create(session_id='intent-test')
+        user_message = ChatMessage.objects.create(chat_session=session, sender_type='user', content='samsung phone')
+        with mock.patch('chatbot.views.get_chatbot_router', return_value=self.router):
+            view = ChatAPIView()
+        bot_message = async_to_sync(view._save_bot_response)(session, result, user_message)
+
+        user_message.refresh_from_db()
+        self.assertEqual(user_message.intent_detected, INTENT_PRODUCT)
+        self.assertEqual(bot_message.confidence_score, 0.9)
+        self.assertEqual(bot_message.context_data['intent']['type'], INTENT_PRODUCT)
+
+
+class AsyncViewTokenAuthenticationTests(TestCase):
+    """The async chat views still accept DRF token authentication"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='shopper@example.com', first_name='Ada', last_name='Obi',
+            phone='+2348012345678', password='secret123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.router = mock.Mock()
+        self.router.process_message = mock.AsyncMock(return_value={'success': True, 'response': 'ok'})
+        patcher = mock.patch('chatbot.views.get_chatbot_router', return_value=self.router)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def quick_search(self, **headers):
+        return self.client.post(
+            reverse('chatbot:quick_search'), {'message': 'samsung phone'},
+            content_type='application/json', **headers
+        )
+
+    def test_token_user_reaches_the_router(self):
+        response = self.quick_search(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+        context = self.router.process_message.call_args.args[1]
+        self.assertEqual(context['user_id'], self.user.id)
+
+    def test_anonymous_request_has_no_user(self):
+        response = self.quick_search()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.router.process_message.call_args.args[1]['user_id'])
+
+    def test_invalid_token_is_rejected(self):
+        response = self.quick_search(HTTP_AUTHORIZATION='Token not-a-real-key')
+        self.assertEqual(response.status_code, 401)
+        self.router.process_message.assert_not_called()
+
+
+class QueryEntityPriceTests(SimpleTestCase):
+    def setUp(self):
+        lexicon = EntityLexicon({'built_at': 1, 'brands': {'samsung': ['Samsung']}, 'models': {}})
+        patcher = mock.patch.object(QueryEntityExtractor, 'lexicon', return_value=lexicon)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.extractor = QueryEntityExtractor()
+
+    def assertNoPrice(self, query):
+        extracted = self.extractor.extract(query)
+        self.assertNotIn(ENTITY_PRICE, extracted.kinds)
+        self.assertEqual(extracted.text(), query)
+
+    def test_bare_multiplier_amounts_stay_text(self):
+        self.assertNoPrice('4k tv')
+        self.assertNoPrice('8k smart tv')
+        self.assertNoPrice('hdmi cable 2m')
+        self.assertNoPrice('100k 200k phone')
+
+    def test_model_years_are_not_prices(self):
+        self.assertNoPrice('laptop from 2021')
+        self.assertNoPrice('car between 2015 and 2020')
+
+    def test_price_after_cue(self):
+        extracted = self.extractor.extract('samsung tv under 200k')
+        self.assertEqual(extracted.filters(), {'max_price': 200000, 'brands': ['Samsung']})
+        self.assertEqual(extracted.text(), 'tv')
+
+    def test_price_next_to_currency(self):
+        self.assertEqual(self.extractor.extract('phone ₦150,000').filters(), {'max_price': 150000})
+        self.assertEqual(self.extractor.extract('laptop 50000 naira').filters(), {'max_price': 50000})
+
+    def test_price_ranges(self):
+        expected = {'min_price': 100000, 'max_price': 200000}
+        self.assertEqual(self.extractor.extract('iphone between 100k and 200k').filters(), expected)
+        self.assertEqual(self.extractor.extract('iphone between 100 and 200k').filters(), expected)
+        self.assertEqual(self.extractor.extract('iphone from 100k to 200k').filters(), expected)
+
+    def test_relaxed_price_keeps_the_amount_as_text(self):
+        extracted = self.extractor.extract('4k tv under 300k')
+        self.assertEqual(extracted.text(), '4k tv')
+        self.assertEqual(extracted.text(set()), '4k tv 300k')
+
+
+class GeminiMicroBatcherTests(SimpleTestCase):
+    def test_failed_batch_call_is_not_retried_per_prompt(self):
+        calls = []
+
+        async def generate(prompt, generation_config=None):
+            calls.append(prompt)
+            raise RuntimeError('429 Resource exhausted')
+
+        async def run():
+            batcher = GeminiMicroBatcher(generate, {}, overrides={'ENABLED': True, 'WINDOW_MS': 5})
+            return await asyncio.gather(
+                *(batcher.submit(f'prompt {i}', batch_key='session-1') for i in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_prompts_from_different_sessions_never_share_a_request(self):
+        calls = []
+
+        async def generate(prompt, generation_config=None):
+            calls.append(prompt)
+            return BatchedResponse('["first", "second"]' if generation_config else f'answer to {prompt}')
+
+        async def run():
+            batcher = GeminiMicroBatcher(generate, {}, overrides={'ENABLED': True, 'WINDOW_MS': 5})
+            return await asyncio.gather(
+                batcher.submit('alice 1', batch_key='alice'),
+                batcher.submit('bob 1', batch_key='bob'),
+                batcher.submit('anonymous 1'),
+                batcher.submit('alice 2', batch_key='alice'),
+            )
+
+        results = [response.text for response in asyncio.run(run())]
+        self.assertEqual(results, ['first', 'answer to bob 1', 'answer to anonymous 1', 'second'])
+        self.assertEqual(len(calls), 3)
+        batched = [prompt for prompt in calls if 'REQUEST 1' in prompt]
+        self.assertEqual(len(batched), 1)
+        self.assertIn('alice 2', batched[0])
+        self.assertNotIn('bob', batched[0])
+
+
+class SingleFlightResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.result_cache = SingleFlightResultCache()
+        for name in ('get', 'set'):
+            patcher = mock.patch.object(self.result_cache, name, mock.AsyncMock(return_value=None))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_callers(self, cancel_count):
+        """Start two callers on one computation, cancel some, and report how the computation ended"""
+        state = {'started': asyncio.Event(), 'finished': False, 'cancelled': False}
+
+        async def compute():
+            state['started'].set()
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                state['cancelled'] = True
+                raise
+            state['finished'] = True
+            return {'total_found': 1}
+
+        async def run():
+            callers = [
+                asyncio.create_task(self.result_cache.get_or_compute('external', 'key', compute))
+                for _ in range(2)
+            ]
+            await state['started'].wait()
+            for caller in callers[:cancel_count]:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        return state
+
+    def test_computation_survives_while_a_caller_waits(self):
+        state = self.run_callers(cancel_count=1)
+        self.assertTrue(state['finished'])
+
+    def test_computation_is_cancelled_with_its_last_caller(self):
+        state = self.run_callers(cancel_count=2)
+        self.assertTrue(state['cancelled'])
+        self.assertFalse(state['finished'])
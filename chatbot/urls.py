@@ -14,6 +14,7 @@ urlpatterns = [
         # Main chat API - supports both class-based and function-based views
         path('chat/', views.ChatAPIView.as_view(), name='chat_api'),
         path('chat/func/', views.chat_api, name='chat_api_func'),  # Function wrapper
+        path('chat/stream/', views.ChatStreamAPIView.as_view(), name='chat_stream_api'),  # Server-Sent Events
         
         # Quick search for instant results
         path('search/', views.quick_search, name='quick_search'),
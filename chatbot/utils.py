@@ -20,6 +20,8 @@ from .models import (
     ChatSession, ChatMessage, SearchQuery, SearchResult,
     UserFeedback, ChatAnalytics, BotConfiguration
 )
+from .services.intent_engine import PhraseMatcher, tokenize
+from main.proximity import haversine_km
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -353,42 +355,13 @@ class MessageProcessor:
     def extract_intent(self, message: str) -> Dict[str, Any]:
         """Extract intent and entities from message"""
         
-        # Convert message to lowercase for analysis
-        message_lower = message.lower()
-        
-        # Define intent patterns - EXPANDED FOR BETTER DETECTION
-        intent_patterns = {
-            'product_search': [
-                'buy', 'purchase', 'shop', 'store', 'product', 'item', 'sell', 
-                'price', 'cost', 'cheap', 'expensive', 'discount', 'deal', 
-                'samsung', 'iphone', 'laptop', 'phone', 'computer', 'tv',
-                'jumia', 'konga', 'amazon', 'ebay', 'online', 'order',
-                'looking for', 'need', 'want', 'find', 'search for',
-                'where to buy', 'how much', 'under', 'below', 'above'
-            ],
-            'service_request': [
-                'service', 'repair', 'fix', 'install', 'maintenance', 
-                'provider', 'contractor', 'professional', 'expert',
-                'plumber', 'electrician', 'mechanic', 'cleaner',
-                'delivery', 'transport', 'taxi', 'ride'
-            ],
-            'price_inquiry': [
-                'price', 'cost', 'how much', 'rate', 'fee', 'charge',
-                'expensive', 'cheap', 'affordable', 'budget',
-                '$', '₦', 'naira', 'dollar', 'under', 'below', 'above'
-            ],
-            'comparison': [
-                'compare', 'vs', 'versus', 'difference', 'better', 'best',
-                'which', 'between', 'or', 'alternative', 'similar'
-            ],
-            'greeting': ['hi', 'hello', 'hey', 'good morning', 'good afternoon'],
-            'goodbye': ['bye', 'goodbye', 'see you', 'thanks', 'thank you']
-        }
+        # One pass of the compiled matcher finds every keyword on word boundaries
+        hits = set(get_message_matcher().find(tokenize(message)))
         
         # Analyze intent
         intent_scores = {}
-        for intent, keywords in intent_patterns.items():
-            score = sum(1 for keyword in keywords if keyword in message_lower)
+        for intent, keywords in MESSAGE_INTENT_PATTERNS.items():
+            score = sum(1 for phrase, label in hits if label == f'intent:{intent}')
             if score > 0:
                 intent_scores[intent] = score / len(keywords)  # Normalize by keyword count
         
@@ -400,36 +373,79 @@ class MessageProcessor:
             primary_intent = 'general_query'
             confidence = 0.3
         
-        # Extract entities (products, brands, etc.)
-        entities = []
-        
-        # Brand detection
-        brands = ['samsung', 'apple', 'iphone', 'nokia', 'hp', 'dell', 'lenovo', 'asus']
-        entities.extend([brand for brand in brands if brand in message_lower])
-        
-        # Product categories
-        categories = ['phone', 'laptop', 'computer', 'tv', 'tablet', 'watch', 'headphones']
-        entities.extend([cat for cat in categories if cat in message_lower])
-        
-        # Shopping platforms
-        platforms = ['jumia', 'konga', 'amazon', 'ebay', 'aliexpress']
-        entities.extend([platform for platform in platforms if platform in message_lower])
-        
-        # Price indicators
-        price_keywords = ['cheap', 'expensive', 'under', 'below', 'above', 'budget']
-        entities.extend([keyword for keyword in price_keywords if keyword in message_lower])
+        # Extract entities (brands, product categories, shopping platforms, price indicators)
+        entities = {phrase for phrase, label in hits if label.startswith('entity:')}
+        labels = {label for _, label in hits}
         
         return {
             'original_message': message,  # IMPORTANT: Include original message
             'primary_intent': primary_intent,
             'confidence': confidence,
             'intent_scores': intent_scores,
-            'entities': list(set(entities)),  # Remove duplicates
+            'entities': list(entities),
             'message_length': len(message),
-            'has_price_mention': any(char in message for char in ['$', '₦']) or any(word in message_lower for word in ['price', 'cost', 'naira', 'dollar']),
-            'has_brand_mention': any(brand in message_lower for brand in brands),
-            'has_platform_mention': any(platform in message_lower for platform in platforms)
+            'has_price_mention': any(char in message for char in ['$', '₦']) or 'price_mention' in labels,
+            'has_brand_mention': 'entity:brand' in labels,
+            'has_platform_mention': 'entity:platform' in labels
         }
+
+
+# Keyword sets for MessageProcessor.extract_intent
+MESSAGE_INTENT_PATTERNS = {
+    'product_search': [
+        'buy', 'purchase', 'shop', 'store', 'product', 'item', 'sell', 
+        'price', 'cost', 'cheap', 'expensive', 'discount', 'deal', 
+        'samsung', 'iphone', 'laptop', 'phone', 'computer', 'tv',
+        'jumia', 'konga', 'amazon', 'ebay', 'online', 'order',
+        'looking for', 'need', 'want', 'find', 'search for',
+        'where to buy', 'how much', 'under', 'below', 'above'
+    ],
+    'service_request': [
+        'service', 'repair', 'fix', 'install', 'maintenance', 
+        'provider', 'contractor', 'professional', 'expert',
+        'plumber', 'electrician', 'mechanic', 'cleaner',
+        'delivery', 'transport', 'taxi', 'ride'
+    ],
+    'price_inquiry': [
+        'price', 'cost', 'how much', 'rate', 'fee', 'charge',
+        'expensive', 'cheap', 'affordable', 'budget',
+        '$', '₦', 'naira', 'dollar', 'under', 'below', 'above'
+    ],
+    'comparison': [
+        'compare', 'vs', 'versus', 'difference', 'better', 'best',
+        'which', 'between', 'or', 'alternative', 'similar'
+    ],
+    'greeting': ['hi', 'hello', 'hey', 'good morning', 'good afternoon'],
+    'goodbye': ['bye', 'goodbye', 'see you', 'thanks', 'thank you']
+}
+
+MESSAGE_ENTITIES = {
+    'brand': ['samsung', 'apple', 'iphone', 'nokia', 'hp', 'dell', 'lenovo', 'asus'],
+    'category': ['phone', 'laptop', 'computer', 'tv', 'tablet', 'watch', 'headphones'],
+    'platform': ['jumia', 'konga', 'amazon', 'ebay', 'aliexpress'],
+    'price': ['cheap', 'expensive', 'under', 'below', 'above', 'budget'],
+}
+
+_message_matcher = None
+
+
+def get_message_matcher() -> PhraseMatcher:
+    """Compiled once per process"""
+    global _message_matcher
+    if _message_matcher is None:
+        pairs = [
+            (keyword, f'intent:{intent}')
+            for intent, keywords in MESSAGE_INTENT_PATTERNS.items() for keyword in keywords
+        ]
+        pairs += [
+            (keyword, f'entity:{kind}')
+            for kind, keywords in MESSAGE_ENTITIES.items() for keyword in keywords
+        ]
+        pairs += [(keyword, 'price_mention') for keyword in ['price', 'cost', 'naira', 'dollar']]
+        _message_matcher = PhraseMatcher(pairs)
+    return _message_matcher
+
+
 class SearchHelper:
     """Helper functions for search operations"""
     
@@ -978,20 +994,8 @@ def format_datetime_for_user(dt: datetime, timezone_str: str = None) -> str:
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two coordinates in kilometers"""
-    from math import radians, cos, sin, asin, sqrt
-    
-    # Haversine formula
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    
-    # Radius of earth in kilometers
-    r = 6371
-    
-    return c * r
+    # Haversine formula, shared with the nearby-search index
+    return haversine_km(lat1, lon1, lat2, lon2)
 
 
 class ErrorHandler:
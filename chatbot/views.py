@@ -5,7 +5,7 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
@@ -17,6 +17,8 @@ from django.conf import settings
 from django.db import transaction
 
 from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -33,12 +35,34 @@ from .serializers import (
     FeedbackRequestSerializer, ChatAnalyticsSerializer,
     BotConfigurationSerializer
 )
-from .services.smart_router import SmartChatbotRouter
+from .services.registry import get_chatbot_router
+from .services.prompt_cache import prompt_cache
+from .services.rate_limiter import gemini_rate_limiter
 from .utils import ChatSessionManager, ChatAnalyticsManager
 from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
+_token_authentication = TokenAuthentication()
+
+
+async def _authenticate(request):
+    """
+    Set request.user the way DRF did before these views went async: an
+    'Authorization: Token <key>' header first, then the session.
+    Raises AuthenticationFailed for an invalid token.
+    """
+    authenticated = await sync_to_async(_token_authentication.authenticate)(request)
+    request.user = authenticated[0] if authenticated else await request.auser()
+    return request.user
+
+
+def _authentication_failed(error):
+    return JsonResponse({
+        'success': False,
+        'error': str(error.detail)
+    }, status=status.HTTP_401_UNAUTHORIZED)
+
 
 class ChatInterfaceView(TemplateView):
     """Main chat interface view"""
@@ -73,15 +97,15 @@ class ChatInterfaceView(TemplateView):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ChatAPIView(View):
-    """Main chatbot API endpoint with async support"""
+    """Main chatbot API endpoint (async view; serve through master.asgi)"""
     
     def __init__(self):
         super().__init__()
-        self.router = SmartChatbotRouter()
+        self.router = get_chatbot_router()
         self.session_manager = ChatSessionManager()
         self.analytics = ChatAnalyticsManager()
     
-    def get(self, request):
+    async def get(self, request):
         """Handle GET requests - return API info"""
         return JsonResponse({
             'success': True,
@@ -94,19 +118,27 @@ class ChatAPIView(View):
             'version': '1.0.0'
         })
     
-    def post(self, request):
-        """Handle POST requests synchronously but run async operations"""
+    def _parse_chat_request(self, request):
+        """Return (data, message_text, message_type, session_id, file_data) from the request body"""
+        if request.content_type == 'application/json':
+            data = json.loads(request.body.decode('utf-8'))
+        else:
+            data = request.POST.dict()
+        
+        message_type = data.get('message_type', 'text')
+        file_data = request.FILES.get('file') if message_type in ['image', 'voice'] else None
+        return data, data.get('message', '').strip(), message_type, data.get('session_id'), file_data
+    
+    async def post(self, request):
+        """
+        Handle chat messages natively async: under ASGI the LLM/SerpAPI waits
+        yield to the server's event loop instead of holding a worker thread.
+        """
         try:
-            # Parse request data
-            if request.content_type == 'application/json':
-                data = json.loads(request.body.decode('utf-8'))
-            else:
-                data = request.POST.dict()
+            await _authenticate(request)
             
-            message_text = data.get('message', '').strip()
-            message_type = data.get('message_type', 'text')
-            session_id = data.get('session_id')
-            file_data = request.FILES.get('file') if message_type in ['image', 'voice'] else None
+            # Parse request data
+            data, message_text, message_type, session_id, file_data = self._parse_chat_request(request)
             
             # Validate input
             if not message_text and not file_data:
@@ -119,16 +151,18 @@ class ChatAPIView(View):
             # Log the incoming request
             logger.info(f"Processing chat request: '{message_text}' (type: {message_type})")
             
-            # Run the async processing
-            result = asyncio.run(self._process_chat_async(
+            result = await self._process_chat_async(
                 request, message_text, message_type, session_id, file_data, data
-            ))
+            )
             
             # Log the result
             logger.info(f"Chat processing complete. Response length: {len(result.get('response', ''))}")
             
             return JsonResponse(result)
             
+        except AuthenticationFailed as e:
+            return _authentication_failed(e)
+        
         except json.JSONDecodeError:
             return JsonResponse({
                 'success': False,
@@ -145,8 +179,8 @@ class ChatAPIView(View):
                 'timestamp': datetime.now().isoformat()
             }, status=500)
     
-    async def _process_chat_async(self, request, message_text, message_type, session_id, file_data, data):
-        """Process chat message asynchronously"""
+    async def _process_chat_async(self, request, message_text, message_type, session_id, file_data, data, on_event=None):
+        """Process chat message asynchronously (on_event receives the router's partial results)"""
         try:
             # Get or create chat session
             chat_session = await self._get_or_create_session(request, session_id)
@@ -161,7 +195,7 @@ class ChatAPIView(View):
             
             # Process with router
             processing_result = await self.router.process_message(
-                message_text, context
+                message_text, context, on_event=on_event
             )
             
             # DEBUG: Log the processing result structure
@@ -298,6 +332,12 @@ class ChatAPIView(View):
         if processing_result.get('search_results') or processing_result.get('local_results') or processing_result.get('external_results'):
             self._save_search_data_sync(processing_result, user_message)
         
+        # Recorded intents are the training data for the intent classifier
+        intent_type = (processing_result.get('intent') or {}).get('type')
+        if intent_type:
+            user_message.intent_detected = intent_type
+            user_message.save(update_fields=['intent_detected'])
+        
         # Extract search results for counting
         search_results = processing_result.get('search_results') or {}
         local_results = search_results.get('local', processing_result.get('local_results', {}))
@@ -556,28 +596,130 @@ class ChatAPIView(View):
             'currency': 'NGN'
         }
 
+class ChatStreamAPIView(ChatAPIView):
+    """
+    Server-Sent Events variant of ChatAPIView for clients without WebSockets.
+    
+    Streams the same stages as the chat consumer (intro_chunk, intro,
+    local_results, external_results), then the full ChatAPIView payload as
+    'final', its 'suggested_actions', and 'done'. Frames are delivered as
+    they happen when served over ASGI.
+    """
+    
+    async def get(self, request):
+        return JsonResponse({
+            'success': True,
+            'message': 'AI Chatbot streaming API is running',
+            'endpoints': {
+                'chat_stream': 'POST /chatbot/api/chat/stream/ - Send a chat message, receive text/event-stream',
+                'methods': ['POST'],
+                'supported_types': ['text']
+            },
+            'version': '1.0.0'
+        })
+    
+    async def post(self, request):
+        try:
+            await _authenticate(request)
+            data, message_text, message_type, session_id, file_data = self._parse_chat_request(request)
+        except AuthenticationFailed as e:
+            return _authentication_failed(e)
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON data',
+                'response': 'Invalid request format.'
+            }, status=400)
+        
+        if not message_text:
+            return JsonResponse({
+                'success': False,
+                'error': 'Message text is required',
+                'response': 'Please provide a message.'
+            }, status=400)
+        
+        logger.info(f"Streaming chat request: '{message_text}'")
+        
+        response = StreamingHttpResponse(
+            self._event_stream(request, message_text, message_type, session_id, data),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+    
+    @staticmethod
+    def _sse(event_type, payload):
+        return f"event: {event_type}\ndata: {json.dumps(payload, default=str)}\n\n"
+    
+    async def _event_stream(self, request, message_text, message_type, session_id, data):
+        queue = asyncio.Queue()
+        
+        async def on_event(event_type, payload):
+            await queue.put((event_type, payload))
+        
+        task = asyncio.create_task(self._process_chat_async(
+            request, message_text, message_type, session_id, None, data, on_event=on_event
+        ))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield self._sse(*item)
+            
+            result = task.result()
+            yield self._sse('final', result)
+            if result.get('suggested_actions'):
+                yield self._sse('suggested_actions', {'actions': result['suggested_actions']})
+            yield self._sse('done', {'success': result.get('success', True)})
+        
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}")
+            yield self._sse('error', {
+                'success': False,
+                'error': 'An error occurred while processing your message',
+                'timestamp': datetime.now().isoformat()
+            })
+        finally:
+            # Client went away: stop the pipeline
+            if not task.done():
+                task.cancel()
+
+
 # Function-based wrapper for backwards compatibility
 @csrf_exempt
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def chat_api(request):
+@require_http_methods(['POST'])
+async def chat_api(request):
     """
     Function-based view wrapper for the chatbot API
     """
     view = ChatAPIView()
-    return view.post(request)
-    return view.post(request)
+    return await view.post(request)
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def quick_search(request):
-    """Quick search API endpoint"""
+def _parse_request_data(request):
+    """Body of a plain Django request as a dict (JSON or form data)"""
+    if request.content_type == 'application/json':
+        return json.loads(request.body.decode('utf-8') or '{}')
+    return {**request.POST.dict(), **request.FILES.dict()}
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def quick_search(request):
+    """Quick search API endpoint (async view)"""
+    request_data = {}
     try:
+        user = await _authenticate(request)
+        request_data = _parse_request_data(request)
+        
         # Validate request
-        serializer = ChatMessageRequestSerializer(data=request.data)
+        serializer = ChatMessageRequestSerializer(data=request_data)
         if not serializer.is_valid():
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'Invalid request data',
                 'details': serializer.errors
@@ -587,33 +729,32 @@ def quick_search(request):
         query = data.get('message', '').strip()
         
         if not query:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'Search query is required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Use the smart router for quick search
-        router = SmartChatbotRouter()
+        router = get_chatbot_router()
         
         # Build minimal context
         context = {
-            'user_id': request.user.id if request.user.is_authenticated else None,
-            'session_id': data.get('session_id'),
+            'user_id': user.id if user.is_authenticated else None,
+            'session_id': str(data['session_id']) if data.get('session_id') else None,
             'language': data.get('language', 'en'),
             'location_context': data.get('user_location', {}),
             'request_ip': request.META.get('REMOTE_ADDR', ''),
             'user_agent': request.META.get('HTTP_USER_AGENT', ''),
         }
         
-        # Run async operation
-        result = asyncio.run(router.process_message(query, context))
+        result = await router.process_message(query, context)
         
         # Extract search results correctly
-        search_results = result.get('search_results', {})
+        search_results = result.get('search_results') or {}
         local_results = search_results.get('local', result.get('local_results', {}))
         external_results = search_results.get('external', result.get('external_results', {}))
         
-        return Response({
+        return JsonResponse({
             'success': result.get('success', True),
             'query': query,
             'response': result.get('response', result.get('final_response', '')),
@@ -624,12 +765,15 @@ def quick_search(request):
             'processing_time': result.get('processing_time', 0)
         })
         
+    except AuthenticationFailed as e:
+        return _authentication_failed(e)
+    
     except Exception as e:
         logger.error(f"Error in quick search: {str(e)}")
-        return Response({
+        return JsonResponse({
             'success': False,
             'error': str(e),
-            'query': request.data.get('message', ''),
+            'query': request_data.get('message', ''),
             'processing_time': 0
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 @api_view(['GET'])
@@ -656,7 +800,9 @@ def health_check(request):
                 'cache': 'ok' if cache_status else 'error',
                 'local_search': 'ok',
                 'web_search': 'ok'
-            }
+            },
+            'gemini_rate_limit': gemini_rate_limiter.stats(),
+            'gemini_prompt_cache': prompt_cache.stats(),
         }
         
         return Response(health_data)
@@ -829,28 +975,30 @@ def chatbot_status_view(request):
 
 # Additional API Views
 
-class ImageUploadView(APIView):
+@method_decorator(csrf_exempt, name='dispatch')
+class ImageUploadView(View):
     """Handle image upload for analysis"""
-    permission_classes = [AllowAny]
     
-    def post(self, request):
+    async def post(self, request):
         """Handle image upload"""
         try:
+            await _authenticate(request)
+            
             if 'image' not in request.FILES:
-                return Response({
+                return JsonResponse({
                     'success': False,
                     'error': 'No image file provided'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             image_file = request.FILES['image']
-            message = request.data.get('message', '')
+            message = request.POST.get('message', '')
             
             # Validate image
             from .serializers import validate_image_file
             try:
                 validate_image_file(image_file)
             except Exception as e:
-                return Response({
+                return JsonResponse({
                     'success': False,
                     'error': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
@@ -859,46 +1007,51 @@ class ImageUploadView(APIView):
             from .services.multimodal import MultimodalProcessor
             multimodal = MultimodalProcessor()
             
-            result = asyncio.run(multimodal.process_image(
+            result = await multimodal.process_image(
                 image_file, message, 'product_search'
-            ))
+            )
             
-            return Response({
+            return JsonResponse({
                 'success': result['success'],
                 'image_analysis': result,
                 'message': 'Image processed successfully' if result['success'] else 'Failed to process image'
             })
             
+        except AuthenticationFailed as e:
+            return _authentication_failed(e)
+        
         except Exception as e:
             logger.error(f"Error in image upload: {str(e)}")
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'Failed to process image'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class VoiceUploadView(APIView):
+@method_decorator(csrf_exempt, name='dispatch')
+class VoiceUploadView(View):
     """Handle voice note upload for transcription"""
-    permission_classes = [AllowAny]
     
-    def post(self, request):
+    async def post(self, request):
         """Handle voice upload"""
         try:
+            await _authenticate(request)
+            
             if 'voice' not in request.FILES:
-                return Response({
+                return JsonResponse({
                     'success': False,
                     'error': 'No voice file provided'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             voice_file = request.FILES['voice']
-            language = request.data.get('language', 'en')
+            language = request.POST.get('language', 'en')
             
             # Validate audio
             from .serializers import validate_audio_file
             try:
                 validate_audio_file(voice_file)
             except Exception as e:
-                return Response({
+                return JsonResponse({
                     'success': False,
                     'error': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
@@ -907,18 +1060,21 @@ class VoiceUploadView(APIView):
             from .services.multimodal import MultimodalProcessor
             multimodal = MultimodalProcessor()
             
-            result = asyncio.run(multimodal.process_voice_note(voice_file, language))
+            result = await multimodal.process_voice_note(voice_file, language)
             
-            return Response({
+            return JsonResponse({
                 'success': result['success'],
                 'transcription': result.get('transcription', {}),
                 'audio_info': result.get('audio_info', {}),
                 'message': 'Voice processed successfully' if result['success'] else 'Failed to process voice'
             })
             
+        except AuthenticationFailed as e:
+            return _authentication_failed(e)
+        
         except Exception as e:
             logger.error(f"Error in voice upload: {str(e)}")
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'Failed to process voice'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -937,44 +1093,21 @@ class SearchSuggestionsView(APIView):
             suggestions = []
             
             if len(query) >= 2:
-                # Get suggestions from local search service
-                from .services.local_search import LocalSearchService
-                local_search = LocalSearchService()
-                
-                # Get popular searches
-                try:
-                    popular_searches = local_search.get_popular_searches(limit)
-                    
-                    # Filter suggestions that match the query
-                    for search in popular_searches:
-                        if query.lower() in search['term'].lower():
-                            suggestions.append({
-                                'text': search['term'],
-                                'type': 'popular',
-                                'count': search['count']
-                            })
-                except Exception as e:
-                    logger.warning(f"Could not get popular searches: {str(e)}")
+                # Served from the in-memory prefix index; no database access per keystroke
+                from main.autocomplete import autocomplete_index
                 
-                # Get category suggestions (if available)
-                try:
-                    from main.models import Category  # Adjust import path as needed
-                    categories = Category.objects.filter(
-                        name__icontains=query,
-                        is_active=True
-                    )[:5]
-                    
-                    for category in categories:
-                        suggestions.append({
-                            'text': category.name,
-                            'type': 'category',
-                            'description': f"Browse {category.name} category"
-                        })
-                except ImportError:
-                    # Category model not available
-                    pass
-                except Exception as e:
-                    logger.warning(f"Could not get categories: {str(e)}")
+                for entry in autocomplete_index.search(query, limit=limit):
+                    suggestion = {
+                        'text': entry['text'],
+                        'type': entry['type'],
+                        'count': entry['count']
+                    }
+                    if entry['type'] == 'category':
+                        suggestion['id'] = entry['id']
+                        suggestion['description'] = f"Browse {entry['text']} category"
+                    elif entry['type'] == 'city':
+                        suggestion['id'] = entry['id']
+                    suggestions.append(suggestion)
             
             return Response({
                 'success': True,
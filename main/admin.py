@@ -1,6 +1,6 @@
 # admin.py - Complete Admin Configuration
 from django.contrib import admin
-from django.db.models import Count, Avg
+from django.db.models import Count
 from django.utils.html import format_html
 from .models import (
     Country, State, City, Category, Products, Services,
@@ -327,8 +327,6 @@ class ProductsAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
             'user', 'category', 'country', 'state', 'city'
-        ).annotate(
-            avg_rating=Avg('product_ratings__rating')
         )
     
     def price_display(self, obj):
@@ -342,11 +340,12 @@ class ProductsAdmin(admin.ModelAdmin):
     
     def rating_display(self, obj):
         rating = obj.average_rating()
-        count = obj.rating_count()
+        count = obj.rating_count
         if rating > 0:
             return f"⭐ {rating} ({count} reviews)"
         return "No ratings"
     rating_display.short_description = 'Rating'
+    rating_display.admin_order_field = 'rating_avg'
 
 
 # ================================
@@ -428,8 +427,6 @@ class ServicesAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
             'user', 'category', 'country', 'state', 'city'
-        ).annotate(
-            avg_rating=Avg('service_ratings__rating')
         )
     
     def price_range_display(self, obj):
@@ -445,11 +442,12 @@ class ServicesAdmin(admin.ModelAdmin):
     
     def rating_display(self, obj):
         rating = obj.average_rating()
-        count = obj.rating_count()
+        count = obj.rating_count
         if rating > 0:
             return f"⭐ {rating} ({count} reviews)"
         return "No ratings"
     rating_display.short_description = 'Rating'
+    rating_display.admin_order_field = 'rating_avg'
 
 
 # ================================
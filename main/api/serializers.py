@@ -2,6 +2,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from decimal import Decimal
 
 from ..models import (
@@ -10,6 +11,9 @@ from ..models import (
     ProductRating, ServiceRating,
     UserFavorite, SearchHistory
 )
+from ..category_tree import category_tree
+from ..counters import category_listing_counts
+from ..buffered_counters import merge_pending_counts
 
 User = get_user_model()
 
@@ -107,8 +111,8 @@ class CategorySerializer(serializers.ModelSerializer):
         return obj.image.url if obj.image else None
 
     def get_subcategories(self, obj):
-        children = obj.get_children()
-        if children.exists():
+        children = category_tree.snapshot().get_children(obj.id)
+        if children:
             return CategorySerializer(children, many=True, context=self.context).data
         return []
     
@@ -116,36 +120,25 @@ class CategorySerializer(serializers.ModelSerializer):
         return obj.get_full_path()
 
     def get_products_count(self, obj):
-        try:
-            from ..models import Products  # Correct import path
-            
-            # Get all categories (current + all subcategories)
-            all_categories = [obj] + list(obj.get_all_subcategories())
-            
-            # Count products - no product_type filter needed
-            return Products.objects.filter(
-                category__in=all_categories,
-                product_status='published'
-            ).count()
-        except Exception as e:
-            print(f"Error counting products for category {obj.id}: {e}")
-            return 0
+        counts = self._get_listing_counts('product')
+        return category_tree.snapshot().subtree_total(obj.id, counts)
 
     def get_services_count(self, obj):
-        try:
-            from ..models import Services  # Import Services model
-            
-            # Get all categories (current + all subcategories)
-            all_categories = [obj] + list(obj.get_all_subcategories())
-            
-            # Count services using Services model
-            return Services.objects.filter(
-                category__in=all_categories,
-                service_status='published'  # Use service_status
-            ).count()
-        except Exception as e:
-            print(f"Error counting services for category {obj.id}: {e}")
-            return 0 
+        counts = self._get_listing_counts('service')
+        return category_tree.snapshot().subtree_total(obj.id, counts)
+
+    def _get_listing_counts(self, kind):
+        """
+        Published listings per category from the counter table, loaded once per
+        serializer context. An optional `location_filter` in the context
+        (country_id/state_id/city_id) narrows the counts.
+        """
+        cache_key = f'_category_{kind}_counts'
+        if cache_key not in self.context:
+            self.context[cache_key] = category_listing_counts(
+                kind, **self.context.get('location_filter', {})
+            )
+        return self.context[cache_key]
 
 # ===========================
 #  RATING SERIALIZERS
@@ -284,10 +277,85 @@ class ServiceRatingSerializer(serializers.ModelSerializer):
             )
         return value
 
+# ===========================
+#  BATCHED LIST SERIALIZATION
+# ===========================
+
+# Relations read by the listing serializers (location names, currency, owner)
+LISTING_RELATED_LOOKUPS = (
+    'user', 'country', 'state__country', 'city__state', 'city__country', 'category__parent',
+)
+
+
+def recent_ratings_prefetch(ratings_relation, rating_model, limit=3):
+    """Prefetch the latest active ratings of each listing into `recent_active_ratings`"""
+    return Prefetch(
+        ratings_relation,
+        queryset=rating_model.objects.filter(is_active=True).select_related('user').order_by('-created_at')[:limit],
+        to_attr='recent_active_ratings'
+    )
+
+
+class ListingListSerializer(serializers.ListSerializer):
+    """
+    Serializes a page of products/services with batched lookups.
+
+    Related rows and recent ratings are fetched once for the whole page, and
+    nested category data is serialized once per distinct category and shared
+    through the serializer context.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        if items:
+            self.child.preload(items)
+        return [self.child.to_representation(item) for item in items]
+
+
+class ListingSerializerMixin:
+    """Shared batched-loading hooks for ProductsSerializer/ServicesSerializer"""
+    ratings_relation = None
+    rating_model = None
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related(*LISTING_RELATED_LOOKUPS).prefetch_related(
+            recent_ratings_prefetch(cls.ratings_relation, cls.rating_model)
+        )
+
+    def preload(self, items):
+        merge_pending_counts(items)
+        prefetch_related_objects(
+            items,
+            *LISTING_RELATED_LOOKUPS,
+            recent_ratings_prefetch(self.ratings_relation, self.rating_model)
+        )
+
+        lookup = self.context.setdefault('category_details_lookup', {})
+        for item in items:
+            if item.category_id and item.category_id not in lookup:
+                lookup[item.category_id] = CategorySerializer(item.category, context=self.context).data
+
+    def get_category_details(self, obj):
+        lookup = self.context.get('category_details_lookup', {})
+        if obj.category_id in lookup:
+            return lookup[obj.category_id]
+        return CategorySerializer(obj.category, context=self.context).data if obj.category_id else None
+
+    def get_recent_ratings_list(self, obj):
+        recent = getattr(obj, 'recent_active_ratings', None)
+        if recent is None:
+            recent = getattr(obj, self.ratings_relation).filter(is_active=True).select_related('user')[:3]
+        return recent
+
+
 # ===========================
 #  PRODUCT SERIALIZERS
 # ===========================
-class ProductsSerializer(serializers.ModelSerializer):
+class ProductsSerializer(ListingSerializerMixin, serializers.ModelSerializer):
+    ratings_relation = 'product_ratings'
+    rating_model = ProductRating
+    
     # Images
     featured_image_url = serializers.SerializerMethodField()
     gallery_image_url = serializers.SerializerMethodField()
@@ -306,13 +374,14 @@ class ProductsSerializer(serializers.ModelSerializer):
     country_details = CountrySerializer(source='country', read_only=True)
     state_details = StateSerializer(source='state', read_only=True)
     city_details = CitySerializer(source='city', read_only=True)
-    category_details = CategorySerializer(source='category', read_only=True)
+    category_details = serializers.SerializerMethodField()
     
     # Ratings (limited for performance)
     recent_ratings = serializers.SerializerMethodField()
     
     class Meta:
         model = Products
+        list_serializer_class = ListingListSerializer
         fields = [
             # Basic fields
             'id', 'slug', 'product_name', 'product_description', 'featured_image', 'gallery_images',
@@ -370,7 +439,7 @@ class ProductsSerializer(serializers.ModelSerializer):
         return obj.average_rating()
     
     def get_rating_count(self, obj):
-        return obj.rating_count()
+        return obj.rating_count
     
     def get_formatted_price(self, obj):
         return obj.get_formatted_price()
@@ -388,8 +457,7 @@ class ProductsSerializer(serializers.ModelSerializer):
         return obj.get_tags_list()
     
     def get_recent_ratings(self, obj):
-        recent = obj.product_ratings.filter(is_active=True)[:3]
-        return ProductRatingSerializer(recent, many=True).data
+        return ProductRatingSerializer(self.get_recent_ratings_list(obj), many=True).data
 
 
 class ProductCreateSerializer(serializers.ModelSerializer):
@@ -443,7 +511,10 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
 #  SERVICE SERIALIZERS
 # ===========================
 
-class ServicesSerializer(serializers.ModelSerializer):
+class ServicesSerializer(ListingSerializerMixin, serializers.ModelSerializer):
+    ratings_relation = 'service_ratings'
+    rating_model = ServiceRating
+    
     # Images
     featured_image_url = serializers.SerializerMethodField()
     gallery_image_url = serializers.SerializerMethodField()
@@ -461,13 +532,14 @@ class ServicesSerializer(serializers.ModelSerializer):
     country_details = CountrySerializer(source='country', read_only=True)
     state_details = StateSerializer(source='state', read_only=True)
     city_details = CitySerializer(source='city', read_only=True)
-    category_details = CategorySerializer(source='category', read_only=True)
+    category_details = serializers.SerializerMethodField()
     
     # Recent ratings
     recent_ratings = serializers.SerializerMethodField()
     
     class Meta:
         model = Services
+        list_serializer_class = ListingListSerializer
         fields = [
             # Basic fields
             'id', 'slug', 'service_name', 'service_description', 'featured_image',
@@ -533,7 +605,7 @@ class ServicesSerializer(serializers.ModelSerializer):
         return obj.average_rating()
     
     def get_rating_count(self, obj):
-        return obj.rating_count()
+        return obj.rating_count
     
     def get_formatted_price_range(self, obj):
         return obj.get_formatted_price_range()
@@ -548,8 +620,7 @@ class ServicesSerializer(serializers.ModelSerializer):
         return obj.get_tags_list()
     
     def get_recent_ratings(self, obj):
-        recent = obj.service_ratings.filter(is_active=True)[:3]
-        return ServiceRatingSerializer(recent, many=True).data
+        return ServiceRatingSerializer(self.get_recent_ratings_list(obj), many=True).data
 
 
 class ServiceCreateSerializer(serializers.ModelSerializer):
@@ -671,6 +742,8 @@ class SearchSerializer(serializers.Serializer):
     q = serializers.CharField(required=False, max_length=200, allow_blank=True)
     category = serializers.CharField(required=False, max_length=100, allow_blank=True)
     location = serializers.CharField(required=False, max_length=100, allow_blank=True)
+    city_id = serializers.IntegerField(required=False, min_value=1)
+    state_id = serializers.IntegerField(required=False, min_value=1)
     min_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0)
     max_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0)
     min_rating = serializers.DecimalField(required=False, max_digits=2, decimal_places=1, min_value=1.0, max_value=5.0)
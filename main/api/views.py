@@ -10,6 +10,14 @@ from django.shortcuts import get_object_or_404
 from django.conf import settings
 from django.db.models import Q, Avg, Count, Sum
 from main.location_utils import LocationUtils
+from main.search import search_listings
+from main.category_tree import category_tree
+from main.counters import category_listing_counts
+from main.buffered_counters import merge_pending_counts
+from main.search_events import build_search_event, log_search_event
+from main.search_rollups import trending_terms
+from main.gazetteer import location_q, resolve_location
+from main.proximity import distance_tier_case, get_proximity_setting, nearby_city_distances
 from django.core.cache import cache
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -20,7 +28,7 @@ from ..models import (
     Country, State, City, Category,
     Products, Services,
     ProductRating, ServiceRating,
-    UserFavorite, SearchHistory,
+    UserFavorite,
     LocationCache  # Add this missing import
 )
 
@@ -34,7 +42,22 @@ from .serializers import (
     LocationHierarchySerializer, UserFavoriteSerializer,
     PaymentInitiateSerializer, PaymentVerifySerializer  # Add these
 )
-from django.db.models import Prefetch, Q, F, Count, Sum, Avg
+from django.db.models import Q, F, Count, Sum, Avg
+
+def get_location_filter(request):
+    """Most specific location from country_id/state_id/city_id query params"""
+    city_id = request.query_params.get('city_id')
+    state_id = request.query_params.get('state_id')
+    country_id = request.query_params.get('country_id')
+    
+    if city_id:
+        return {'city_id': city_id}
+    if state_id:
+        return {'state_id': state_id}
+    if country_id:
+        return {'country_id': country_id}
+    return {}
+
 
 # ===========================
 #  LOCATION VIEWSETS
@@ -165,21 +188,17 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         """Optimized queryset to reduce database queries"""
+        # Subcategories and counts are served from the cached category tree,
+        # so only the parent needs joining here
         return Category.objects.filter(is_active=True).select_related(
             'parent'
-        ).prefetch_related(
-            'subcategories',
-            # Prefetch related products and services for efficient counting
-            Prefetch(
-                'products',
-                queryset=Products.objects.filter(product_status='published').only('id', 'category')
-            ),
-            Prefetch(
-                'services', 
-                queryset=Services.objects.filter(service_status='published').only('id', 'category')
-            )
         ).order_by('sort_order', 'name')
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['location_filter'] = get_location_filter(self.request)
+        return context
+
     @action(detail=False, methods=['get'])
     def root_categories(self, request):
         """Get root categories (no parent)"""
@@ -191,20 +210,7 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     def subcategories(self, request, pk=None):
         """Get subcategories for a specific category"""
         category = self.get_object()
-        subcategories = category.get_children()
-        
-        # Apply same optimization to subcategories
-        subcategories = subcategories.select_related('parent').prefetch_related(
-            'subcategories',
-            Prefetch(
-                'products',
-                queryset=Products.objects.filter(product_status='published').only('id', 'category')
-            ),
-            Prefetch(
-                'services',
-                queryset=Services.objects.filter(service_status='published').only('id', 'category')
-            )
-        )
+        subcategories = category_tree.snapshot().get_children(category.id)
         
         serializer = self.get_serializer(subcategories, many=True)
         return Response(serializer.data)
@@ -278,8 +284,12 @@ class HomePageAPIView(APIView):
                 )
 
         # Base querysets
-        products_query = Products.objects.filter(product_status='published')
-        services_query = Services.objects.filter(service_status='published')
+        products_query = ProductsSerializer.setup_eager_loading(
+            Products.objects.filter(product_status='published')
+        )
+        services_query = ServicesSerializer.setup_eager_loading(
+            Services.objects.filter(service_status='published')
+        )
 
         # Apply filters
         if search_query:
@@ -298,9 +308,9 @@ class HomePageAPIView(APIView):
             try:
                 category = Category.objects.get(id=category_id, is_active=True)
                 # Include subcategories
-                all_categories = [category] + category.get_all_subcategories()
-                products_query = products_query.filter(category__in=all_categories)
-                services_query = services_query.filter(category__in=all_categories)
+                all_category_ids = category.get_descendant_ids()
+                products_query = products_query.filter(category_id__in=all_category_ids)
+                services_query = services_query.filter(category_id__in=all_category_ids)
             except Category.DoesNotExist:
                 pass
 
@@ -328,28 +338,28 @@ class HomePageAPIView(APIView):
         if min_rating:
             try:
                 min_rating_val = float(min_rating)
-                products_query = products_query.annotate(
-                    avg_rating=Avg("product_ratings__rating")
-                ).filter(avg_rating__gte=min_rating_val)
-                services_query = services_query.annotate(
-                    avg_rating=Avg("service_ratings__rating")
-                ).filter(avg_rating__gte=min_rating_val)
+                products_query = products_query.filter(rating_avg__gte=min_rating_val)
+                services_query = services_query.filter(rating_avg__gte=min_rating_val)
             except ValueError:
                 pass
 
-        # Log search if there's a query
+        # Totals are needed for the response anyway; count once and reuse
+        products_total = products_query.count()
+        services_total = services_query.count()
+
+        # Log search if there's a query (written in batches by main.tasks)
         if search_query and len(search_query.strip()) > 2:
-            SearchHistory.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                search_term=search_query.strip(),
+            log_search_event(build_search_event(
+                request,
+                search_term=search_query,
+                results_count=products_total + services_total,
+                search_type='both',
                 category_id=category_id,
                 country_id=country_id,
                 state_id=state_id,
                 city_id=city_id,
-                search_type='both',
-                results_count=products_query.count() + services_query.count(),
                 ip_address=self.get_client_ip(request)
-            )
+            ))
 
         # Get results
         promoted_products = products_query.filter(is_promoted=True)[:10]
@@ -381,8 +391,8 @@ class HomePageAPIView(APIView):
                 'max_price': max_price,
             },
             'total_results': {
-                'products': products_query.count(),
-                'services': services_query.count()
+                'products': products_total,
+                'services': services_total
             }
         }
 
@@ -405,9 +415,9 @@ class HomePageAPIView(APIView):
 class ProductsViewSet(viewsets.ModelViewSet):
     lookup_field = 'slug'
     """Enhanced Products ViewSet with location system"""
-    queryset = Products.objects.select_related(
-        'user', 'country', 'state', 'city', 'category'
-    ).prefetch_related('product_ratings').order_by('-is_promoted', '-is_featured', '-created_at')
+    queryset = ProductsSerializer.setup_eager_loading(
+        Products.objects.all()
+    ).order_by('-is_promoted', '-is_featured', '-created_at')
     
     permission_classes = [IsOwnerOrReadOnly]
     filterset_class = ProductsFilter
@@ -459,6 +469,7 @@ class ProductsViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to increment view count"""
         instance = self.get_object()
+        merge_pending_counts([instance])
         instance.increment_views()
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -492,7 +503,7 @@ class ProductsViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def nearby(self, request):
-        """Get products near a specific location"""
+        """Get products within radius_km of a city, nearest distance tier first"""
         city_id = request.query_params.get('city_id')
         if not city_id:
             return Response(
@@ -500,23 +511,48 @@ class ProductsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        try:
+            radius_km = float(request.query_params.get(
+                'radius_km', get_proximity_setting('NEARBY_RADIUS_KM', 50)
+            ))
+        except ValueError:
+            return Response(
+                {'error': 'radius_km must be a number'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        radius_km = min(max(radius_km, 1.0), get_proximity_setting('NEARBY_MAX_RADIUS_KM', 500))
+        
         try:
             city = City.objects.get(id=city_id, is_active=True)
-            # Get products in same city, then state, then country
-            nearby_products = self.get_queryset().filter(
-                Q(city=city) |
-                Q(state=city.state) |
-                Q(country=city.country)
-            ).distinct()[:20]
-            
-            serializer = self.get_serializer(nearby_products, many=True)
-            return Response(serializer.data)
-            
-        except City.DoesNotExist:
+        except (City.DoesNotExist, ValueError):
             return Response(
                 {'error': 'Invalid city_id'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        distances = nearby_city_distances(city.id, radius_km)
+        if distances:
+            location_filter = Q(city_id__in=list(distances))
+            fallback = []
+        else:
+            # No coordinates for this city: the city itself, then the rest of its state
+            distances = {city.id: 0.0}
+            location_filter = Q(state_id=city.state_id)
+            fallback = [('state_id', city.state_id)]
+        
+        nearby_products = list(
+            self.get_queryset().filter(location_filter, product_status='published')
+            .annotate(distance_tier=distance_tier_case(distances, radius_km, fallback=fallback))
+            .order_by('distance_tier', '-is_promoted', '-is_featured', '-created_at')[:20]
+        )
+        
+        serializer = self.get_serializer(nearby_products, many=True)
+        data = serializer.data
+        for item, product in zip(data, nearby_products):
+            distance = distances.get(product.city_id)
+            item['distance_km'] = round(distance, 1) if distance is not None else None
+            item['distance_tier'] = product.distance_tier
+        return Response(data)
 
 
 # ===========================
@@ -526,9 +562,9 @@ class ProductsViewSet(viewsets.ModelViewSet):
 class ServicesViewSet(viewsets.ModelViewSet):
     lookup_field = 'slug'
     """Enhanced Services ViewSet with location system"""
-    queryset = Services.objects.select_related(
-        'user', 'country', 'state', 'city', 'category'
-    ).prefetch_related('service_ratings').order_by('-is_promoted', '-is_featured', '-created_at')
+    queryset = ServicesSerializer.setup_eager_loading(
+        Services.objects.all()
+    ).order_by('-is_promoted', '-is_featured', '-created_at')
     
     permission_classes = [IsOwnerOrReadOnly]
     filterset_class = ServicesFilter
@@ -582,6 +618,7 @@ class ServicesViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to increment view count"""
         instance = self.get_object()
+        merge_pending_counts([instance])
         instance.increment_views()
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -940,29 +977,43 @@ class SearchAPIView(APIView):
         max_price = data.get('max_price')
         min_rating = data.get('min_rating')
         item_type = data.get('item_type', 'all')
+        city_id = data.get('city_id')
+        state_id = data.get('state_id')
+        
+        # Location names resolve to ids in memory, so the filter is a foreign key lookup
+        resolved_location = []
+        location_filter = None
+        if city_id:
+            location_filter = Q(city_id=city_id)
+        elif state_id:
+            location_filter = Q(state_id=state_id)
+        elif location:
+            resolved_location = resolve_location(location)
+            if resolved_location:
+                location_filter = location_q(resolved_location)
+            else:
+                # Not a known place; keep the old name match as a fallback
+                location_filter = (
+                    Q(city__name__icontains=location) |
+                    Q(state__name__icontains=location) |
+                    Q(country__name__icontains=location)
+                )
         
         results = {}
         
         if item_type in ['all', 'products']:
-            products = Products.objects.filter(product_status='published')
+            products = ProductsSerializer.setup_eager_loading(
+                Products.objects.filter(product_status='published')
+            )
             
             if query:
-                products = products.filter(
-                    Q(product_name__icontains=query) |
-                    Q(product_description__icontains=query) |
-                    Q(product_brand__icontains=query) |
-                    Q(tags__icontains=query)
-                )
+                products = search_listings(products, query)
             
             if category:
                 products = products.filter(category__name__icontains=category)
             
-            if location:
-                products = products.filter(
-                    Q(city__name__icontains=location) |
-                    Q(state__name__icontains=location) |
-                    Q(country__name__icontains=location)
-                )
+            if location_filter is not None:
+                products = products.filter(location_filter)
             
             if min_price:
                 products = products.filter(product_price__gte=min_price)
@@ -971,33 +1022,26 @@ class SearchAPIView(APIView):
                 products = products.filter(product_price__lte=max_price)
             
             if min_rating:
-                products = products.annotate(
-                    avg_rating=Avg('product_ratings__rating')
-                ).filter(avg_rating__gte=min_rating)
+                products = products.filter(rating_avg__gte=min_rating)
+            
+            if query:
+                products = products.order_by('-search_rank', '-is_promoted', '-created_at')
             
             results['products'] = ProductsSerializer(products[:20], many=True).data
         
         if item_type in ['all', 'services']:
-            services = Services.objects.filter(service_status='published')
+            services = ServicesSerializer.setup_eager_loading(
+                Services.objects.filter(service_status='published')
+            )
             
             if query:
-                services = services.filter(
-                    Q(service_name__icontains=query) |
-                    Q(service_description__icontains=query) |
-                    Q(provider_name__icontains=query) |
-                    Q(provider_expertise__icontains=query) |
-                    Q(tags__icontains=query)
-                )
+                services = search_listings(services, query)
             
             if category:
                 services = services.filter(category__name__icontains=category)
             
-            if location:
-                services = services.filter(
-                    Q(city__name__icontains=location) |
-                    Q(state__name__icontains=location) |
-                    Q(country__name__icontains=location)
-                )
+            if location_filter is not None:
+                services = services.filter(location_filter)
             
             if min_price:
                 services = services.filter(starting_price__gte=min_price)
@@ -1006,21 +1050,22 @@ class SearchAPIView(APIView):
                 services = services.filter(starting_price__lte=max_price)
             
             if min_rating:
-                services = services.annotate(
-                    avg_rating=Avg('service_ratings__rating')
-                ).filter(avg_rating__gte=min_rating)
+                services = services.filter(rating_avg__gte=min_rating)
+            
+            if query:
+                services = services.order_by('-search_rank', '-is_promoted', '-created_at')
             
             results['services'] = ServicesSerializer(services[:20], many=True).data
         
-        # Log search
+        # Log search (written in batches by main.tasks)
         if query and len(query.strip()) > 2:
-            SearchHistory.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                search_term=query.strip(),
-                search_type=item_type,
+            log_search_event(build_search_event(
+                request,
+                search_term=query,
                 results_count=len(results.get('products', [])) + len(results.get('services', [])),
+                search_type=item_type,
                 ip_address=self.get_client_ip(request)
-            )
+            ))
         
         return Response({
             'results': results,
@@ -1028,6 +1073,9 @@ class SearchAPIView(APIView):
             'filters_applied': {
                 'category': category,
                 'location': location,
+                'resolved_location': [place.as_dict() for place in resolved_location],
+                'city_id': city_id,
+                'state_id': state_id,
                 'price_range': [min_price, max_price] if min_price or max_price else None,
                 'min_rating': min_rating
             }
@@ -1051,24 +1099,26 @@ class TrendingSearchesAPIView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Get trending searches from last 7 days
-        week_ago = timezone.now() - timedelta(days=7)
+        country_id = request.query_params.get('country') or None
+        if country_id is not None:
+            try:
+                country_id = int(country_id)
+            except ValueError:
+                return Response(
+                    {'error': 'country must be an integer id'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
-        trending_searches = SearchHistory.objects.filter(
-            created_at__gte=week_ago
-        ).values('search_term').annotate(
-            search_count=Count('id'),
-            avg_results=Avg('results_count')
-        ).filter(
-            search_count__gt=1,
-            avg_results__gt=0
-        ).order_by('-search_count')[:20]
+        # Served from the hourly/daily rollups (see main.search_rollups)
+        trending_searches = trending_terms(
+            sources=('site',),
+            days=7,
+            country_id=country_id,
+            limit=20
+        )
         
         return Response({
-            'trending_searches': list(trending_searches),
+            'trending_searches': trending_searches,
             'period': '7 days'
         })
 
@@ -1078,38 +1128,30 @@ class PopularCategoriesAPIView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        location_filter = {}
-        country_id = request.query_params.get('country_id')
-        state_id = request.query_params.get('state_id')
-        city_id = request.query_params.get('city_id')
-        
-        if city_id:
-            location_filter = {'city_id': city_id}
-        elif state_id:
-            location_filter = {'state_id': state_id}
-        elif country_id:
-            location_filter = {'country_id': country_id}
-        
-        # Get categories with product/service counts
-        categories = Category.objects.filter(
-            is_active=True,
-            parent__isnull=True  # Root categories only
-        ).annotate(
-            products_count=Count(
-                'products',
-                filter=Q(products__product_status='published', **{f'products__{k}': v for k, v in location_filter.items()})
-            ),
-            services_count=Count(
-                'services',
-                filter=Q(services__service_status='published', **{f'services__{k}': v for k, v in location_filter.items()})
-            ),
-            total_count=Count('products', filter=Q(products__product_status='published')) + 
-                       Count('services', filter=Q(services__service_status='published'))
-        ).filter(
-            Q(products_count__gt=0) | Q(services_count__gt=0)
-        ).order_by('-total_count')[:15]
-        
-        serializer = CategorySerializer(categories, many=True)
+        location_filter = get_location_filter(request)
+        
+        # Counts come from the precomputed counter table, summed per subtree
+        snapshot = category_tree.snapshot()
+        product_counts = category_listing_counts('product', **location_filter)
+        service_counts = category_listing_counts('service', **location_filter)
+        
+        ranked = []
+        for category in snapshot.get_roots():  # Root categories only
+            total = (
+                snapshot.subtree_total(category.id, product_counts) +
+                snapshot.subtree_total(category.id, service_counts)
+            )
+            if total > 0:
+                ranked.append((total, category))
+        ranked.sort(key=lambda pair: pair[0], reverse=True)
+        
+        context = {
+            'request': request,
+            'location_filter': location_filter,
+            '_category_product_counts': product_counts,
+            '_category_service_counts': service_counts,
+        }
+        serializer = CategorySerializer([category for _, category in ranked[:15]], many=True, context=context)
         return Response(serializer.data)
 
 
@@ -1158,12 +1200,12 @@ class UserDashboardAPIView(APIView):
         
         # Performance metrics
         dashboard_data['performance'] = {
-            'avg_product_rating': user_products.annotate(
-                avg_rating=Avg('product_ratings__rating')
-            ).aggregate(overall_avg=Avg('avg_rating'))['overall_avg'] or 0,
-            'avg_service_rating': user_services.annotate(
-                avg_rating=Avg('service_ratings__rating')
-            ).aggregate(overall_avg=Avg('avg_rating'))['overall_avg'] or 0,
+            'avg_product_rating': user_products.filter(rating_count__gt=0).aggregate(
+                overall_avg=Avg('rating_avg')
+            )['overall_avg'] or 0,
+            'avg_service_rating': user_services.filter(rating_count__gt=0).aggregate(
+                overall_avg=Avg('rating_avg')
+            )['overall_avg'] or 0,
             'total_reviews': ProductRating.objects.filter(product__user=user).count() + 
                            ServiceRating.objects.filter(service__user=user).count()
         }
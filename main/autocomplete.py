@@ -0,0 +1,205 @@
+# main/autocomplete.py - In-memory prefix index for search-box typeahead
+import logging
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from .search_rollups import normalize_term, trending_terms
+from .snapshots import VersionedSnapshotHolder
+
+logger = logging.getLogger(__name__)
+
+INDEX_CACHE_KEY = 'autocomplete_index_entries'
+INDEX_VERSION_CACHE_KEY = 'autocomplete_index_version'
+
+
+def get_autocomplete_setting(name, default):
+    return getattr(settings, 'SEARCH_SETTINGS', {}).get(name, default)
+
+
+# ===========================
+#  INDEX SOURCES
+# ===========================
+
+def _popular_entries():
+    days = get_autocomplete_setting('AUTOCOMPLETE_POPULAR_DAYS', 30)
+    return [
+        (row['search_term'], 'popular', row['search_count'], None)
+        for row in trending_terms(sources=('site', 'chatbot'), days=days, limit=5000, min_count=2)
+    ]
+
+
+def _category_entries():
+    from .category_tree import category_tree
+    from .counters import category_listing_counts
+
+    snapshot = category_tree.snapshot()
+    counts = category_listing_counts('product')
+    for category_id, total in category_listing_counts('service').items():
+        counts[category_id] = counts.get(category_id, 0) + total
+
+    return [
+        (category.name, 'category', snapshot.subtree_total(category.id, counts), category.id)
+        for category in snapshot.nodes.values() if category.is_active
+    ]
+
+
+def _brand_entries():
+    from .models import Products
+
+    rows = (
+        Products.objects.filter(product_status='published')
+        .exclude(product_brand__isnull=True).exclude(product_brand='')
+        .order_by().values('product_brand').annotate(total=Count('id'))
+    )
+    brands = {}
+    for row in rows:
+        # 'Samsung' and 'samsung ' are one brand; keep the most used spelling
+        key = normalize_term(row['product_brand'])
+        name, total = brands.get(key, (row['product_brand'].strip(), 0))
+        brands[key] = (name, total + row['total'])
+    return [(name, 'brand', total, None) for name, total in brands.values()]
+
+
+def _city_entries():
+    from .models import City, CategoryListingCounter
+
+    counts = dict(
+        CategoryListingCounter.objects.order_by().values_list('city_id').annotate(total=Sum('count'))
+    )
+    return [
+        (name, 'city', counts.get(city_id, 0), city_id)
+        for city_id, name in City.objects.filter(is_active=True).values_list('id', 'name')
+    ]
+
+
+def build_autocomplete_entries():
+    """Every suggestion the index serves, as (text, type, score, object_id) tuples"""
+    entries = []
+    for source in (_popular_entries, _category_entries, _brand_entries, _city_entries):
+        try:
+            entries.extend(source())
+        except Exception as e:
+            logger.error(f"Error loading autocomplete entries from {source.__name__}: {str(e)}")
+    return entries
+
+
+# ===========================
+#  PREFIX INDEX
+# ===========================
+
+class AutocompleteSnapshot:
+    """
+    Immutable prefix index over suggestion entries.
+
+    Short prefixes map straight to their precomputed top-k entries. Longer
+    prefixes binary-search a sorted key list; they match few entries, so
+    the scan stays small.
+    """
+
+    def __init__(self, entries, version=None):
+        self.version = version
+        self.max_prefix = get_autocomplete_setting('AUTOCOMPLETE_MAX_PREFIX', 10)
+        self.top_k = get_autocomplete_setting('AUTOCOMPLETE_TOP_K', 20)
+
+        seen = set()
+        self.entries = []
+        for text, kind, score, object_id in sorted(entries, key=lambda e: -e[2]):
+            key = normalize_term(text)
+            if key and (kind, key) not in seen:
+                seen.add((kind, key))
+                self.entries.append((key, text, kind, score, object_id))
+
+        self.prefixes = {}
+        keys = []
+        for position, entry in enumerate(self.entries):
+            for token in self._tokens(entry[0]):
+                keys.append((token, position))
+                for length in range(1, min(len(token), self.max_prefix) + 1):
+                    matches = self.prefixes.setdefault(token[:length], [])
+                    # Entries arrive best-first, so a repeat can only be the last item
+                    if len(matches) < self.top_k and (not matches or matches[-1] != position):
+                        matches.append(position)
+        keys.sort()
+        self.keys = keys
+
+    @staticmethod
+    def _tokens(key):
+        """The key itself plus every suffix starting at a word, so 'york' finds 'new york'"""
+        words = key.split(' ')
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _scan(self, prefix):
+        positions = set()
+        start = bisect_left(self.keys, (prefix, -1))
+        for token, position in self.keys[start:start + 500]:
+            if not token.startswith(prefix):
+                break
+            positions.add(position)
+        return sorted(positions)[:self.top_k]
+
+    def search(self, query, limit=10, types=None):
+        prefix = normalize_term(query)
+        if not prefix:
+            return []
+
+        if len(prefix) <= self.max_prefix:
+            positions = self.prefixes.get(prefix, [])
+        else:
+            positions = self._scan(prefix)
+
+        results = []
+        for position in positions:
+            key, text, kind, score, object_id = self.entries[position]
+            if types and kind not in types:
+                continue
+            results.append({'text': text, 'type': kind, 'count': score, 'id': object_id})
+            if len(results) >= limit:
+                break
+        return results
+
+
+class AutocompleteIndex(VersionedSnapshotHolder):
+    """
+    Process-wide holder for the autocomplete snapshot.
+
+    Entries are built by main.tasks.rebuild_autocomplete_index and shared
+    through the cache; each process rebuilds its in-memory index when the
+    version key moves. Lookups never touch the database once a snapshot is
+    loaded.
+    """
+
+    version_cache_key = INDEX_VERSION_CACHE_KEY
+    name = 'autocomplete index'
+
+    @property
+    def check_interval(self):
+        return get_autocomplete_setting('AUTOCOMPLETE_CHECK_INTERVAL', 30)
+
+    def _load(self, version):
+        entries = cache.get(INDEX_CACHE_KEY) if version is not None else None
+        if entries is None:
+            # Cold start: nothing published yet, build from the database once
+            version, entries = self.rebuild()
+        logger.info(f"Loaded autocomplete index with {len(entries)} entries")
+        return AutocompleteSnapshot(entries, version=version)
+
+    def rebuild(self):
+        """Build entries from the database and publish them to every process"""
+        entries = build_autocomplete_entries()
+        version = time.time_ns()
+        try:
+            cache.set(INDEX_CACHE_KEY, entries, None)
+            cache.set(INDEX_VERSION_CACHE_KEY, version, None)
+        except Exception as e:
+            logger.error(f"Error publishing autocomplete index: {str(e)}")
+        return version, entries
+
+    def search(self, query, limit=10, types=None):
+        return self.snapshot().search(query, limit=limit, types=types)
+
+
+autocomplete_index = AutocompleteIndex()
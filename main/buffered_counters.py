@@ -0,0 +1,139 @@
+# main/buffered_counters.py - Write-behind view/contact/favorite counters
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+# Model label -> counter fields that are buffered instead of written per request
+BUFFERED_COUNTERS = {
+    'main.Products': ('views_count', 'favorites_count'),
+    'main.Services': ('views_count', 'contacts_count'),
+}
+
+
+def _pending_key(model, field):
+    return redis_key('counters', model._meta.label_lower, field)
+
+
+def _apply_to_db(model, field, deltas):
+    """Write {pk: delta} to the database, one UPDATE per distinct delta"""
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+
+    for delta, pks in by_delta.items():
+        # Never drive a PositiveIntegerField below zero
+        model.objects.filter(pk__in=pks).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def increment(model, pk, field, delta=1):
+    """
+    Buffer a counter increment in Redis (atomic HINCRBY).
+
+    Falls back to an immediate F() update when Redis is unavailable, so
+    increments are never dropped.
+    """
+    if field not in BUFFERED_COUNTERS[model._meta.label]:
+        raise ValueError(f"{field} is not a buffered counter on {model.__name__}")
+
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.hincrby(_pending_key(model, field), pk, delta)
+            return
+        except Exception as e:
+            logger.error(f"Error buffering {field} for {model.__name__} {pk}: {str(e)}")
+
+    _apply_to_db(model, field, {pk: delta})
+
+
+def get_pending_deltas(model, field, pks):
+    """Unflushed deltas for the given primary keys ({pk: delta})"""
+    pks = list(pks)
+    client = get_redis_client()
+    if client is None or not pks:
+        return {}
+    try:
+        values = client.hmget(_pending_key(model, field), pks)
+    except Exception as e:
+        logger.error(f"Error reading pending {field} counters: {str(e)}")
+        return {}
+    return {pk: int(value) for pk, value in zip(pks, values) if value}
+
+
+def merge_pending_counts(instances):
+    """Add unflushed deltas onto loaded instances so reads are up to date"""
+    instances = [obj for obj in instances if not getattr(obj, '_pending_counts_merged', False)]
+    if not instances:
+        return
+
+    model = type(instances[0])
+    pks = [obj.pk for obj in instances]
+    for field in BUFFERED_COUNTERS.get(model._meta.label, ()):
+        deltas = get_pending_deltas(model, field, pks)
+        for obj in instances:
+            if obj.pk in deltas:
+                setattr(obj, field, max(getattr(obj, field) + deltas[obj.pk], 0))
+
+    for obj in instances:
+        obj._pending_counts_merged = True
+
+
+def flush_counters(model):
+    """Move buffered deltas for one model into the database. Returns rows touched."""
+    client = get_redis_client()
+    if client is None:
+        return 0
+
+    flushed = 0
+    for field in BUFFERED_COUNTERS[model._meta.label]:
+        key = _pending_key(model, field)
+        flushing_key = f'{key}:flushing'
+
+        try:
+            # A leftover flushing hash means a previous flush died mid-way; retry it first
+            if not client.exists(flushing_key):
+                if not client.exists(key):
+                    continue
+                client.rename(key, flushing_key)
+            raw = client.hgetall(flushing_key)
+        except Exception as e:
+            logger.error(f"Error swapping pending {field} counters: {str(e)}")
+            continue
+
+        deltas = {int(pk): int(delta) for pk, delta in raw.items()}
+        try:
+            # The flushing hash is only dropped once its deltas are committed, so a
+            # retry after a failure never applies part of it twice
+            with transaction.atomic():
+                _apply_to_db(model, field, deltas)
+                client.delete(flushing_key)
+        except Exception as e:
+            logger.error(f"Error flushing {field} counters for {model.__name__}: {str(e)}")
+            continue
+        flushed += len(deltas)
+
+    return flushed
+
+
+def rebuild_favorites_count():
+    """
+    Recompute Products.favorites_count from UserFavorite rows.
+    Pending deltas are flushed first so they are not applied on top of the
+    recomputed totals. Returns rows updated.
+    """
+    from .models import Products, UserFavorite
+
+    flush_counters(Products)
+    favorites = (
+        UserFavorite.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(total=Count('pk')).values('total')
+    )
+    return Products.objects.update(favorites_count=Coalesce(Subquery(favorites), Value(0)))
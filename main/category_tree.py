@@ -0,0 +1,106 @@
+# main/category_tree.py - Cached in-process snapshot of the category tree
+import logging
+
+from django.conf import settings
+
+from .snapshots import VersionedSnapshotHolder
+
+logger = logging.getLogger(__name__)
+
+TREE_VERSION_CACHE_KEY = 'category_tree_version'
+
+
+class CategoryTreeSnapshot:
+    """
+    Immutable view of every category, loaded with a single query.
+
+    Instances are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.nodes = {category.id: category for category in categories}
+        self.children = {}
+
+        for category in self.nodes.values():
+            self.children.setdefault(category.parent_id, []).append(category)
+            # Link parents in memory so `category.parent` never hits the DB
+            if category.parent_id in self.nodes:
+                category._state.fields_cache['parent'] = self.nodes[category.parent_id]
+
+        for siblings in self.children.values():
+            siblings.sort(key=lambda c: (c.sort_order, c.name))
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def get_children(self, category_id, active_only=True):
+        children = self.children.get(category_id, [])
+        if active_only:
+            return [child for child in children if child.is_active]
+        return list(children)
+
+    def get_roots(self, active_only=True):
+        return self.get_children(None, active_only=active_only)
+
+    def descendant_ids(self, category_id, include_self=True, active_only=True):
+        """Ids of the category subtree, depth-first in sort order"""
+        ids = [category_id] if include_self and category_id in self.nodes else []
+        stack = list(reversed(self.get_children(category_id, active_only)))
+        while stack:
+            node = stack.pop()
+            ids.append(node.id)
+            stack.extend(reversed(self.get_children(node.id, active_only)))
+        return ids
+
+    def ancestor_ids(self, category_id):
+        """Ids from the root down to the category's parent"""
+        ids = []
+        node = self.nodes.get(category_id)
+        while node is not None and node.parent_id is not None:
+            ids.append(node.parent_id)
+            node = self.nodes.get(node.parent_id)
+        return list(reversed(ids))
+
+    def full_path(self, category_id, separator=' > '):
+        names = [self.nodes[pk].name for pk in self.ancestor_ids(category_id) if pk in self.nodes]
+        if category_id in self.nodes:
+            names.append(self.nodes[category_id].name)
+        return separator.join(names)
+
+    def subtree_total(self, category_id, counts):
+        """Sum a per-category {id: count} mapping over the active subtree"""
+        return sum(counts.get(pk, 0) for pk in self.descendant_ids(category_id))
+
+
+class CategoryTree(VersionedSnapshotHolder):
+    """Process-wide category snapshot, rebuilt when a Category changes"""
+
+    version_cache_key = TREE_VERSION_CACHE_KEY
+    name = 'category tree'
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'CATEGORY_TREE_CHECK_INTERVAL', 5)
+
+    def _load(self, version):
+        from .models import Category
+
+        categories = list(Category.objects.all())
+        logger.info(f"Loaded category tree snapshot with {len(categories)} categories")
+        return CategoryTreeSnapshot(categories, version=version)
+
+
+category_tree = CategoryTree()
+
+
+def descendant_ids(category_id, include_self=True, active_only=True):
+    """Ids of a category and all of its (active) subcategories"""
+    return category_tree.snapshot().descendant_ids(
+        category_id, include_self=include_self, active_only=active_only
+    )
+
+
+def ancestor_ids(category_id):
+    """Ids of a category's ancestors, root first"""
+    return category_tree.snapshot().ancestor_ids(category_id)
@@ -0,0 +1,170 @@
+# main/counters.py - Per-category listing counters (category x location x kind)
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count, Q
+from django.db.models.functions import Greatest
+
+from .search import SearchIndexedQuerySet
+
+logger = logging.getLogger(__name__)
+
+# Listing model label -> (counter kind, status field)
+COUNTER_KINDS = {
+    'main.Products': ('product', 'product_status'),
+    'main.Services': ('service', 'service_status'),
+}
+
+KEY_FIELDS = ('category_id', 'country_id', 'state_id', 'city_id')
+
+
+def get_counter_kind(model):
+    return COUNTER_KINDS[model._meta.label]
+
+
+def get_counted_fields(model):
+    """Fields whose change can move a listing between counter buckets"""
+    _, status_field = get_counter_kind(model)
+    return {status_field, 'category', 'country', 'state', 'city'}
+
+
+def listing_counter_key(model, values):
+    """Counter bucket for a listing's field values, or None if it is not counted"""
+    _, status_field = get_counter_kind(model)
+    if values.get(status_field) != 'published':
+        return None
+    key = tuple(values.get(field) for field in KEY_FIELDS)
+    return key if all(key) else None
+
+
+def _get_counter_model():
+    from .models import CategoryListingCounter
+    return CategoryListingCounter
+
+
+def _key_filter(kind, key):
+    return dict(kind=kind, **dict(zip(KEY_FIELDS, key)))
+
+
+# ===========================
+#  INCREMENTAL UPDATES
+# ===========================
+
+def apply_counter_delta(kind, key, delta):
+    """Add delta to one counter bucket, creating the row on first use"""
+    if key is None or not delta:
+        return
+
+    Counter = _get_counter_model()
+    lookup = _key_filter(kind, key)
+
+    updated = Counter.objects.filter(**lookup).update(count=Greatest(F('count') + delta, 0))
+    if updated or delta < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            Counter.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Another writer created the row first
+        Counter.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def refresh_counters(model, keys):
+    """Recount the given buckets from the listing table (used after bulk updates)"""
+    keys = {key for key in keys if key is not None and all(key)}
+    if not keys:
+        return
+
+    Counter = _get_counter_model()
+    kind, status_field = get_counter_kind(model)
+
+    key_q = Q()
+    for key in keys:
+        key_q |= Q(**dict(zip(KEY_FIELDS, key)))
+
+    actual = {
+        tuple(row[field] for field in KEY_FIELDS): row['total']
+        for row in model.objects.filter(key_q, **{status_field: 'published'})
+        .order_by().values(*KEY_FIELDS).annotate(total=Count('id'))
+    }
+
+    with transaction.atomic():
+        for key in keys:
+            Counter.objects.update_or_create(
+                defaults={'count': actual.get(key, 0)}, **_key_filter(kind, key)
+            )
+
+
+def rebuild_listing_counters(model):
+    """Rebuild every counter of one listing kind from scratch"""
+    Counter = _get_counter_model()
+    kind, status_field = get_counter_kind(model)
+
+    rows = (
+        model.objects.filter(**{status_field: 'published'})
+        .order_by().values(*KEY_FIELDS).annotate(total=Count('id'))
+    )
+
+    with transaction.atomic():
+        Counter.objects.filter(kind=kind).delete()
+        Counter.objects.bulk_create([
+            Counter(kind=kind, count=row['total'], **{field: row[field] for field in KEY_FIELDS})
+            for row in rows
+        ], batch_size=500)
+
+    total = Counter.objects.filter(kind=kind).count()
+    logger.info(f"Rebuilt {total} {kind} listing counters")
+    return total
+
+
+class ListingQuerySet(SearchIndexedQuerySet):
+    """Listing QuerySet that also keeps category counters right on bulk writes"""
+
+    def _counter_keys(self, pks):
+        fields = list(KEY_FIELDS) + [get_counter_kind(self.model)[1]]
+        return {
+            listing_counter_key(self.model, values)
+            for values in self.model.objects.filter(pk__in=pks).values(*fields)
+        }
+
+    def update(self, **kwargs):
+        if not set(kwargs) & get_counted_fields(self.model):
+            return super().update(**kwargs)
+
+        pks = list(self.values_list('pk', flat=True))
+        before = self._counter_keys(pks)
+        rows = super().update(**kwargs)
+        refresh_counters(self.model, before | self._counter_keys(pks))
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if not set(fields) & get_counted_fields(self.model):
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+
+        pks = [obj.pk for obj in objs]
+        before = self._counter_keys(pks)
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        refresh_counters(self.model, before | self._counter_keys(pks))
+        return rows
+
+
+# ===========================
+#  READS
+# ===========================
+
+def category_listing_counts(kind, country_id=None, state_id=None, city_id=None):
+    """Published listings per category ({category_id: count}) for a location"""
+    Counter = _get_counter_model()
+    counters = Counter.objects.filter(kind=kind, count__gt=0)
+
+    if city_id:
+        counters = counters.filter(city_id=city_id)
+    elif state_id:
+        counters = counters.filter(state_id=state_id)
+    elif country_id:
+        counters = counters.filter(country_id=country_id)
+
+    return dict(
+        counters.order_by().values_list('category_id').annotate(total=Sum('count'))
+    )
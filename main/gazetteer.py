@@ -0,0 +1,317 @@
+# main/gazetteer.py - In-memory resolver from location names to Country/State/City ids
+import logging
+import re
+import unicodedata
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Q
+
+from .snapshots import VersionedSnapshotHolder
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_VERSION_CACHE_KEY = 'gazetteer_version'
+
+KIND_COUNTRY = 'country'
+KIND_STATE = 'state'
+KIND_CITY = 'city'
+# A name shared by several kinds ('Lagos') resolves to the broadest one
+KIND_PRIORITY = {KIND_COUNTRY: 0, KIND_STATE: 1, KIND_CITY: 2}
+
+# Alias -> canonical name; only used when the canonical name exists.
+# Extend with SEARCH_SETTINGS['LOCATION_ALIASES'].
+DEFAULT_LOCATION_ALIASES = {
+    'fct': 'federal capital territory',
+    'abuja fct': 'federal capital territory',
+    'ph': 'port harcourt',
+    'portharcourt': 'port harcourt',
+    'lasgidi': 'lagos',
+    'eko': 'lagos',
+    'naija': 'nigeria',
+    'uk': 'united kingdom',
+    'usa': 'united states',
+    'us': 'united states',
+    'america': 'united states',
+}
+
+# Trailing words people add that are not part of the stored name
+NAME_SUFFIXES = ('state', 'city', 'metropolis', 'lga', 'province')
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9]+')
+
+
+def get_gazetteer_setting(name, default):
+    return getattr(settings, 'SEARCH_SETTINGS', {}).get(name, default)
+
+
+def normalize_location(text):
+    """'Port-Harcourt ', 'Oyo State' and 'Ọ̀yọ́' normalise to 'port harcourt', 'oyo', 'oyo'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower().replace('&', ' and ')
+    words = NON_WORD_PATTERN.sub(' ', text).split()
+    if words and words[0] == 'in':
+        words = words[1:]
+    while len(words) > 1 and words[-1] in NAME_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+class Place:
+    """One active country, state or city"""
+
+    __slots__ = ('kind', 'id', 'name', 'state_id', 'country_id', 'rank')
+
+    def __init__(self, kind, id, name, state_id=None, country_id=None, rank=0):
+        self.kind = kind
+        self.id = id
+        self.name = name
+        self.state_id = state_id
+        self.country_id = country_id
+        self.rank = rank
+
+    def as_dict(self):
+        return {
+            'type': self.kind,
+            'id': self.id,
+            'name': self.name,
+            'state_id': self.state_id,
+            'country_id': self.country_id,
+        }
+
+    def __repr__(self):
+        return f"<Place {self.kind} {self.id} {self.name}>"
+
+
+def is_within(place, area):
+    """True when place lies inside the state or country area"""
+    if area.kind == KIND_STATE:
+        return place.state_id == area.id
+    if area.kind == KIND_COUNTRY:
+        return place.country_id == area.id
+    return False
+
+
+def location_q(places, prefix=''):
+    """Q for listings inside any of the places, on the indexed foreign keys"""
+    ids = {}
+    for place in places:
+        ids.setdefault(place.kind, []).append(place.id)
+    query = Q()
+    for kind, kind_ids in ids.items():
+        query |= Q(**{f'{prefix}{kind}_id__in': kind_ids})
+    return query
+
+
+# ===========================
+#  SNAPSHOT
+# ===========================
+
+def _build_radix(names, depth=0):
+    """
+    Radix trie over sorted, unique names sharing their first `depth` characters.
+    A node is [children, terminal]: children maps an edge's first character to
+    (edge label, child node); terminal is the name ending here, or None.
+    """
+    node = [{}, None]
+    if names and len(names[0]) == depth:
+        node[1] = names[0]
+        names = names[1:]
+    for char, group in groupby(names, key=lambda name: name[depth]):
+        group = list(group)
+        end = depth + 1
+        shortest = min(len(name) for name in group)
+        while end < shortest and all(name[end] == group[0][end] for name in group):
+            end += 1
+        node[0][char] = (group[0][depth:end], _build_radix(group, end))
+    return node
+
+
+class GazetteerSnapshot:
+    """
+    Immutable index over every active location name and alias.
+
+    Exact names are a dict lookup. Misspellings ('Abuija') walk the radix
+    trie with a bounded edit distance, pruning every branch that is already
+    too far off; the first letter has to match. Results are memoised, so a
+    repeated string costs one dict hit.
+    """
+
+    def __init__(self, places, aliases=None, version=None):
+        self.version = version
+        self.names = {}
+        for place in places:
+            key = normalize_location(place.name)
+            if key:
+                self.names.setdefault(key, []).append(place)
+
+        for alias, canonical in (aliases or {}).items():
+            alias, canonical = normalize_location(alias), normalize_location(canonical)
+            if alias and canonical in self.names and alias not in self.names:
+                self.names[alias] = self.names[canonical]
+
+        for candidates in self.names.values():
+            candidates.sort(key=lambda place: (KIND_PRIORITY[place.kind], -place.rank))
+
+        self.trie = _build_radix(sorted(self.names))
+        self.max_memo = get_gazetteer_setting('GAZETTEER_MEMO_SIZE', 10000)
+        self._memo = {}
+
+    def lookup(self, name):
+        """Places with exactly this (normalised) name or alias, broadest first"""
+        return self.names.get(normalize_location(name), [])
+
+    def fuzzy(self, word, max_distance):
+        """(distance, name) for indexed names within max_distance edits of word"""
+        if not word:
+            return []
+        width = len(word) + 1
+        edge = self.trie[0].get(word[0])
+        if edge is None:
+            return []
+
+        # Only cells within max_distance of the diagonal can stay in range (Ukkonen's band)
+        limit = max_distance + 1
+        results = []
+        stack = [(edge, 0, list(range(width)))]
+        while stack:
+            (label, node), depth, row = stack.pop()
+            for char in label:
+                depth += 1
+                low, high = max(1, depth - max_distance), min(width - 1, depth + max_distance)
+                if low > high:
+                    break
+                next_row = [depth] + [limit] * (width - 1)
+                for column in range(low, high + 1):
+                    next_row[column] = min(
+                        next_row[column - 1] + 1,
+                        row[column] + 1,
+                        row[column - 1] + (word[column - 1] != char),
+                    )
+                row = next_row
+                if min(row) > max_distance:
+                    break
+            else:
+                if node[1] is not None and row[-1] <= max_distance:
+                    results.append((row[-1], node[1]))
+                stack.extend((child, depth, row) for child in node[0].values())
+        return sorted(results)
+
+    def _max_distance(self, word):
+        if len(word) < 4:
+            return 0
+        return 1 if len(word) < 8 else 2
+
+    def _resolve_part(self, name, kind=None):
+        key = normalize_location(name)
+        places = [place for place in self.names.get(key, []) if kind is None or place.kind == kind]
+        if places:
+            return places
+        max_distance = self._max_distance(key)
+        if max_distance:
+            matches = self.fuzzy(key, max_distance)
+            for distance in sorted({distance for distance, _ in matches}):
+                places = [
+                    place for found, match in matches if found == distance
+                    for place in self.names[match] if kind is None or place.kind == kind
+                ]
+                if places:
+                    return sorted(places, key=lambda place: (KIND_PRIORITY[place.kind], -place.rank))
+        return []
+
+    def resolve(self, text, kind=None):
+        """
+        Places a free-text location refers to: every place of the best
+        matching kind, so an ambiguous city name covers all its namesakes.
+        'Ikeja, Lagos' narrows the first part to the areas named after it.
+        kind limits the answer to cities, states or countries.
+        """
+        key = ((text or '').strip().lower(), kind)
+        places = self._memo.get(key)
+        if places is not None:
+            return places
+
+        parts = [part for part in key[0].split(',') if part.strip()]
+        places = self._resolve_part(parts[0], kind) if parts else []
+        for part in parts[1:]:
+            areas = self._resolve_part(part)
+            if not areas:
+                continue
+            inside = [place for place in places if any(is_within(place, area) for area in areas)]
+            places = inside or places
+
+        if places:
+            best_kind = places[0].kind
+            places = [place for place in places if place.kind == best_kind]
+
+        if len(self._memo) >= self.max_memo:
+            self._memo.clear()
+        self._memo[key] = places
+        return places
+
+
+# ===========================
+#  PROCESS-WIDE HOLDER
+# ===========================
+
+def load_places():
+    from .models import City, Country, State
+
+    places = [
+        Place(KIND_COUNTRY, country_id, name, country_id=country_id, rank=1000)
+        for country_id, name in Country.objects.filter(is_active=True).values_list('id', 'name')
+    ]
+    places += [
+        Place(KIND_STATE, state_id, name, state_id=state_id, country_id=country_id, rank=100)
+        for state_id, name, country_id in State.objects.filter(is_active=True).values_list('id', 'name', 'country_id')
+    ]
+    cities = City.objects.filter(is_active=True).values_list(
+        'id', 'name', 'state_id', 'country_id', 'is_capital', 'is_major_city', 'population'
+    )
+    for city_id, name, state_id, country_id, is_capital, is_major, population in cities:
+        # Capitals, then major cities, then by population
+        rank = (2 if is_capital else 0) + (1 if is_major else 0) + min(population or 0, 99999999) / 1e8
+        places.append(Place(KIND_CITY, city_id, name, state_id=state_id, country_id=country_id, rank=rank))
+    return places
+
+
+def load_aliases():
+    from .models import Country, State
+
+    aliases = dict(DEFAULT_LOCATION_ALIASES)
+    aliases.update(get_gazetteer_setting('LOCATION_ALIASES', {}))
+    # ISO and state codes ('NG', 'LA') resolve exactly; they are too short for fuzzy matching
+    for code, name in Country.objects.filter(is_active=True).values_list('code', 'name'):
+        aliases.setdefault(code, name)
+    for code, name in State.objects.filter(is_active=True).exclude(code__isnull=True).exclude(
+            code='').values_list('code', 'name'):
+        aliases.setdefault(code, name)
+    return aliases
+
+
+class Gazetteer(VersionedSnapshotHolder):
+    """Process-wide gazetteer snapshot, rebuilt when a Country, State or City changes"""
+
+    version_cache_key = GAZETTEER_VERSION_CACHE_KEY
+    name = 'gazetteer'
+
+    @property
+    def check_interval(self):
+        return get_gazetteer_setting('GAZETTEER_CHECK_INTERVAL', 60)
+
+    def _load(self, version):
+        places = load_places()
+        snapshot = GazetteerSnapshot(places, aliases=load_aliases(), version=version)
+        logger.info(f"Loaded gazetteer with {len(places)} places and {len(snapshot.names)} names")
+        return snapshot
+
+
+gazetteer = Gazetteer()
+
+
+def resolve_location(text, kind=None):
+    """Places a location string refers to (typos and aliases included), or [] when unknown"""
+    try:
+        return gazetteer.snapshot().resolve(text, kind)
+    except Exception as e:
+        logger.error(f"Error resolving location '{text}': {str(e)}")
+        return []
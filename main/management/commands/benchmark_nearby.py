@@ -0,0 +1,74 @@
+# management/commands/benchmark_nearby.py
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.proximity import ProximitySnapshot, haversine_km
+
+
+def brute_force_around(cities, latitude, longitude, radius_km):
+    """The scan the grid replaces: haversine against every city"""
+    found = [
+        (city_id, km) for city_id, city_lat, city_lon, _, _ in cities
+        for km in (haversine_km(latitude, longitude, city_lat, city_lon),) if km <= radius_km
+    ]
+    found.sort(key=lambda pair: pair[1])
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Compare the proximity grid index with a full haversine scan over synthetic cities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cities', type=int, default=50000, help='Synthetic cities to index')
+        parser.add_argument('--queries', type=int, default=200, help='Radius queries per radius')
+        parser.add_argument('--radius', type=float, action='append', help='Radius in km (repeatable)')
+        parser.add_argument('--seed', type=int, default=42)
+        # Roughly Nigeria; widen to test sparser grids
+        parser.add_argument('--bbox', type=float, nargs=4, default=[4.0, 2.7, 13.9, 14.7],
+                            metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        min_lat, min_lon, max_lat, max_lon = options['bbox']
+        cities = [
+            (city_id, rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon), None, None)
+            for city_id in range(1, options['cities'] + 1)
+        ]
+
+        start = time.perf_counter()
+        snapshot = ProximitySnapshot(cities, version='benchmark')
+        build_time = time.perf_counter() - start
+        self.stdout.write(
+            f"Cities: {len(cities)}  grid cells: {len(snapshot.grid)}  "
+            f"cell: {snapshot.cell_km} km  build: {build_time * 1000:.0f} ms"
+        )
+
+        origins = [rng.choice(cities) for _ in range(max(1, options['queries']))]
+        for radius_km in options['radius'] or [10, 50, 100, 250]:
+            grid_results, grid_time = self._time(
+                lambda city: snapshot.around(city[1], city[2], radius_km), origins
+            )
+            # The full scan is slow; a tenth of the queries gives a stable per-query figure
+            sample = origins[:max(1, len(origins) // 10)]
+            scan_results, scan_time = self._time(
+                lambda city: brute_force_around(cities, city[1], city[2], radius_km), sample
+            )
+
+            agree = sum(
+                1 for grid, scan in zip(grid_results, scan_results)
+                if {city_id for city_id, _ in grid} == {city_id for city_id, _ in scan}
+            )
+            found = sum(len(result) for result in grid_results) / len(grid_results)
+            self.stdout.write(
+                f"radius {radius_km:>6.0f} km  avg {found:8.1f} cities  "
+                f"grid {grid_time * 1e6:9.1f} us/query  scan {scan_time * 1e6:10.1f} us/query  "
+                f"speedup {scan_time / grid_time:6.1f}x  agreement {agree}/{len(scan_results)}"
+            )
+
+    @staticmethod
+    def _time(query, origins):
+        start = time.perf_counter()
+        results = [query(city) for city in origins]
+        return results, (time.perf_counter() - start) / len(origins)
@@ -0,0 +1,12 @@
+# management/commands/rebuild_favorite_counts.py
+from django.core.management.base import BaseCommand
+
+from main.buffered_counters import rebuild_favorites_count
+
+
+class Command(BaseCommand):
+    help = 'Recompute products favorites_count from saved favorites'
+
+    def handle(self, *args, **options):
+        count = rebuild_favorites_count()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt favorites_count for {count} products'))
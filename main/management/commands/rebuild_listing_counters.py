@@ -0,0 +1,16 @@
+# management/commands/rebuild_listing_counters.py
+from django.core.management.base import BaseCommand
+
+from main.models import Products, Services
+from main.counters import rebuild_listing_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-category listing counters from the products and services tables'
+
+    def handle(self, *args, **options):
+        count = rebuild_listing_counters(Products)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product counters'))
+
+        count = rebuild_listing_counters(Services)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} service counters'))
@@ -0,0 +1,26 @@
+# management/commands/rebuild_rating_aggregates.py
+from django.core.management.base import BaseCommand
+
+from main.models import Products, Services
+from main.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored rating_avg/rating_count for products and services'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            choices=['all', 'products', 'services'],
+            default='all',
+            help='Which listings to rebuild',
+        )
+
+    def handle(self, *args, **options):
+        if options['type'] in ['all', 'products']:
+            count = rebuild_rating_aggregates(Products)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {count} products'))
+
+        if options['type'] in ['all', 'services']:
+            count = rebuild_rating_aggregates(Services)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {count} services'))
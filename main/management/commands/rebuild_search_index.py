@@ -0,0 +1,34 @@
+# management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from main.models import Products, Services
+from main.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for products and services'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            choices=['all', 'products', 'services'],
+            default='all',
+            help='Which listings to reindex',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows written per batch',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['type'] in ['all', 'products']:
+            count = rebuild_search_index(Products.objects.all(), batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Reindexed {count} products'))
+
+        if options['type'] in ['all', 'services']:
+            count = rebuild_search_index(Services.objects.all(), batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Reindexed {count} services'))
@@ -0,0 +1,17 @@
+# management/commands/rebuild_search_rollups.py
+from django.core.management.base import BaseCommand
+
+from main.search_rollups import ROLLUP_SOURCES, rebuild_search_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly/daily search-term rollups from the raw search tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=sorted(ROLLUP_SOURCES), help='Only rebuild one source')
+
+    def handle(self, *args, **options):
+        sources = [options['source']] if options['source'] else sorted(ROLLUP_SOURCES)
+        for source in sources:
+            count = rebuild_search_rollups(source)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} {source} rollup rows'))
@@ -0,0 +1,104 @@
+import re
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+PRODUCT_DOCUMENT_FIELDS = (
+    'product_name', 'product_brand', 'product_model', 'tags', 'product_description',
+)
+SERVICE_DOCUMENT_FIELDS = (
+    'service_name', 'provider_name', 'provider_title', 'tags',
+    'provider_expertise', 'service_description',
+)
+
+PRODUCT_VECTOR_SQL = """
+    UPDATE main_products SET search_vector =
+        setweight(to_tsvector('english', coalesce(product_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(product_brand, '') || ' ' || coalesce(product_model, '') || ' ' || coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(search_document, '')), 'D')
+"""
+SERVICE_VECTOR_SQL = """
+    UPDATE main_services SET search_vector =
+        setweight(to_tsvector('english', coalesce(service_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(provider_name, '') || ' ' || coalesce(provider_title, '') || ' ' || coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(search_document, '')), 'D')
+"""
+
+
+def _document(instance, fields):
+    parts = [getattr(instance, field) for field in fields]
+    category = instance.category
+    parts.append(category.name)
+    if category.parent_id:
+        parts.append(category.parent.name)
+    text = ' '.join(str(part) for part in parts if part)
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def build_search_index(apps, schema_editor):
+    Products = apps.get_model('main', 'Products')
+    Services = apps.get_model('main', 'Services')
+
+    for model, fields in ((Products, PRODUCT_DOCUMENT_FIELDS), (Services, SERVICE_DOCUMENT_FIELDS)):
+        batch = []
+        for instance in model.objects.select_related('category__parent').iterator(chunk_size=500):
+            instance.search_document = _document(instance, fields)
+            batch.append(instance)
+            if len(batch) >= 500:
+                model.objects.bulk_update(batch, ['search_document'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['search_document'])
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(PRODUCT_VECTOR_SQL)
+    schema_editor.execute(SERVICE_VECTOR_SQL)
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS main_products_search_vector_gin "
+        "ON main_products USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS main_services_search_vector_gin "
+        "ON main_services USING gin (search_vector)"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS main_products_search_vector_gin")
+    schema_editor.execute("DROP INDEX IF EXISTS main_services_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_city_state_productrating_product_productrating_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='products',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='services',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='services',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
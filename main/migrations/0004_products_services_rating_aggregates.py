@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    for listing_name, rating_name, fk_name in (
+        ('Products', 'ProductRating', 'product'),
+        ('Services', 'ServiceRating', 'service'),
+    ):
+        Listing = apps.get_model('main', listing_name)
+        Rating = apps.get_model('main', rating_name)
+
+        ratings = Rating.objects.filter(
+            **{fk_name: OuterRef('pk')}, is_active=True
+        ).order_by().values(fk_name)
+        Listing.objects.update(
+            rating_sum=Coalesce(
+                Subquery(ratings.annotate(total=Sum('rating')).values('total')),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=1),
+            ),
+            rating_count=Coalesce(
+                Subquery(ratings.annotate(count=Count('pk')).values('count')),
+                Value(0),
+            ),
+        )
+        for listing in Listing.objects.filter(rating_count__gt=0).only('pk', 'rating_sum', 'rating_count').iterator():
+            listing.rating_avg = (listing.rating_sum / listing.rating_count).quantize(Decimal('0.01'))
+            listing.save(update_fields=['rating_avg'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_products_services_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='products',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='products',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='services',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='services',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='services',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['product_status', 'rating_avg'], name='main_produc_product_0e6841_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='services',
+            index=models.Index(fields=['service_status', 'rating_avg'], name='main_servic_service_410ed1_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
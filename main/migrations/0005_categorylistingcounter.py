@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+KEY_FIELDS = ('category_id', 'country_id', 'state_id', 'city_id')
+
+
+def build_counters(apps, schema_editor):
+    Counter = apps.get_model('main', 'CategoryListingCounter')
+
+    for model_name, kind, status_field in (
+        ('Products', 'product', 'product_status'),
+        ('Services', 'service', 'service_status'),
+    ):
+        Listing = apps.get_model('main', model_name)
+        rows = (
+            Listing.objects.filter(**{status_field: 'published'})
+            .order_by().values(*KEY_FIELDS).annotate(total=Count('id'))
+        )
+        Counter.objects.bulk_create([
+            Counter(kind=kind, count=row['total'], **{field: row[field] for field in KEY_FIELDS})
+            for row in rows
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_products_services_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryListingCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('service', 'Service')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listing_counters', to='main.category')),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_counters', to='main.city')),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_counters', to='main.country')),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_counters', to='main.state')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['kind', 'country'], name='main_catego_kind_c7e390_idx'),
+                    models.Index(fields=['kind', 'state'], name='main_catego_kind_5f96c5_idx'),
+                    models.Index(fields=['kind', 'city'], name='main_catego_kind_7198f8_idx'),
+                ],
+                'unique_together': {('category', 'kind', 'country', 'state', 'city')},
+            },
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
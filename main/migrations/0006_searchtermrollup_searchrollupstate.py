@@ -0,0 +1,45 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_categorylistingcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['created_at'], name='main_search_created_795d6e_idx'),
+        ),
+        migrations.CreateModel(
+            name='SearchTermRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('site', 'Site Search'), ('chatbot', 'Chatbot')], max_length=10)),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=10)),
+                ('period_start', models.DateTimeField()),
+                ('term', models.CharField(max_length=200)),
+                ('search_count', models.PositiveIntegerField(default=0)),
+                ('results_total', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_rollups', to='main.country')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['source', 'granularity', 'period_start'], name='main_search_source_da0943_idx'),
+                ],
+                'unique_together': {('source', 'granularity', 'period_start', 'term', 'country')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('site', 'Site Search'), ('chatbot', 'Chatbot')], max_length=10, unique=True)),
+                ('rolled_up_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
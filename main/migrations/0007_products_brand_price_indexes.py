@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_searchtermrollup_searchrollupstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['product_status', 'product_brand'], name='main_produc_product_bd12ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['product_status', 'product_price'], name='main_produc_product_294022_idx'),
+        ),
+    ]
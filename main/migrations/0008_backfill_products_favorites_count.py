@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_favorites_count(apps, schema_editor):
+    # favorites_count was never maintained before the UserFavorite signals
+    Products = apps.get_model('main', 'Products')
+    UserFavorite = apps.get_model('main', 'UserFavorite')
+
+    favorites = (
+        UserFavorite.objects.filter(product=OuterRef('pk')).order_by()
+        .values('product').annotate(total=Count('pk')).values('total')
+    )
+    Products.objects.update(favorites_count=Coalesce(Subquery(favorites), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_products_brand_price_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_favorites_count, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,20 @@
 # models.py - Enhanced Location Models
 from django.db import models
+from django.db.models import Q
+from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.core.validators import RegexValidator
 from cloudinary.models import CloudinaryField
 import uuid
 from django.utils.text import slugify
+from django.contrib.postgres.search import SearchVectorField
+from .search import (
+    build_search_document, get_indexed_source_fields,
+    rebuild_search_index, refresh_search_vectors,
+)
+from .category_tree import category_tree, descendant_ids
+from .counters import ListingQuerySet
+from . import buffered_counters
 
 # ===========================
 #  ENHANCED LOCATION MODELS
@@ -122,6 +132,7 @@ class Category(models.Model):
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     sort_order = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -137,7 +148,39 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+
+        if self.pk and self.parent_id and self._parent_is_in_own_subtree():
+            raise ValidationError("A category cannot be moved under itself or one of its subcategories.")
+
+        renamed = False
+        if self.pk:
+            previous_name = Category.objects.filter(pk=self.pk).values_list('name', flat=True).first()
+            renamed = previous_name is not None and previous_name != self.name
+
         super().save(*args, **kwargs)
+
+        if renamed:
+            self.reindex_listings()
+
+    def _parent_is_in_own_subtree(self):
+        """
+        Walk up from the new parent in the database; the cached tree can lag
+        behind edits made in other workers.
+        """
+        seen = set()
+        category_id = self.parent_id
+        while category_id is not None and category_id not in seen:
+            if category_id == self.pk:
+                return True
+            seen.add(category_id)
+            category_id = Category.objects.filter(pk=category_id).values_list('parent_id', flat=True).first()
+        return False
+
+    def reindex_listings(self):
+        """Rebuild the search index for listings in this category and its children"""
+        category_filter = Q(category=self) | Q(category__parent=self)
+        rebuild_search_index(Products.objects.filter(category_filter))
+        rebuild_search_index(Services.objects.filter(category_filter))
     
     def __str__(self):
         if self.parent:
@@ -145,6 +188,9 @@ class Category(models.Model):
         return self.name
     
     def get_full_path(self):
+        snapshot = category_tree.snapshot()
+        if self.pk in snapshot.nodes:
+            return snapshot.full_path(self.pk)
         if self.parent:
             return f"{self.parent.get_full_path()} > {self.name}"
         return self.name
@@ -152,18 +198,52 @@ class Category(models.Model):
     def get_children(self):
         return self.subcategories.filter(is_active=True).order_by('sort_order', 'name')
     
+    def get_descendant_ids(self, include_self=True):
+        """Ids of this category and its active subcategories, from the cached tree"""
+        return descendant_ids(self.pk, include_self=include_self)
+    
     def get_all_products(self):
         """Get all products in this category and subcategories"""
-        categories = [self]
-        categories.extend(self.get_all_subcategories())
-        return Products.objects.filter(category__in=categories, product_status='published')
+        return Products.objects.filter(category_id__in=self.get_descendant_ids(), product_status='published')
     
     def get_all_subcategories(self):
-        """Recursively get all subcategories"""
-        subcategories = list(self.subcategories.filter(is_active=True))
-        for subcat in list(subcategories):
-            subcategories.extend(subcat.get_all_subcategories())
-        return subcategories
+        """Get all active subcategories at any depth in a single query"""
+        ids = self.get_descendant_ids(include_self=False)
+        if not ids:
+            return []
+        categories = Category.objects.in_bulk(ids)
+        return [categories[pk] for pk in ids if pk in categories]
+
+
+# ===========================
+#  CATEGORY LISTING COUNTERS
+# ===========================
+
+class CategoryListingCounter(models.Model):
+    """Published listings per category, location and kind (maintained by main.signals)"""
+    KIND_CHOICES = [
+        ('product', 'Product'),
+        ('service', 'Service'),
+    ]
+    
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='listing_counters')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='category_counters')
+    state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='category_counters')
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='category_counters')
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('category', 'kind', 'country', 'state', 'city')
+        indexes = [
+            models.Index(fields=['kind', 'country']),
+            models.Index(fields=['kind', 'state']),
+            models.Index(fields=['kind', 'city']),
+        ]
+    
+    def __str__(self):
+        return f"{self.category.name} / {self.city.name} ({self.kind}): {self.count}"
 
 
 # ===========================
@@ -241,6 +321,11 @@ class Products(models.Model):
     views_count = models.PositiveIntegerField(default=0)
     favorites_count = models.PositiveIntegerField(default=0)
     
+    # Rating Aggregates (maintained by main.signals)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    
     # SEO
     meta_title = models.CharField(max_length=160, blank=True, null=True)
     meta_description = models.CharField(max_length=320, blank=True, null=True)
@@ -251,6 +336,12 @@ class Products(models.Model):
     published_at = models.DateTimeField(blank=True, null=True)
     expires_at = models.DateTimeField(blank=True, null=True)
     
+    # Search Index
+    search_document = models.TextField(blank=True, default='', editable=False)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    
+    objects = ListingQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-is_promoted', '-is_featured', '-created_at']
         verbose_name_plural = "Products"
@@ -260,6 +351,9 @@ class Products(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['slug']),
             models.Index(fields=['user', 'product_status']),
+            models.Index(fields=['product_status', 'rating_avg']),
+            models.Index(fields=['product_status', 'product_brand']),
+            models.Index(fields=['product_status', 'product_price']),
         ]
     
     def save(self, *args, **kwargs):
@@ -269,8 +363,21 @@ class Products(models.Model):
         # Auto-set currency based on country
         if not self.currency and self.country and self.country.currency_code:
             self.currency = self.country.currency_code
-            
+        
+        reindex = self._prepare_search_document(kwargs)
         super().save(*args, **kwargs)
+        if reindex:
+            refresh_search_vectors(type(self).objects.filter(pk=self.pk))
+    
+    def _prepare_search_document(self, save_kwargs):
+        """Refresh search_document unless the save only touches unindexed fields"""
+        update_fields = save_kwargs.get('update_fields')
+        if update_fields is not None:
+            if not set(update_fields) & get_indexed_source_fields(type(self)):
+                return False
+            save_kwargs['update_fields'] = set(update_fields) | {'search_document'}
+        self.search_document = build_search_document(self)
+        return True
     
     def get_currency_symbol(self):
         return self.country.currency_symbol if self.country and self.country.currency_symbol else '$'
@@ -285,13 +392,7 @@ class Products(models.Model):
         return 0
     
     def average_rating(self):
-        ratings = self.product_ratings.filter(is_active=True)
-        if ratings.exists():
-            return round(sum(float(r.rating) for r in ratings) / ratings.count(), 1)
-        return 0
-    
-    def rating_count(self):
-        return self.product_ratings.filter(is_active=True).count()
+        return round(float(self.rating_avg), 1)
     
     def get_absolute_url(self):
         return f"/products/{self.slug}/"
@@ -300,8 +401,9 @@ class Products(models.Model):
         return f"{self.city.name}, {self.state.name}, {self.country.name}"
     
     def increment_views(self):
+        """Buffered increment; flushed to the DB by main.tasks.flush_buffered_counters"""
+        buffered_counters.increment(type(self), self.pk, 'views_count')
         self.views_count += 1
-        self.save(update_fields=['views_count'])
     
     def get_tags_list(self):
         if self.tags:
@@ -410,6 +512,11 @@ class Services(models.Model):
     views_count = models.PositiveIntegerField(default=0)
     contacts_count = models.PositiveIntegerField(default=0)
     
+    # Rating Aggregates (maintained by main.signals)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    
     # SEO
     meta_title = models.CharField(max_length=160, blank=True, null=True)
     meta_description = models.CharField(max_length=320, blank=True, null=True)
@@ -420,6 +527,12 @@ class Services(models.Model):
     published_at = models.DateTimeField(blank=True, null=True)
     expires_at = models.DateTimeField(blank=True, null=True)
     
+    # Search Index
+    search_document = models.TextField(blank=True, default='', editable=False)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    
+    objects = ListingQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-is_promoted', '-is_featured', '-created_at']
         verbose_name_plural = "Services"
@@ -429,6 +542,7 @@ class Services(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['slug']),
             models.Index(fields=['user', 'service_status']),
+            models.Index(fields=['service_status', 'rating_avg']),
         ]
     
     def save(self, *args, **kwargs):
@@ -437,8 +551,21 @@ class Services(models.Model):
         
         if not self.currency and self.country and self.country.currency_code:
             self.currency = self.country.currency_code
-            
+        
+        reindex = self._prepare_search_document(kwargs)
         super().save(*args, **kwargs)
+        if reindex:
+            refresh_search_vectors(type(self).objects.filter(pk=self.pk))
+    
+    def _prepare_search_document(self, save_kwargs):
+        """Refresh search_document unless the save only touches unindexed fields"""
+        update_fields = save_kwargs.get('update_fields')
+        if update_fields is not None:
+            if not set(update_fields) & get_indexed_source_fields(type(self)):
+                return False
+            save_kwargs['update_fields'] = set(update_fields) | {'search_document'}
+        self.search_document = build_search_document(self)
+        return True
     
     def get_currency_symbol(self):
         return self.country.currency_symbol if self.country and self.country.currency_symbol else '$'
@@ -452,13 +579,7 @@ class Services(models.Model):
         return "Contact for pricing"
     
     def average_rating(self):
-        ratings = self.service_ratings.filter(is_active=True)
-        if ratings.exists():
-            return round(sum(float(r.rating) for r in ratings) / ratings.count(), 1)
-        return 0
-    
-    def rating_count(self):
-        return self.service_ratings.filter(is_active=True).count()
+        return round(float(self.rating_avg), 1)
     
     def get_absolute_url(self):
         return f"/services/{self.slug}/"
@@ -467,12 +588,14 @@ class Services(models.Model):
         return f"{self.city.name}, {self.state.name}, {self.country.name}"
     
     def increment_views(self):
+        """Buffered increment; flushed to the DB by main.tasks.flush_buffered_counters"""
+        buffered_counters.increment(type(self), self.pk, 'views_count')
         self.views_count += 1
-        self.save(update_fields=['views_count'])
     
     def increment_contacts(self):
+        """Buffered increment; flushed to the DB by main.tasks.flush_buffered_counters"""
+        buffered_counters.increment(type(self), self.pk, 'contacts_count')
         self.contacts_count += 1
-        self.save(update_fields=['contacts_count'])
     
     def get_tags_list(self):
         if self.tags:
@@ -597,7 +720,53 @@ class SearchHistory(models.Model):
             models.Index(fields=['search_term', 'created_at']),
             models.Index(fields=['country', 'state', 'city']),
             models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+
+class SearchTermRollup(models.Model):
+    """Search counts per normalized term, period and country (maintained by main.search_rollups)"""
+    SOURCE_CHOICES = [
+        ('site', 'Site Search'),
+        ('chatbot', 'Chatbot'),
+    ]
+    
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    term = models.CharField(max_length=200)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, blank=True, null=True, related_name='search_rollups')
+    search_count = models.PositiveIntegerField(default=0)
+    results_total = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('source', 'granularity', 'period_start', 'term', 'country')
+        indexes = [
+            models.Index(fields=['source', 'granularity', 'period_start']),
         ]
+    
+    def __str__(self):
+        return f"{self.term} ({self.source}, {self.granularity} {self.period_start:%Y-%m-%d %H:00}): {self.search_count}"
+    
+    @property
+    def avg_results(self):
+        return self.results_total / self.search_count if self.search_count else 0
+
+
+class SearchRollupState(models.Model):
+    """How far each search source has been rolled up"""
+    source = models.CharField(max_length=10, choices=SearchTermRollup.SOURCE_CHOICES, unique=True)
+    rolled_up_until = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.source}: {self.rolled_up_until}"
 
 
 class LocationCache(models.Model):
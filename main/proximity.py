@@ -0,0 +1,168 @@
+# main/proximity.py - Grid index over City coordinates for radius ("nearby") search
+import logging
+import math
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+
+from .snapshots import VersionedSnapshotHolder
+
+logger = logging.getLogger(__name__)
+
+PROXIMITY_VERSION_CACHE_KEY = 'proximity_index_version'
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195
+# Listings are ordered by these distance bands; tier 0 is the city itself
+DEFAULT_DISTANCE_TIERS_KM = (10, 25, 50, 100, 250)
+
+
+def get_proximity_setting(name, default):
+    return getattr(settings, 'SEARCH_SETTINGS', {}).get(name, default)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two coordinates in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# ===========================
+#  DISTANCE TIERS
+# ===========================
+
+def tier_bounds(radius_km):
+    """Upper distance of each tier, ending at the search radius"""
+    tiers = get_proximity_setting('PROXIMITY_DISTANCE_TIERS_KM', DEFAULT_DISTANCE_TIERS_KM)
+    return [0.0] + [float(km) for km in tiers if km < radius_km] + [float(radius_km)]
+
+
+def group_by_tier(distances, radius_km):
+    """[[city ids in tier 0], [tier 1], ...] for a {city_id: km} mapping"""
+    bounds = tier_bounds(radius_km)
+    tiers = [[] for _ in bounds]
+    for city_id, km in distances.items():
+        tiers[bisect_left(bounds, km)].append(city_id)
+    return tiers
+
+
+def distance_tier_case(distances, radius_km, field='city_id', fallback=()):
+    """
+    Case expression giving each listing the distance tier of its city:
+    0 for the city itself, then one tier per band in PROXIMITY_DISTANCE_TIERS_KM.
+    fallback is a list of (lookup, value) pairs for listings outside the radius,
+    e.g. the same state for cities without coordinates.
+    """
+    tiers = group_by_tier(distances, radius_km)
+    whens = [When(**{f'{field}__in': ids}, then=Value(tier)) for tier, ids in enumerate(tiers) if ids]
+    whens += [When(**{lookup: value}, then=Value(len(tiers) + offset)) for offset, (lookup, value) in enumerate(fallback)]
+    return Case(*whens, default=Value(len(tiers) + len(fallback)), output_field=IntegerField())
+
+
+# ===========================
+#  GRID INDEX
+# ===========================
+
+class ProximitySnapshot:
+    """
+    Immutable grid index over every active city with coordinates.
+
+    Cities are bucketed into square cells of PROXIMITY_CELL_KM. A radius
+    query only measures the cities in the cells its bounding box covers,
+    instead of running haversine against every city in the table.
+    """
+
+    def __init__(self, cities, version=None):
+        # cities: (id, latitude, longitude, state_id, country_id)
+        self.version = version
+        self.cell_km = get_proximity_setting('PROXIMITY_CELL_KM', 25)
+        self.cell_deg = self.cell_km / KM_PER_DEGREE
+        self.cities = {}
+        self.grid = {}
+        for city_id, latitude, longitude, state_id, country_id in cities:
+            latitude, longitude = float(latitude), float(longitude)
+            self.cities[city_id] = (latitude, longitude, state_id, country_id)
+            self.grid.setdefault(self._cell(latitude, longitude), []).append(city_id)
+
+        self.max_memo = get_proximity_setting('PROXIMITY_MEMO_SIZE', 5000)
+        self._memo = {}
+
+    def _cell(self, latitude, longitude):
+        return int(math.floor(latitude / self.cell_deg)), int(math.floor(longitude / self.cell_deg))
+
+    def around(self, latitude, longitude, radius_km, limit=None):
+        """[(city_id, km)] within radius_km of a point, nearest first"""
+        lat_cells = int(math.ceil(radius_km / self.cell_km))
+        # Degrees of longitude shrink towards the poles, so more cells cover the same distance
+        lon_scale = max(math.cos(math.radians(latitude)), 0.01)
+        lon_cells = min(int(math.ceil(radius_km / (self.cell_km * lon_scale))), int(math.ceil(180 / self.cell_deg)))
+        row, column = self._cell(latitude, longitude)
+
+        found = []
+        for cell_row in range(row - lat_cells, row + lat_cells + 1):
+            for cell_column in range(column - lon_cells, column + lon_cells + 1):
+                for city_id in self.grid.get((cell_row, cell_column), ()):
+                    city_lat, city_lon = self.cities[city_id][:2]
+                    km = haversine_km(latitude, longitude, city_lat, city_lon)
+                    if km <= radius_km:
+                        found.append((city_id, km))
+        found.sort(key=lambda pair: pair[1])
+        return found[:limit] if limit else found
+
+    def nearby(self, city_id, radius_km, limit=None):
+        """
+        {city_id: km} for cities within radius_km of the city, itself included
+        at 0. Empty when the city has no coordinates.
+        """
+        key = (city_id, radius_km, limit)
+        distances = self._memo.get(key)
+        if distances is not None:
+            return distances
+
+        city = self.cities.get(city_id)
+        distances = {}
+        if city is not None:
+            distances = dict(self.around(city[0], city[1], radius_km, limit))
+            distances[city_id] = 0.0
+
+        if len(self._memo) >= self.max_memo:
+            self._memo.clear()
+        self._memo[key] = distances
+        return distances
+
+
+class ProximityIndex(VersionedSnapshotHolder):
+    """Process-wide proximity snapshot, rebuilt when a City changes"""
+
+    version_cache_key = PROXIMITY_VERSION_CACHE_KEY
+    name = 'proximity index'
+
+    @property
+    def check_interval(self):
+        return get_proximity_setting('PROXIMITY_CHECK_INTERVAL', 60)
+
+    def _load(self, version):
+        from .models import City
+
+        cities = list(
+            City.objects.filter(is_active=True, latitude__isnull=False, longitude__isnull=False)
+            .values_list('id', 'latitude', 'longitude', 'state_id', 'country_id')
+        )
+        logger.info(f"Loaded proximity index with {len(cities)} cities")
+        return ProximitySnapshot(cities, version=version)
+
+
+proximity_index = ProximityIndex()
+
+
+def nearby_city_distances(city_id, radius_km, limit=None):
+    """{city_id: km} around a city, itself included; empty if it has no coordinates"""
+    if limit is None:
+        limit = get_proximity_setting('PROXIMITY_MAX_CITIES', 500)
+    try:
+        return proximity_index.snapshot().nearby(city_id, radius_km, limit)
+    except Exception as e:
+        logger.error(f"Error finding cities near {city_id}: {str(e)}")
+        return {}
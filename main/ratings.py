@@ -0,0 +1,80 @@
+# main/ratings.py - Denormalized rating aggregates for products and services
+import logging
+from decimal import Decimal
+
+from django.db.models import (
+    F, Value, Case, When, Sum, Count, Subquery, OuterRef,
+    DecimalField, IntegerField, ExpressionWrapper,
+)
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+# Listing model label -> (reverse accessor for its ratings, rating FK field name)
+RATING_RELATIONS = {
+    'main.Products': ('product_ratings', 'product'),
+    'main.Services': ('service_ratings', 'service'),
+}
+
+# Rating model label -> FK field pointing at the rated listing
+RATING_MODEL_FKS = {
+    'main.ProductRating': 'product',
+    'main.ServiceRating': 'service',
+}
+
+AVG_FIELD = DecimalField(max_digits=3, decimal_places=2)
+SUM_FIELD = DecimalField(max_digits=12, decimal_places=1)
+
+
+def apply_rating_delta(listing_model, listing_id, sum_delta, count_delta):
+    """
+    Shift a listing's stored rating aggregates in a single UPDATE.
+
+    The new average is derived from the stored sum/count on the database side,
+    so concurrent rating writes cannot overwrite each other's contribution.
+    """
+    if not listing_id or (not sum_delta and not count_delta):
+        return 0
+
+    new_sum = F('rating_sum') + Value(Decimal(sum_delta), output_field=SUM_FIELD)
+    new_count = F('rating_count') + Value(count_delta, output_field=IntegerField())
+
+    return listing_model.objects.filter(pk=listing_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=Case(
+            When(rating_count__lte=-count_delta, then=Value(Decimal('0'), output_field=AVG_FIELD)),
+            default=ExpressionWrapper(new_sum / new_count, output_field=AVG_FIELD),
+            output_field=AVG_FIELD,
+        ),
+    )
+
+
+def rebuild_rating_aggregates(listing_model, queryset=None):
+    """Recompute rating_sum/rating_count/rating_avg from the rating rows"""
+    related_name, fk_name = RATING_RELATIONS[listing_model._meta.label]
+    rating_model = listing_model._meta.get_field(related_name).related_model
+
+    ratings = rating_model.objects.filter(
+        **{fk_name: OuterRef('pk')}, is_active=True
+    ).order_by().values(fk_name)
+
+    total = Subquery(ratings.annotate(total=Sum('rating')).values('total'), output_field=SUM_FIELD)
+    count = Subquery(ratings.annotate(count=Count('pk')).values('count'), output_field=IntegerField())
+
+    queryset = queryset if queryset is not None else listing_model.objects.all()
+    updated = queryset.order_by().update(
+        rating_sum=Coalesce(total, Value(Decimal('0'), output_field=SUM_FIELD)),
+        rating_count=Coalesce(count, Value(0)),
+    )
+    # Second pass so the average divides the freshly stored columns
+    queryset.order_by().update(
+        rating_avg=Case(
+            When(rating_count=0, then=Value(Decimal('0'), output_field=AVG_FIELD)),
+            default=ExpressionWrapper(F('rating_sum') / F('rating_count'), output_field=AVG_FIELD),
+            output_field=AVG_FIELD,
+        )
+    )
+
+    logger.info(f"Rebuilt rating aggregates for {updated} {listing_model._meta.verbose_name_plural}")
+    return updated
@@ -0,0 +1,39 @@
+# main/redis_client.py - Shared Redis connection for counters and queues
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def get_redis_client():
+    """
+    Return a process-wide Redis client for REDIS_URL, or None if Redis is not
+    configured. Callers must fall back to the database on RedisError.
+    """
+    global _client
+
+    if _client is None:
+        url = getattr(settings, 'REDIS_URL', None)
+        if not url:
+            return None
+        try:
+            import redis
+            _client = redis.Redis.from_url(
+                url,
+                socket_connect_timeout=1,
+                socket_timeout=1,
+                health_check_interval=30,
+            )
+        except Exception as e:
+            logger.error(f"Error creating Redis client: {str(e)}")
+            return None
+    return _client
+
+
+def redis_key(*parts):
+    """Namespaced key sharing the cache KEY_PREFIX"""
+    prefix = settings.CACHES.get('default', {}).get('KEY_PREFIX', '')
+    return ':'.join(str(part) for part in (prefix, *parts) if part != '')
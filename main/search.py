@@ -0,0 +1,190 @@
+# main/search.py - Full-text search index for products and services
+import re
+import logging
+
+from django.db import connections, models
+from django.db.models import Q, F, Value, FloatField, Case, When
+from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'english'
+
+# ===========================
+#  INDEX DEFINITIONS
+# ===========================
+
+# Per-model description of what goes into the search index:
+#   name     - primary title field, used for fallback ranking
+#   document - text fields concatenated into ``search_document``
+#   weights  - stored fields feeding ``search_vector`` on PostgreSQL
+SEARCH_INDEX_FIELDS = {
+    'main.Products': {
+        'name': 'product_name',
+        'document': (
+            'product_name', 'product_brand', 'product_model', 'tags', 'product_description',
+        ),
+        'weights': (
+            ('A', ('product_name',)),
+            ('B', ('product_brand', 'product_model', 'tags')),
+            ('D', ('search_document',)),
+        ),
+    },
+    'main.Services': {
+        'name': 'service_name',
+        'document': (
+            'service_name', 'provider_name', 'provider_title', 'tags',
+            'provider_expertise', 'service_description',
+        ),
+        'weights': (
+            ('A', ('service_name',)),
+            ('B', ('provider_name', 'provider_title', 'tags')),
+            ('D', ('search_document',)),
+        ),
+    },
+}
+
+
+def get_index_definition(model):
+    """Return the search index definition for a listing model"""
+    return SEARCH_INDEX_FIELDS[model._meta.label]
+
+
+def get_indexed_source_fields(model):
+    """Fields whose change requires the search document to be rebuilt"""
+    return set(get_index_definition(model)['document']) | {'category'}
+
+
+def uses_full_text(model_or_queryset):
+    """True when the queryset's database supports the stored search vector"""
+    if isinstance(model_or_queryset, models.QuerySet):
+        alias = model_or_queryset.db
+    else:
+        alias = 'default'
+    return connections[alias].vendor == 'postgresql'
+
+
+# ===========================
+#  DOCUMENT & VECTOR BUILDING
+# ===========================
+
+def build_search_document(instance):
+    """Build the normalized text document stored on a listing"""
+    definition = get_index_definition(type(instance))
+    parts = [getattr(instance, field, None) for field in definition['document']]
+
+    category = getattr(instance, 'category', None) if instance.category_id else None
+    if category is not None:
+        parts.append(category.name)
+        if category.parent_id:
+            parts.append(category.parent.name)
+
+    text = ' '.join(str(part) for part in parts if part)
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def build_search_vector(model):
+    """Weighted SearchVector expression over the model's stored columns"""
+    vector = None
+    for weight, fields in get_index_definition(model)['weights']:
+        part = SearchVector(*fields, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def refresh_search_vectors(queryset):
+    """Recompute ``search_vector`` in a single UPDATE for the given rows"""
+    if not uses_full_text(queryset):
+        return 0
+    return queryset.order_by().update(search_vector=build_search_vector(queryset.model))
+
+
+def rebuild_search_index(queryset, batch_size=500):
+    """Rebuild ``search_document`` and ``search_vector`` for the given rows"""
+    model = queryset.model
+    updated = 0
+    batch = []
+
+    for instance in queryset.select_related('category__parent').order_by('pk').iterator(chunk_size=batch_size):
+        instance.search_document = build_search_document(instance)
+        batch.append(instance)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['search_document'])
+            updated += len(batch)
+            batch = []
+
+    if batch:
+        model.objects.bulk_update(batch, ['search_document'])
+        updated += len(batch)
+
+    refresh_search_vectors(model.objects.filter(pk__in=queryset.values('pk')))
+    logger.info(f"Rebuilt search index for {updated} {model._meta.verbose_name_plural}")
+    return updated
+
+
+class SearchIndexedQuerySet(models.QuerySet):
+    """QuerySet that keeps the search index in sync on bulk updates"""
+
+    def update(self, **kwargs):
+        touched = set(kwargs) & get_indexed_source_fields(self.model)
+        if not touched:
+            return super().update(**kwargs)
+
+        pks = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        if pks:
+            rebuild_search_index(self.model.objects.filter(pk__in=pks))
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if set(fields) & get_indexed_source_fields(self.model):
+            rebuild_search_index(self.model.objects.filter(pk__in=[obj.pk for obj in objs]))
+        return rows
+
+
+# ===========================
+#  RANKED SEARCH API
+# ===========================
+
+def tokenize_query(query):
+    """Split a free-text query into lowercase alphanumeric terms"""
+    if not query:
+        return []
+    return re.findall(r'[^\W_]+', str(query).lower())
+
+
+def search_listings(queryset, query):
+    """
+    Filter a Products/Services queryset by a free-text query.
+
+    Every term must match (AND semantics). Results are annotated with
+    ``search_rank``; callers decide the final ordering.
+    """
+    terms = tokenize_query(query)
+    if not terms:
+        # Punctuation-only queries match nothing, but callers still order by rank
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if uses_full_text(queryset):
+        search_query = SearchQuery(
+            ' & '.join(f"{term}:*" for term in terms),
+            search_type='raw',
+            config=SEARCH_CONFIG,
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        )
+
+    # Fallback for databases without tsvector support (e.g. SQLite in tests)
+    name_field = get_index_definition(queryset.model)['name']
+    term_filter = Q()
+    rank = Value(0.0, output_field=FloatField())
+    for term in terms:
+        term_filter &= Q(search_document__contains=term)
+        rank = rank + Case(
+            When(**{f'{name_field}__icontains': term}, then=Value(1.0)),
+            default=Value(0.1),
+            output_field=FloatField(),
+        )
+    return queryset.filter(term_filter).annotate(search_rank=rank)
@@ -0,0 +1,163 @@
+# main/search_events.py - Batched search-history logging
+import json
+import logging
+
+from django.db import DataError, IntegrityError
+
+from .redis_client import get_redis_client, redis_key
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY_PARTS = ('search_events',)
+
+# Held while a flush runs so overlapping flushes never write the same batch twice
+FLUSH_LOCK_SECONDS = 300
+
+EVENT_FIELDS = (
+    'user_id', 'search_term', 'category_id', 'country_id', 'state_id', 'city_id',
+    'search_type', 'results_count', 'ip_address',
+)
+
+
+def _queue_key():
+    return redis_key(*QUEUE_KEY_PARTS)
+
+
+def _flush_lock_key():
+    return redis_key(*QUEUE_KEY_PARTS, 'flush_lock')
+
+
+def _clean_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def build_search_event(request, search_term, results_count, search_type='both',
+                       category_id=None, country_id=None, state_id=None, city_id=None,
+                       ip_address=None):
+    """Plain-dict search event, safe to serialize onto the queue"""
+    user = getattr(request, 'user', None)
+    return {
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'search_term': search_term.strip()[:200],
+        'category_id': _clean_id(category_id),
+        'country_id': _clean_id(country_id),
+        'state_id': _clean_id(state_id),
+        'city_id': _clean_id(city_id),
+        'search_type': search_type,
+        'results_count': max(int(results_count or 0), 0),
+        'ip_address': ip_address or None,
+    }
+
+
+def log_search_event(event):
+    """
+    Enqueue a search event for the background writer.
+    Falls back to a direct INSERT when Redis is unavailable.
+    """
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.rpush(_queue_key(), json.dumps(event))
+            return
+        except Exception as e:
+            logger.error(f"Error queueing search event: {str(e)}")
+
+    try:
+        _write_events([event])
+    except Exception as e:
+        logger.error(f"Error writing search event: {str(e)}")
+
+
+def _write_events(events):
+    """
+    Insert events into SearchHistory. Returns rows written.
+
+    Rows rejected by the database (e.g. referencing a since-deleted category
+    or location) are logged and dropped; any other database error is raised
+    so the caller can keep the batch for a later retry.
+    """
+    from .models import SearchHistory
+
+    rows = [
+        SearchHistory(**{field: event.get(field) for field in EVENT_FIELDS})
+        for event in events
+    ]
+    try:
+        SearchHistory.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+    except (IntegrityError, DataError) as e:
+        # One bad row fails the whole batch; retry one by one to keep the rest
+        logger.error(f"Error bulk writing search history, retrying individually: {str(e)}")
+
+    written = 0
+    for event, row in zip(events, rows):
+        try:
+            row.save()
+            written += 1
+        except (IntegrityError, DataError) as e:
+            logger.error(f"Dropping search event {event}: {str(e)}")
+    return written
+
+
+def flush_search_events(batch_size=1000, max_batches=20):
+    """
+    Drain queued search events into SearchHistory with bulk_create.
+
+    A batch is only trimmed off the queue once it has been written, so
+    events survive a database outage and are retried on the next flush.
+    Producers only append, so the head of the list is still the batch read.
+    """
+    client = get_redis_client()
+    if client is None:
+        return 0
+
+    lock_key = _flush_lock_key()
+    try:
+        if not client.set(lock_key, 1, nx=True, ex=FLUSH_LOCK_SECONDS):
+            return 0
+    except Exception as e:
+        logger.error(f"Error taking search event flush lock: {str(e)}")
+        return 0
+
+    try:
+        return _drain_queue(client, batch_size, max_batches)
+    finally:
+        try:
+            client.delete(lock_key)
+        except Exception as e:
+            logger.error(f"Error releasing search event flush lock: {str(e)}")
+
+
+def _drain_queue(client, batch_size, max_batches):
+    key = _queue_key()
+    written = 0
+    for _ in range(max_batches):
+        try:
+            raw_events = client.lrange(key, 0, batch_size - 1)
+        except Exception as e:
+            logger.error(f"Error reading search event queue: {str(e)}")
+            break
+
+        if not raw_events:
+            break
+
+        events = []
+        for raw in raw_events:
+            try:
+                events.append(json.loads(raw))
+            except (TypeError, ValueError):
+                logger.error("Dropping malformed search event")
+
+        written += _write_events(events)
+        try:
+            client.ltrim(key, len(raw_events), -1)
+        except Exception as e:
+            logger.error(f"Error trimming search event queue: {str(e)}")
+            break
+        if len(raw_events) < batch_size:
+            break
+
+    return written
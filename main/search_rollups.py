@@ -0,0 +1,191 @@
+# main/search_rollups.py - Hourly/daily search-term rollups for trending and suggestions
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Lower, Trim, TruncHour
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Rollup source -> (raw model label, term field, results field, country field or None)
+ROLLUP_SOURCES = {
+    'site': ('main.SearchHistory', 'search_term', 'results_count', 'country_id'),
+    'chatbot': ('chatbot.SearchQuery', 'query_text', 'total_results_shown', None),
+}
+
+
+def get_rollup_setting(name, default):
+    return getattr(settings, 'SEARCH_SETTINGS', {}).get(name, default)
+
+
+def normalize_term(term):
+    """Lowercase and collapse whitespace so 'iPhone  13' and 'iphone 13' share a row"""
+    return ' '.join((term or '').lower().split())[:200]
+
+
+def _day_start(moment):
+    return timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _get_models():
+    return apps.get_model('main', 'SearchTermRollup'), apps.get_model('main', 'SearchRollupState')
+
+
+# ===========================
+#  ROLLING UP
+# ===========================
+
+def _aggregate_raw(source, start, end):
+    """{(granularity, period_start, term, country_id): [count, results]} for raw rows in [start, end)"""
+    label, term_field, results_field, country_field = ROLLUP_SOURCES[source]
+    raw_model = apps.get_model(label)
+
+    queryset = raw_model.objects.filter(created_at__lt=end)
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+
+    group_fields = ['period', 'raw_term'] + ([country_field] if country_field else [])
+    rows = (
+        queryset.order_by()
+        .annotate(period=TruncHour('created_at'), raw_term=Lower(Trim(term_field)))
+        .values(*group_fields)
+        .annotate(searches=Count('pk'), results=Sum(results_field))
+    )
+
+    totals = {}
+    for row in rows.iterator():
+        term = normalize_term(row['raw_term'])
+        if not term:
+            continue
+        country_id = row[country_field] if country_field else None
+        for granularity, period in (('hour', row['period']), ('day', _day_start(row['period']))):
+            bucket = totals.setdefault((granularity, period, term, country_id), [0, 0])
+            bucket[0] += row['searches']
+            bucket[1] += row['results'] or 0
+    return totals
+
+
+def _apply_totals(source, totals):
+    """Add aggregated counts onto existing rollup rows, creating missing ones"""
+    Rollup, _ = _get_models()
+    if not totals:
+        return 0
+
+    periods = {key[1] for key in totals}
+    terms = {key[2] for key in totals}
+    existing = {
+        (row.granularity, row.period_start, row.term, row.country_id): row
+        for row in Rollup.objects.filter(source=source, period_start__in=periods, term__in=terms)
+    }
+
+    to_create, to_update = [], []
+    for key, (searches, results) in totals.items():
+        row = existing.get(key)
+        if row is None:
+            granularity, period, term, country_id = key
+            to_create.append(Rollup(
+                source=source, granularity=granularity, period_start=period, term=term,
+                country_id=country_id, search_count=searches, results_total=results,
+            ))
+        else:
+            row.search_count += searches
+            row.results_total += results
+            row.updated_at = timezone.now()
+            to_update.append(row)
+
+    Rollup.objects.bulk_create(to_create, batch_size=500)
+    Rollup.objects.bulk_update(to_update, ['search_count', 'results_total', 'updated_at'], batch_size=500)
+    return len(to_create) + len(to_update)
+
+
+def rollup_source(source, until=None):
+    """
+    Roll raw searches from one source into the rollup tables, picking up
+    where the previous run stopped. Returns the number of rollup rows written.
+
+    Rows newer than ROLLUP_LAG_SECONDS are left for the next run so searches
+    still being flushed into the raw table are not skipped.
+    """
+    _, State = _get_models()
+    lag = get_rollup_setting('ROLLUP_LAG_SECONDS', 60)
+    end = until or timezone.now() - timedelta(seconds=lag)
+
+    with transaction.atomic():
+        # The row lock keeps overlapping runs from counting the same window twice
+        State.objects.get_or_create(source=source)
+        state = State.objects.select_for_update().get(source=source)
+        start = state.rolled_up_until
+        if start is not None and start >= end:
+            return 0
+
+        written = _apply_totals(source, _aggregate_raw(source, start, end))
+        state.rolled_up_until = end
+        state.save(update_fields=['rolled_up_until', 'updated_at'])
+
+    if written:
+        logger.info(f"Rolled up {source} searches until {end.isoformat()}: {written} rows")
+    return written
+
+
+def prune_hourly_rollups():
+    """Hourly rows are only needed for the partial first day of a trending window"""
+    Rollup, _ = _get_models()
+    retention_days = get_rollup_setting('ROLLUP_HOURLY_RETENTION_DAYS', 8)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted, _ = Rollup.objects.filter(granularity='hour', period_start__lt=cutoff).delete()
+    return deleted
+
+
+def rebuild_search_rollups(source):
+    """Drop and recompute every rollup row of one source from the raw table"""
+    Rollup, State = _get_models()
+    with transaction.atomic():
+        Rollup.objects.filter(source=source).delete()
+        State.objects.filter(source=source).delete()
+    return rollup_source(source)
+
+
+# ===========================
+#  READS
+# ===========================
+
+def trending_terms(sources=('site',), days=7, country_id=None, match=None, limit=20, min_count=2):
+    """
+    Most searched terms over the last `days` days, read from the rollups.
+
+    Whole days come from daily rows; the partial first day is covered by
+    hourly rows so the window lines up with the raw-table query it replaces.
+    """
+    Rollup, _ = _get_models()
+    cutoff = timezone.now() - timedelta(days=days)
+    cutoff_hour = cutoff.replace(minute=0, second=0, microsecond=0)
+    first_full_day = _day_start(cutoff) + timedelta(days=1)
+
+    window = (
+        Q(granularity='day', period_start__gte=first_full_day)
+        | Q(granularity='hour', period_start__gte=cutoff_hour, period_start__lt=first_full_day)
+    )
+    rollups = Rollup.objects.filter(window, source__in=sources)
+    if country_id:
+        rollups = rollups.filter(country_id=country_id)
+    if match:
+        rollups = rollups.filter(term__contains=normalize_term(match))
+
+    rows = (
+        rollups.order_by().values('term')
+        .annotate(search_count=Sum('search_count'), results_total=Sum('results_total'))
+        .filter(search_count__gte=min_count, results_total__gt=0)
+        .order_by('-search_count', 'term')[:limit]
+    )
+    return [
+        {
+            'search_term': row['term'],
+            'search_count': row['search_count'],
+            'avg_results': round(row['results_total'] / row['search_count'], 2),
+        }
+        for row in rows
+    ]
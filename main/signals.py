@@ -0,0 +1,193 @@
+# main/signals.py - Keep denormalized listing data in sync
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category, City, Country, State, Products, Services, ProductRating, ServiceRating, UserFavorite
+from . import buffered_counters
+from .category_tree import category_tree
+from .gazetteer import gazetteer
+from .proximity import proximity_index
+from .ratings import RATING_MODEL_FKS, apply_rating_delta
+from .counters import (
+    KEY_FIELDS, apply_counter_delta, get_counted_fields, get_counter_kind, listing_counter_key,
+)
+
+RATING_TRACKED_FIELDS = {'rating', 'is_active', 'product', 'service'}
+
+
+def _contribution(listing_id, rating, is_active):
+    """(listing_id, rating value) counted by the aggregates, or None"""
+    if not is_active or listing_id is None or rating is None:
+        return None
+    return listing_id, Decimal(str(rating))
+
+
+# ===========================
+#  RATING AGGREGATES
+# ===========================
+
+@receiver(pre_save, sender=ProductRating)
+@receiver(pre_save, sender=ServiceRating)
+def capture_previous_rating(sender, instance, update_fields=None, **kwargs):
+    """Remember what this rating contributed before the save"""
+    instance._previous_rating_contribution = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & RATING_TRACKED_FIELDS:
+        instance._skip_rating_aggregates = True
+        return
+
+    fk_name = RATING_MODEL_FKS[sender._meta.label]
+    previous = sender.objects.filter(pk=instance.pk).values(
+        f'{fk_name}_id', 'rating', 'is_active'
+    ).first()
+    if previous:
+        instance._previous_rating_contribution = _contribution(
+            previous[f'{fk_name}_id'], previous['rating'], previous['is_active']
+        )
+
+
+@receiver(post_save, sender=ProductRating)
+@receiver(post_save, sender=ServiceRating)
+def update_rating_aggregates_on_save(sender, instance, **kwargs):
+    """Apply the difference between the old and new contribution"""
+    if getattr(instance, '_skip_rating_aggregates', False):
+        instance._skip_rating_aggregates = False
+        return
+
+    fk_name = RATING_MODEL_FKS[sender._meta.label]
+    listing_model = sender._meta.get_field(fk_name).related_model
+
+    previous = getattr(instance, '_previous_rating_contribution', None)
+    current = _contribution(getattr(instance, f'{fk_name}_id'), instance.rating, instance.is_active)
+    instance._previous_rating_contribution = None
+
+    if previous and current and previous[0] == current[0]:
+        apply_rating_delta(listing_model, current[0], current[1] - previous[1], 0)
+        return
+    if previous:
+        apply_rating_delta(listing_model, previous[0], -previous[1], -1)
+    if current:
+        apply_rating_delta(listing_model, current[0], current[1], 1)
+
+
+@receiver(post_delete, sender=ProductRating)
+@receiver(post_delete, sender=ServiceRating)
+def update_rating_aggregates_on_delete(sender, instance, **kwargs):
+    """Remove a deleted rating's contribution"""
+    fk_name = RATING_MODEL_FKS[sender._meta.label]
+    listing_model = sender._meta.get_field(fk_name).related_model
+
+    current = _contribution(getattr(instance, f'{fk_name}_id'), instance.rating, instance.is_active)
+    if current:
+        apply_rating_delta(listing_model, current[0], -current[1], -1)
+
+
+# ===========================
+#  CATEGORY TREE
+# ===========================
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Any category change rebuilds the cached tree snapshot"""
+    # After commit: bumping the version earlier lets another worker reload the
+    # pre-commit rows under the new version and keep them until the next edit
+    transaction.on_commit(category_tree.invalidate)
+
+
+# ===========================
+#  GAZETTEER
+# ===========================
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=City)
+def invalidate_gazetteer(sender, **kwargs):
+    """Any location change rebuilds the in-memory gazetteer (after commit)"""
+    transaction.on_commit(gazetteer.invalidate)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def invalidate_proximity_index(sender, **kwargs):
+    """City coordinates feed the nearby-search grid (rebuilt after commit)"""
+    transaction.on_commit(proximity_index.invalidate)
+
+
+# ===========================
+#  CATEGORY LISTING COUNTERS
+# ===========================
+
+def _instance_counter_key(instance):
+    values = {field: getattr(instance, field) for field in KEY_FIELDS}
+    status_field = get_counter_kind(type(instance))[1]
+    values[status_field] = getattr(instance, status_field)
+    return listing_counter_key(type(instance), values)
+
+
+@receiver(pre_save, sender=Products)
+@receiver(pre_save, sender=Services)
+def capture_previous_counter_key(sender, instance, update_fields=None, **kwargs):
+    """Remember which counter bucket the listing was in before the save"""
+    instance._previous_counter_key = None
+    instance._skip_listing_counters = False
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & get_counted_fields(sender):
+        instance._skip_listing_counters = True
+        return
+
+    status_field = get_counter_kind(sender)[1]
+    previous = sender.objects.filter(pk=instance.pk).values(*KEY_FIELDS, status_field).first()
+    if previous:
+        instance._previous_counter_key = listing_counter_key(sender, previous)
+
+
+@receiver(post_save, sender=Products)
+@receiver(post_save, sender=Services)
+def update_listing_counters_on_save(sender, instance, **kwargs):
+    """Move the listing between counter buckets when status, category or location change"""
+    if getattr(instance, '_skip_listing_counters', False):
+        return
+
+    kind = get_counter_kind(sender)[0]
+    previous = getattr(instance, '_previous_counter_key', None)
+    current = _instance_counter_key(instance)
+    instance._previous_counter_key = None
+
+    if previous == current:
+        return
+    apply_counter_delta(kind, previous, -1)
+    apply_counter_delta(kind, current, 1)
+
+
+@receiver(post_delete, sender=Products)
+@receiver(post_delete, sender=Services)
+def update_listing_counters_on_delete(sender, instance, **kwargs):
+    """Remove a deleted listing from its counter bucket"""
+    apply_counter_delta(get_counter_kind(sender)[0], _instance_counter_key(instance), -1)
+
+
+# ===========================
+#  FAVORITE COUNTERS
+# ===========================
+
+@receiver(post_save, sender=UserFavorite)
+def buffer_favorite_added(sender, instance, created, **kwargs):
+    """Count a new product favorite through the write-behind buffer"""
+    if created and instance.product_id:
+        buffered_counters.increment(Products, instance.product_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=UserFavorite)
+def buffer_favorite_removed(sender, instance, **kwargs):
+    """Uncount a removed product favorite through the write-behind buffer"""
+    if instance.product_id:
+        buffered_counters.increment(Products, instance.product_id, 'favorites_count', -1)
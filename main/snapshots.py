@@ -0,0 +1,70 @@
+# main/snapshots.py - Process-wide holders for immutable in-memory snapshots
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedSnapshotHolder:
+    """
+    Holds one immutable snapshot per process and rebuilds it when the
+    shared version key in the cache moves.
+
+    The snapshot is built from the database on first use. invalidate()
+    drops it here and bumps the version so other workers rebuild too; they
+    check the cache at most once per check_interval seconds.
+
+    Subclasses set version_cache_key and name, and implement _load(version),
+    returning a snapshot with a .version attribute.
+    """
+
+    version_cache_key = None
+    name = 'snapshot'
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def check_interval(self):
+        return 60
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        try:
+            version = cache.get(self.version_cache_key)
+        except Exception as e:
+            logger.error(f"Error reading {self.name} version: {str(e)}")
+            version = snapshot.version if snapshot is not None else None
+
+        if snapshot is not None and snapshot.version == version:
+            self._checked_at = now
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self._load(version)
+            self._checked_at = now
+            return self._snapshot
+
+    def _load(self, version):
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Drop the local snapshot and tell other workers to do the same"""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+        try:
+            cache.set(self.version_cache_key, time.time_ns(), None)
+        except Exception as e:
+            logger.error(f"Error bumping {self.name} version: {str(e)}")
@@ -0,0 +1,69 @@
+# main/tasks.py
+import logging
+
+from celery import shared_task
+
+from .models import Products, Services
+from . import buffered_counters
+from .autocomplete import autocomplete_index
+from .search_events import flush_search_events
+from .search_rollups import ROLLUP_SOURCES, prune_hourly_rollups, rollup_source
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_buffered_counters():
+    """Write buffered view/contact/favorite increments to the database"""
+    try:
+        flushed = 0
+        for model in (Products, Services):
+            flushed += buffered_counters.flush_counters(model)
+
+        if flushed:
+            logger.info(f"Flushed buffered counters for {flushed} listings")
+        return {'success': True, 'flushed': flushed}
+
+    except Exception as e:
+        logger.error(f"Error flushing buffered counters: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def flush_search_history():
+    """Bulk-insert queued search events into SearchHistory"""
+    try:
+        written = flush_search_events()
+        if written:
+            logger.info(f"Wrote {written} search history rows")
+        return {'success': True, 'written': written}
+
+    except Exception as e:
+        logger.error(f"Error flushing search history: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def rollup_search_terms():
+    """Fold new raw searches into the hourly/daily term rollups"""
+    try:
+        written = {source: rollup_source(source) for source in ROLLUP_SOURCES}
+        pruned = prune_hourly_rollups()
+        return {'success': True, 'written': written, 'pruned': pruned}
+
+    except Exception as e:
+        logger.error(f"Error rolling up search terms: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+@shared_task
+def rebuild_autocomplete_index():
+    """Rebuild the typeahead entries from rollups, categories, brands and cities"""
+    try:
+        version, entries = autocomplete_index.rebuild()
+        logger.info(f"Rebuilt autocomplete index with {len(entries)} entries")
+        return {'success': True, 'entries': len(entries)}
+
+    except Exception as e:
+        logger.error(f"Error rebuilding autocomplete index: {str(e)}")
+        return {'success': False, 'error': str(e)}
@@ -1,3 +1,197 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from . import buffered_counters
+from .category_tree import category_tree
+from .gazetteer import gazetteer
+from .models import Category, City, Country, Products, Services, State
+from .proximity import proximity_index
+from .search import search_listings
+
+
+class SnapshotTestCase(TestCase):
+    """
+    Snapshot holders are invalidated on commit, which never happens inside a
+    TestCase, so each test starts from a fresh load of its own rows.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for holder in (category_tree, gazetteer, proximity_index):
+            holder.invalidate()
+
+
+def create_location():
+    country = Country.objects.create(name='Nigeria', code='NG')
+    state = State.objects.create(name='Lagos', country=country)
+    city = City.objects.create(name='Ikeja', state=state, country=country)
+    return country, state, city
+
+
+def create_user(email='vendor@example.com', phone='+2348012345678'):
+    return get_user_model().objects.create_user(
+        email=email, first_name='Ada', last_name='Obi', phone=phone, password='secret123'
+    )
+
+
+def create_product(user, category, location, **kwargs):
+    country, state, city = location
+    fields = {
+        'product_name': 'Samsung Galaxy phone',
+        'product_description': 'Clean phone with charger',
+        'featured_image': 'product_images/featured/phone',
+        'product_price': 150000,
+        'provider_phone': '+2348012345678',
+        'product_status': 'published',
+        **kwargs,
+    }
+    return Products.objects.create(
+        user=user, category=category, country=country, state=state, city=city, **fields
+    )
+
+
+def create_service(user, category, location, **kwargs):
+    country, state, city = location
+    fields = {
+        'service_name': 'Phone repair',
+        'service_description': 'Screen and battery replacement',
+        'featured_image': 'service_images/featured/repair',
+        'provider_name': 'Ada Repairs',
+        'provider_expertise': 'Phones and tablets',
+        'provider_email': 'repairs@example.com',
+        'provider_phone': '+2348012345678',
+        'service_status': 'published',
+        **kwargs,
+    }
+    return Services.objects.create(
+        user=user, category=category, country=country, state=state, city=city, **fields
+    )
+
+
+class CategoryTreeTests(SnapshotTestCase):
+    def test_category_cannot_move_under_its_own_subtree(self):
+        root = Category.objects.create(name='Electronics', slug='electronics')
+        child = Category.objects.create(name='Phones', slug='phones', parent=root)
+        grandchild = Category.objects.create(name='Android', slug='android', parent=child)
+
+        root.parent = grandchild
+        with self.assertRaises(ValidationError):
+            root.save()
+
+        grandchild.parent = root
+        grandchild.save()
+        self.assertEqual(Category.objects.get(pk=grandchild.pk).parent_id, root.pk)
+
+    def test_tree_is_invalidated_only_after_commit(self):
+        with mock.patch.object(category_tree, 'invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                Category.objects.create(name='Electronics', slug='electronics')
+                invalidate.assert_not_called()
+            invalidate.assert_called_once_with()
+
+    def test_cycle_check_reads_the_database_not_the_cached_tree(self):
+        root = Category.objects.create(name='Electronics', slug='electronics')
+        child = Category.objects.create(name='Phones', slug='phones')
+        category_tree.snapshot()
+        # Moved by another worker: this process's cached tree has not seen it yet
+        Category.objects.filter(pk=child.pk).update(parent=root)
+
+        root.parent = child
+        with self.assertRaises(ValidationError):
+            root.save()
+
+
+class BufferedCounterTests(SnapshotTestCase):
+    def test_negative_delta_is_applied_once_and_floored_at_zero(self):
+        category = Category.objects.create(name='Electronics', slug='electronics')
+        user = create_user()
+        location = create_location()
+        kept = create_product(user, category, location, favorites_count=3)
+        floored = create_product(user, category, location, product_name='Old phone', favorites_count=1)
+
+        buffered_counters._apply_to_db(Products, 'favorites_count', {kept.pk: -2, floored.pk: -2})
+
+        kept.refresh_from_db()
+        floored.refresh_from_db()
+        self.assertEqual(kept.favorites_count, 1)
+        self.assertEqual(floored.favorites_count, 0)
+
+
+class SearchListingsTests(SnapshotTestCase):
+    def setUp(self):
+        self.location = create_location()
+        self.user = create_user()
+        self.category = Category.objects.create(name='Electronics', slug='electronics')
+        create_product(self.user, self.category, self.location)
+        create_service(self.user, self.category, self.location)
+
+    def test_punctuation_only_query_can_be_ordered_by_rank(self):
+        results = search_listings(Products.objects.all(), '!!! ...').order_by('-search_rank')
+        self.assertEqual(list(results), [])
+
+    def test_punctuation_only_query_returns_empty_results(self):
+        response = APIClient().get(reverse('api-search'), {'q': '!!!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results']['products'], [])
+        self.assertEqual(response.data['results']['services'], [])
+
+    def test_matching_query_is_ranked(self):
+        results = search_listings(Products.objects.all(), 'samsung phone').order_by('-search_rank')
+        self.assertEqual([product.product_name for product in results], ['Samsung Galaxy phone'])
+
+
+class ListingListQueryCountTests(SnapshotTestCase):
+    """A page of listings costs the same number of queries whatever its size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        country, state, city = create_location()
+        other_city = City.objects.create(name='Lekki', state=state, country=country)
+        electronics = Category.objects.create(name='Electronics', slug='electronics')
+        categories = [
+            electronics,
+            Category.objects.create(name='Phones', slug='phones', parent=electronics),
+            Category.objects.create(name='Home Services', slug='home-services'),
+        ]
+        users = [create_user('first@example.com', '+2348010000001'), create_user('second@example.com', '+2348010000002')]
+        for i in range(20):
+            location = (country, state, city if i % 2 else other_city)
+            category = categories[i % len(categories)]
+            create_product(users[i % 2], category, location, product_name=f'Phone {i}')
+            create_service(users[i % 2], category, location, service_name=f'Repair {i}')
+
+    def assertSameQueriesForPageSizes(self, url):
+        client = APIClient()
+        # Warm this process's cached category tree and counters outside the count
+        client.get(url, {'limit': 1})
+        with CaptureQueriesContext(connection) as single:
+            response = client.get(url, {'limit': 1})
+        self.assertEqual(len(response.data['results']), 1)
+        with self.assertNumQueries(len(single.captured_queries)):
+            response = client.get(url, {'limit': 20})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_products_list(self):
+        self.assertSameQueriesForPageSizes(reverse('products-list'))
+
+    def test_services_list(self):
+        self.assertSameQueriesForPageSizes(reverse('services-list'))
+
+
+class TrendingSearchesTests(TestCase):
+    def test_non_numeric_country_is_rejected(self):
+        response = APIClient().get(reverse('api-trending-searches'), {'country': 'nigeria'})
+        self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
+    def test_country_filter(self):
+        country, _, _ = create_location()
+        response = APIClient().get(reverse('api-trending-searches'), {'country': country.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['trending_searches'], [])
@@ -4,7 +4,6 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView,TemplateView
 from django.db.models import Q
 from .models import Products, Services, ProductRating, ServiceRating, LocationCategory
-from django.db.models import Avg
 from .filters import LocationCategoryFilter
 from django.contrib import messages
 from .forms import *
@@ -52,7 +51,7 @@ def product_list(request):
         queryset = queryset.filter(product_city__iexact=city)
 
     if min_rating:
-        queryset = queryset.annotate(avg_rating=Avg("product_ratings__rating")).filter(avg_rating__gte=float(min_rating))
+        queryset = queryset.filter(rating_avg__gte=float(min_rating))
 
     categories = Products.objects.values_list('product_category', flat=True).distinct()
     countries = Products.objects.values_list('product_country', flat=True).distinct()
@@ -84,7 +83,7 @@ class ProductDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         context['ratings'] = self.object.product_ratings.all()
         context['average_rating'] = self.object.average_rating()
-        context['rating_count'] = self.object.rating_count()
+        context['rating_count'] = self.object.rating_count
         return context
 
 class ProductCreateView(LoginRequiredMixin, CreateView):
@@ -195,7 +194,7 @@ def service_list(request):
         queryset = queryset.filter(service_city__iexact=city)
 
     if min_rating:
-        queryset = queryset.annotate(avg_rating=Avg("service_ratings__rating")).filter(avg_rating__gte=float(min_rating))
+        queryset = queryset.filter(rating_avg__gte=float(min_rating))
 
     categories = Services.objects.values_list('service_category', flat=True).distinct()
     countries = Services.objects.values_list('service_country', flat=True).distinct()
@@ -227,7 +226,7 @@ class ServiceDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         context['ratings'] = self.object.service_ratings.all()
         context['average_rating'] = self.object.average_rating()
-        context['rating_count'] = self.object.rating_count()
+        context['rating_count'] = self.object.rating_count
         return context
 
 
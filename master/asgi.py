@@ -3,14 +3,54 @@ ASGI config for master project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The chatbot's async views (chat, quick search, uploads, SSE stream) need
+an ASGI server to share one event loop across requests, e.g.:
+
+    gunicorn master.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
+import logging
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'master.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from chatbot.services.http_client import close_http_session  # noqa: E402  (needs settings)
+
+logger = logging.getLogger(__name__)
+
+
+class LifespanApplication:
+    """
+    Answers ASGI lifespan events, which Django does not handle, so the
+    pooled aiohttp session is closed cleanly when the server shuts down.
+    Everything else goes to Django.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    await close_http_session()
+                except Exception as e:
+                    logger.error(f"Error closing shared HTTP session: {str(e)}")
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = LifespanApplication(django_application)
@@ -0,0 +1,22 @@
+"""
+Celery application for the master project.
+
+Workers and beat start from this app, e.g.:
+
+    celery -A master worker -l info
+    celery -A master beat -l info
+
+Settings prefixed with CELERY_ (broker, serializers, CELERY_BEAT_SCHEDULE)
+are read from Django settings, and tasks are discovered from each
+installed app's tasks.py.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'master.settings')
+
+app = Celery('master')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -389,6 +389,30 @@ CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_TASK_SOFT_TIME_LIMIT = 300  # 5 minutes
 CELERY_TASK_TIME_LIMIT = 600  # 10 minutes
 
+# Periodic tasks (picked up by celery beat / django_celery_beat)
+CELERY_BEAT_SCHEDULE = {
+    'flush-buffered-counters': {
+        'task': 'main.tasks.flush_buffered_counters',
+        'schedule': 60.0,  # every minute
+    },
+    'flush-search-history': {
+        'task': 'main.tasks.flush_search_history',
+        'schedule': 10.0,  # keeps SearchHistory.created_at close to the real search time
+    },
+    'rollup-search-terms': {
+        'task': 'main.tasks.rollup_search_terms',
+        'schedule': 300.0,  # every 5 minutes
+    },
+    'rebuild-autocomplete-index': {
+        'task': 'main.tasks.rebuild_autocomplete_index',
+        'schedule': 600.0,  # every 10 minutes
+    },
+    'train-intent-classifier': {
+        'task': 'chatbot.tasks.train_intent_classifier',
+        'schedule': 86400.0,  # daily
+    },
+}
+
 # ===========================
 #  STATIC FILES
 # ===========================
@@ -429,9 +453,47 @@ CHATBOT_SETTINGS = {
     'MIN_LOCAL_RESULTS_THRESHOLD': 2,  # Search external if < 2 local results
     'MAX_EXTERNAL_RESULTS': 5,
     'SEARCH_CACHE_TIMEOUT': 1800,  # 30 minutes
+    'RESULT_CACHE_TTLS': {'intro': 3600, 'local': 300, 'external': 1800},  # chatbot.services.result_cache
     'DEFAULT_SEARCH_STRATEGY': 'hybrid_local_first',  # Prioritize our products
     'ENABLE_CONCURRENT_SEARCH': True,  # Faster responses
     'REQUEST_TIMEOUT': 10,
+    'EXTERNAL_SEARCH_DEADLINE': 8,  # Seconds a chat reply waits for SerpAPI
+    'GEMINI_RATE_LIMIT': {  # chatbot.services.rate_limiter, shared through Redis by every process
+        'REQUESTS_PER_MINUTE': 60,
+        'BURST': 10,
+        'MAX_WAIT': 10,    # Seconds a call queues before failing
+        'MAX_QUEUE': 100,  # Waiting calls per process
+        'BACKOFF_SECONDS': 5,
+    },
+    'PROMPT_CACHE': {  # chatbot.services.prompt_cache
+        'TTLS': {'marketplace_assistant': 1800, 'product_recommender': 3600, 'service_matcher': 3600, 'price_analyst': 900},
+        'HISTORY_FREE_PROMPT_TYPES': ['product_recommender', 'service_matcher', 'price_analyst'],
+    },
+    'GEMINI_BATCHING': {  # chatbot.services.gemini_batcher: intros and web search strategies, per chat session
+        'ENABLED': True,
+        'WINDOW_MS': 15,
+        'MAX_BATCH_SIZE': 8,
+    },
+    'GEMINI_BACKEND': config('GEMINI_BACKEND', default='sdk'),  # 'fake' answers locally, see chatbot.services.fake_gemini
+    'HTTP_POOL': {  # chatbot.services.http_client, shared by SerpAPI and web search
+        'LIMIT': 100,
+        'LIMIT_PER_HOST': 20,
+        'DNS_CACHE_TTL': 300,
+        'KEEPALIVE_TIMEOUT': 30,
+        'CONNECT_TIMEOUT': 5,
+        'TOTAL_TIMEOUT': 15,
+    },
+    'QUERY_ENTITIES': {  # chatbot.services.query_entities
+        'REFRESH_INTERVAL': 600,  # Seconds a published brand/model lexicon is reused before a rebuild
+        'CHECK_INTERVAL': 60,     # Seconds between lexicon version checks per process
+        'MAX_MODELS': 20000,      # Most listed product models the lexicon recognises
+    },
+    'INTENT_ENGINE': {  # chatbot.services.intent_engine
+        'OTHER_THRESHOLD': 0.5,  # Probability 'other' needs before a message with product/service words skips search
+        'MIN_SEARCH_PROBABILITY': 0.4,  # Without product/service words, a search intent needs this much
+        'SELF_LABEL_WEIGHT': 0.05,  # Training weight of predicted intents without feedback (seeds are 1.0)
+        'CHECK_INTERVAL': 60,    # Seconds between checks for a newly trained model
+    },
     'VOICE_RESPONSE_ENABLED': True,
     'IMAGE_RECOGNITION_ENABLED': True,
     'MAX_CONVERSATION_HISTORY': 10,  # Keep last 10 messages for context
@@ -453,7 +515,25 @@ SEARCH_SETTINGS = {
     'BOOST_FIELDS': {
         'name': 2.0,
         'tags__name': 1.5,
-    }
+    },
+    'RANKING_CANDIDATES': 50,  # Rows scored by the chatbot relevance ranker
+    'RELEVANCE_WEIGHTS': {},   # Overrides for chatbot.services.local_search weights
+    'ROLLUP_LAG_SECONDS': 60,  # Raw searches younger than this wait for the next rollup run
+    'ROLLUP_HOURLY_RETENTION_DAYS': 8,
+    'AUTOCOMPLETE_MAX_PREFIX': 10,      # Longer prefixes fall back to a binary-search scan
+    'AUTOCOMPLETE_TOP_K': 20,
+    'AUTOCOMPLETE_POPULAR_DAYS': 30,
+    'AUTOCOMPLETE_CHECK_INTERVAL': 30,  # Seconds between index version checks per process
+    'GAZETTEER_CHECK_INTERVAL': 60,     # Seconds between main.gazetteer version checks per process
+    'GAZETTEER_MEMO_SIZE': 10000,       # Resolved location strings remembered per process
+    'LOCATION_ALIASES': {},             # Extra 'alias': 'canonical name' pairs for main.gazetteer
+    'NEARBY_RADIUS_KM': 50,             # Default radius for nearby listings and the chatbot location boost
+    'NEARBY_MAX_RADIUS_KM': 500,
+    'PROXIMITY_CELL_KM': 25,            # Grid cell size of main.proximity
+    'PROXIMITY_DISTANCE_TIERS_KM': (10, 25, 50, 100, 250),
+    'PROXIMITY_MAX_CITIES': 500,        # Nearest cities considered per radius query
+    'PROXIMITY_CHECK_INTERVAL': 60,
+    'PROXIMITY_MEMO_SIZE': 5000,
 }
 
 # ===========================